@@ -60,6 +60,7 @@ from .reduction import plot_heatmap_sequence
 # Module: `analysis`
 from .kernel_regression import KReg
 from .analysis import compute_normalized_variance
+from .analysis import NormalizedVariancePool
 from .analysis import normalized_variance_derivative
 from .analysis import find_local_maxima
 from .analysis import random_sampling_normalized_variance
@@ -90,3 +91,7 @@ from .analysis import plot_normalized_variance_comparison
 from .analysis import plot_normalized_variance_derivative
 from .analysis import plot_normalized_variance_derivative_comparison
 from .analysis import plot_stratified_metric
+
+# Module: `serving`
+from .serving import InferenceServer
+from .serving import InferenceClient
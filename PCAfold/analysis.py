@@ -11,8 +11,12 @@ __status__ = "Production"
 
 import numpy as np
 import copy as cp
+import os
 import multiprocessing as multiproc
+from multiprocessing import shared_memory
+from multiprocessing import resource_tracker
 from PCAfold import KReg
+from PCAfold import kernel_regression
 from scipy.spatial import KDTree
 from scipy.optimize import minimize
 from scipy.signal import find_peaks
@@ -48,16 +52,23 @@ class VarianceData:
     :param variable_names:
         list of the variable names
     :param normalized_variance_limit:
-        dictionary of the normalized variance computed as the bandwidth approaches zero (numerically at :math:`10^{-16}`) for each variable
+        dictionary of the normalized variance computed as the bandwidth approaches zero for each variable, where each observation is predicted by the average over its exact duplicates
+    :param norm_var_standard_error:
+        (optional) dictionary of the standard error of the normalized variance at each of the bandwidth values for each variable, if it was estimated from a sample of query points
+    :param saturation_index:
+        (optional) index of the bandwidth value at which the sweep over bandwidths stopped because the normalized variance saturated, if it did.
+        The normalized variance at all larger bandwidth values is extrapolated rather than computed.
     """
 
-    def __init__(self, bandwidth_values, norm_var, global_var, bandwidth_10pct_rise, keys, norm_var_limit):
+    def __init__(self, bandwidth_values, norm_var, global_var, bandwidth_10pct_rise, keys, norm_var_limit, norm_var_standard_error=None, saturation_index=None):
         self._bandwidth_values = bandwidth_values.copy()
         self._normalized_variance = norm_var.copy()
         self._global_variance = global_var.copy()
         self._bandwidth_10pct_rise = bandwidth_10pct_rise.copy()
         self._variable_names = keys.copy()
         self._normalized_variance_limit = norm_var_limit.copy()
+        self._normalized_variance_standard_error = None if norm_var_standard_error is None else norm_var_standard_error.copy()
+        self._saturation_index = saturation_index
 
     @property
     def bandwidth_values(self):
@@ -87,13 +98,460 @@ class VarianceData:
     @property
     def normalized_variance_limit(self):
         """return a dictionary of the normalized variance computed as the
-        bandwidth approaches zero (numerically at 1.e-16) for each variable"""
+        bandwidth approaches zero for each variable"""
         return self._normalized_variance_limit.copy()
 
+    @property
+    def normalized_variance_standard_error(self):
+        """return a dictionary of the standard error of the normalized variance at each of the bandwidth values for each variable,
+        or None if the normalized variance was computed over all query points"""
+        return None if self._normalized_variance_standard_error is None else self._normalized_variance_standard_error.copy()
+
+    @property
+    def saturation_index(self):
+        """return the index of the bandwidth value at which the sweep over bandwidths stopped because the normalized variance saturated,
+        or None if it was computed at every bandwidth value"""
+        return self._saturation_index
+
+# ------------------------------------------------------------------------------
+
+# the shared training data and model of the current call in each worker process of NormalizedVariancePool
+_pool_worker_state = {'name': None, 'shared_memory': None, 'key': None, 'model': None}
+
+def _pool_worker_model(data):
+    """
+    The kernel regression model of the training data ``data`` shared by ``NormalizedVariancePool._share``, cached in the worker process.
+    """
+    (name, generation, n, n_indepvars, n_depvars, weighted) = data
+
+    state = _pool_worker_state
+    if state['key'] != (name, generation):
+        if state['name'] != name:
+            if state['shared_memory'] is not None:
+                state['model'] = None
+                state['shared_memory'].close()
+            state['shared_memory'] = shared_memory.SharedMemory(name=name)
+            state['name'] = name
+        values = np.ndarray((n * (n_indepvars + n_depvars + 1),), dtype=np.float64, buffer=state['shared_memory'].buf)
+        indepvars = values[:n*n_indepvars].reshape(n, n_indepvars)
+        depvars = values[n*n_indepvars:n*(n_indepvars+n_depvars)].reshape(n, n_depvars)
+        weights = values[n*(n_indepvars+n_depvars):] if weighted else None
+        state['model'] = KReg._from_arrays(indepvars, depvars, weights)
+        state['key'] = (name, generation)
+    return state['model']
+
+# cost of predict_on_training relative to predict at the training points with the compiled symmetric kernel,
+# measured with benchmark_symmetric in benchmarks/kreg_benchmarks.py
+_SYMMETRIC_COST = 0.6
+
+def _pool_residual_sums(task):
+    """
+    Weighted squared residuals of the kernel regression of one block of training points on all of them, for one bandwidth.
+    Runs in a worker process of ``NormalizedVariancePool``.
+    """
+    (data, bandwidth_index, block_index, bandwidth, start, stop) = task
+
+    model = _pool_worker_model(data)
+    n = data[2]
+    if start == 0 and stop == n:
+        # a single block uses the symmetric kernel of predict_on_training, which evaluates each pair once
+        residuals = model.depvars - model.predict_on_training(bandwidth)
+    else:
+        residuals = model.depvars[start:stop] - model.predict(model.indepvars[start:stop], bandwidth)
+    if model.weights is None:
+        residual_sums = np.sum(residuals**2, axis=0)
+    else:
+        residual_sums = model.weights[start:stop].dot(residuals**2)
+    return bandwidth_index, block_index, residual_sums
+
+def _pool_query_residuals(task):
+    """
+    Weighted squared residuals of the kernel regression of the training points ``query_indices`` on all of them, for one bandwidth.
+    Runs in a worker process of ``NormalizedVariancePool``.
+    """
+    (data, bandwidth_index, start, bandwidth, query_indices) = task
+
+    model = _pool_worker_model(data)
+    residuals = (model.depvars[query_indices] - model.predict(model.indepvars[query_indices], bandwidth))**2
+    if model.weights is not None:
+        residuals *= model.weights[query_indices, None]
+    return bandwidth_index, start, residuals
+
+class NormalizedVariancePool:
+    """
+    A persistent pool of worker processes for ``compute_normalized_variance``. The workers are started once and reused by every call
+    that the pool is passed to, which avoids starting and tearing down processes in functions that compute the normalized variance many times,
+    such as ``manifold_informed_feature_selection``. The training data of each call is written once to shared memory that all workers read
+    without copying, and the kernel regression is split into tasks of one bandwidth and one block of query points, so that the workers
+    stay busy when there are fewer bandwidths than workers or the bandwidths differ in cost.
+
+    The pool can be passed explicitly and closed with ``close``, or managed by a context manager.
+
+    **Example:**
+
+    .. code:: python
+
+        from PCAfold import PCA, compute_normalized_variance, NormalizedVariancePool
+        import numpy as np
+
+        # Generate dummy data set:
+        X = np.random.rand(100,5)
+
+        # Perform PCA to obtain the low-dimensional manifolds:
+        principal_components_2 = PCA(X, n_components=2).transform(X)
+        principal_components_3 = PCA(X, n_components=3).transform(X)
+
+        # Compute normalized variance quantities with the same worker processes:
+        with NormalizedVariancePool(n_processes=4) as pool:
+            variance_data_2 = compute_normalized_variance(principal_components_2, X, depvar_names=['A', 'B', 'C', 'D', 'E'], bandwidth_values=np.logspace(-3, 1, 20), pool=pool)
+            variance_data_3 = compute_normalized_variance(principal_components_3, X, depvar_names=['A', 'B', 'C', 'D', 'E'], bandwidth_values=np.logspace(-3, 1, 20), pool=pool)
+
+    :param n_processes: (optional)
+        ``int`` specifying the number of worker processes. If ``None``, all available cores on the current system are used.
+    :param block_size: (optional)
+        ``int`` specifying the number of query points per task. If ``None``, the number of blocks per bandwidth is chosen to finish soonest, given that
+        a bandwidth evaluated as a single block costs about 0.6 times as much through the symmetry of the kernel matrix (as much without the compiled kernels),
+        with blocks of at least 256 query points.
+    """
+
+    def __init__(self, n_processes=None, block_size=None):
+
+        if n_processes is None:
+            n_processes = os.cpu_count()
+
+        if not isinstance(n_processes, int) or n_processes < 1:
+            raise ValueError("Parameter `n_processes` has to be a positive integer.")
+
+        if block_size is not None and (not isinstance(block_size, int) or block_size < 1):
+            raise ValueError("Parameter `block_size` has to be a positive integer.")
+
+        self.__n_processes = n_processes
+        self.__block_size = block_size
+        if os.name == 'posix':
+            # workers started after the resource tracker share it, instead of each starting one that would unlink the shared memory when they exit
+            resource_tracker.ensure_running()
+        self.__pool = multiproc.Pool(processes=n_processes)
+        self.__shared_memory = None
+        self.__generation = 0
+
+    @property
+    def n_processes(self):
+        return self.__n_processes
+
+    def _share(self, indepvars, depvars, weights):
+        """
+        Write the training data to the shared memory, which is only reallocated when it is too small, and return its description for the workers.
+        """
+
+        (n, n_indepvars) = indepvars.shape
+        n_depvars = depvars.shape[1]
+        size = 8 * n * (n_indepvars + n_depvars + 1)
+        if self.__shared_memory is None or self.__shared_memory.size < size:
+            if self.__shared_memory is not None:
+                self.__shared_memory.close()
+                self.__shared_memory.unlink()
+            self.__shared_memory = shared_memory.SharedMemory(create=True, size=max(size, 8))
+        data = np.ndarray((n * (n_indepvars + n_depvars + 1),), dtype=np.float64, buffer=self.__shared_memory.buf)
+        data[:n*n_indepvars] = indepvars.ravel()
+        data[n*n_indepvars:n*(n_indepvars+n_depvars)] = depvars.ravel()
+        data[n*(n_indepvars+n_depvars):] = 1. if weights is None else np.asarray(weights, dtype=float).ravel()
+        # workers rebuild their model when the generation changes, even if the shared memory is the same
+        self.__generation += 1
+        return (self.__shared_memory.name, self.__generation, n, n_indepvars, n_depvars, weights is not None)
+
+    def residual_sums(self, indepvars, depvars, bandwidth_values, weights=None):
+        """
+        Computes the sums of the (weighted) squared residuals of the kernel regression of ``depvars`` on ``indepvars`` at the training points,
+        :math:`\\sum_i w_i (y_i - \\mathcal{K}(x_i; \\sigma))^2`, for each bandwidth :math:`\\sigma` and dependent variable.
+
+        :param indepvars:
+            ``numpy.ndarray`` specifying the independent variable values. It should be of size ``(n_observations,n_independent_variables)``.
+        :param depvars:
+            ``numpy.ndarray`` specifying the dependent variable values. It should be of size ``(n_observations,n_dependent_variables)``.
+        :param bandwidth_values:
+            ``numpy.ndarray`` specifying the bandwidth values.
+        :param weights: (optional)
+            ``numpy.ndarray`` of non-negative observation weights of size ``(n_observations,)``, see ``KReg``.
+
+        :return:
+            - **residual_sums** - ``numpy.ndarray`` of size ``(n_bandwidths,n_dependent_variables)``.
+        """
+
+        if self.__pool is None:
+            raise ValueError("The pool has been closed.")
+
+        bandwidth_values = np.asarray(bandwidth_values, dtype=float).ravel()
+        data = self._share(np.asarray(indepvars, dtype=float), np.asarray(depvars, dtype=float), weights)
+        n = indepvars.shape[0]
+
+        block_size = self.__block_size
+        if block_size is None:
+            # duration of the evaluation in units of the kernel sums of one bandwidth over all query points, with n_blocks blocks per bandwidth.
+            # A single block is evaluated by predict_on_training, whose symmetric kernel only saves time when it is compiled.
+            symmetric_cost = 1.
+            if kernel_regression.kernel_regression_cython is not None and indepvars.shape[1] < kernel_regression._SYMMETRIC_MATRIX_PRODUCT_MIN_DIMENSIONS:
+                symmetric_cost = _SYMMETRIC_COST
+            max_blocks = max(min(self.__n_processes, n // 256), 1)
+            durations = [np.ceil(bandwidth_values.size / self.__n_processes) * symmetric_cost] + [np.ceil(bandwidth_values.size * n_blocks / self.__n_processes) / n_blocks for n_blocks in range(2, max_blocks + 1)]
+            n_blocks = 1 + int(np.argmin(durations))
+            block_size = max(int(np.ceil(n / n_blocks)), 1)
+        block_starts = range(0, n, block_size)
+        tasks = [(data, b, k, bandwidth_values[b], start, min(start + block_size, n)) for b in range(bandwidth_values.size) for (k, start) in enumerate(block_starts)]
+
+        # the blocks are added up in a fixed order, so the result does not depend on the order in which the tasks finish
+        partial_sums = np.zeros((bandwidth_values.size, len(block_starts), depvars.shape[1]))
+        for (b, k, block_sums) in self.__pool.imap_unordered(_pool_residual_sums, tasks):
+            partial_sums[b, k] = block_sums
+        return np.sum(partial_sums, axis=1)
+
+    def query_residuals(self, indepvars, depvars, bandwidth_values, query_indices, weights=None):
+        """
+        Computes the (weighted) squared residuals of the kernel regression of ``depvars`` on all of ``indepvars``,
+        :math:`w_i (y_i - \\mathcal{K}(x_i; \\sigma))^2`, at the training points ``query_indices`` only, for each bandwidth :math:`\\sigma` and dependent variable.
+
+        :param indepvars:
+            ``numpy.ndarray`` specifying the independent variable values. It should be of size ``(n_observations,n_independent_variables)``.
+        :param depvars:
+            ``numpy.ndarray`` specifying the dependent variable values. It should be of size ``(n_observations,n_dependent_variables)``.
+        :param bandwidth_values:
+            ``numpy.ndarray`` specifying the bandwidth values.
+        :param query_indices:
+            ``numpy.ndarray`` of the indices of the training points at which the residuals are computed.
+        :param weights: (optional)
+            ``numpy.ndarray`` of non-negative observation weights of size ``(n_observations,)``, see ``KReg``.
+
+        :return:
+            - **residuals** - ``numpy.ndarray`` of size ``(n_bandwidths,n_queries,n_dependent_variables)``.
+        """
+
+        if self.__pool is None:
+            raise ValueError("The pool has been closed.")
+
+        bandwidth_values = np.asarray(bandwidth_values, dtype=float).ravel()
+        query_indices = np.asarray(query_indices, dtype=int).ravel()
+        data = self._share(np.asarray(indepvars, dtype=float), np.asarray(depvars, dtype=float), weights)
+        m = query_indices.size
+
+        block_size = self.__block_size
+        if block_size is None:
+            block_size = max(int(np.ceil(m / max(min(self.__n_processes, m // 256), 1))), 1)
+        tasks = [(data, b, start, bandwidth_values[b], query_indices[start:start+block_size]) for b in range(bandwidth_values.size) for start in range(0, m, block_size)]
+
+        residuals = np.zeros((bandwidth_values.size, m, depvars.shape[1]))
+        for (b, start, block_residuals) in self.__pool.imap_unordered(_pool_query_residuals, tasks):
+            residuals[b, start:start+block_residuals.shape[0]] = block_residuals
+        return residuals
+
+    def close(self):
+        """
+        Stops the worker processes and releases the shared memory.
+        """
+
+        if self.__pool is not None:
+            self.__pool.close()
+            self.__pool.join()
+            self.__pool = None
+        if self.__shared_memory is not None:
+            self.__shared_memory.close()
+            self.__shared_memory.unlink()
+            self.__shared_memory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
 # ------------------------------------------------------------------------------
 
+def _duplicate_residual_sums(indepvars, depvars, weights):
+    """
+    Sums of the weighted squared residuals of the kernel regression at the training points in the limit of a vanishing bandwidth.
+    The kernel weights then vanish for all but the exact duplicates of a point, so its prediction is the weighted average of the dependent
+    variables over them. The duplicates are found by sorting the rows of ``indepvars``, and points of zero weight do not contribute.
+    """
+    (_, groups) = np.unique(indepvars, axis=0, return_inverse=True)
+    groups = groups.ravel()
+    n_groups = np.max(groups) + 1 if groups.size > 0 else 0
+    group_weights = np.bincount(groups, weights, minlength=n_groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        group_means = np.column_stack([np.bincount(groups, weights * depvars[:, j], minlength=n_groups) for j in range(depvars.shape[1])]) / group_weights[:, None]
+    weighted = weights > 0.
+    return weights[weighted].dot((depvars[weighted] - group_means[groups[weighted]])**2)
+
+# intervals of the bandwidth grid narrower than this in log10 space are not refined further
+_MIN_LOG_BANDWIDTH_SPACING = 1.e-3
+
+class _QuerySample:
+    """
+    A sample of query points for estimating the sums of squared residuals over all training points, drawn without replacement from
+    each stratum of ``idx`` (a single stratum if None) in proportion to its size, with at least two points per stratum. Each stratum
+    is visited in a fixed random order, so growing the sample only adds query points. Once it holds half of the training points
+    the sums are computed over all of them. With :math:`t_i` the squared residual of query point :math:`i`, :math:`g_i` its squared
+    deviation from the average, and :math:`m_h` of the :math:`n_h` points of stratum :math:`h` sampled, the normalized variance is
+    estimated by the ratio :math:`R = \\sum_h n_h \\bar{t}_h / \\sum_h n_h \\bar{g}_h` with the variance
+    :math:`\\sum_h n_h^2 (1 - m_h/n_h) s_h^2/m_h / (\\sum_h n_h \\bar{g}_h)^2`, where bars denote sample means over stratum :math:`h` and
+    :math:`s_h^2` is the sample variance of :math:`t_i - R g_i` over it. As :math:`t_i` approaches :math:`g_i` with an increasing bandwidth,
+    the estimate approaches one and its standard error vanishes.
+    """
+
+    def __init__(self, n_observations, n_queries, idx=None, random_seed=None):
+        random_state = np.random.RandomState(random_seed)
+        (_, strata) = np.unique(np.zeros(n_observations, dtype=int) if idx is None else np.asarray(idx).ravel(), return_inverse=True)
+        self.orders = [random_state.permutation(np.flatnonzero(strata == h)) for h in range(np.max(strata) + 1)]
+        self.stratum_sizes = np.array([order.size for order in self.orders])
+        self.sample_sizes = np.minimum(self.stratum_sizes, np.maximum(np.round(n_queries * self.stratum_sizes / n_observations).astype(int), 2))
+
+    def residual_sums(self, pool, indepvars, depvars, bandwidth_values, weights, global_residuals, target_standard_error):
+        """
+        Estimate the sums of squared residuals of shape ``(n_bandwidths,n_dependent_variables)`` and their standard errors, given the
+        squared deviations from the average ``global_residuals`` of shape ``(n_observations,n_dependent_variables)``. If ``target_standard_error``
+        is given, the sample grows until the standard errors of the normalized variance are at most that.
+        """
+        global_var = np.sum(global_residuals, axis=0)
+        residuals = [np.zeros((bandwidth_values.size, 0, depvars.shape[1])) for order in self.orders]
+        evaluated = np.zeros(len(self.orders), dtype=int)
+        while True:
+            if 2 * np.sum(self.sample_sizes) >= np.sum(self.stratum_sizes):
+                # past half of the training points the exact sums, which use the symmetry of the kernel matrix, are cheaper
+                self.sample_sizes = self.stratum_sizes.copy()
+                return pool.residual_sums(indepvars, depvars, bandwidth_values, weights=weights), np.zeros((bandwidth_values.size, depvars.shape[1]))
+            queries = [order[start:stop] for (order, start, stop) in zip(self.orders, evaluated, self.sample_sizes)]
+            new_residuals = pool.query_residuals(indepvars, depvars, bandwidth_values, np.concatenate(queries), weights=weights)
+            splits = np.cumsum([query.size for query in queries])[:-1]
+            residuals = [np.concatenate((old, new), axis=1) for (old, new) in zip(residuals, np.split(new_residuals, splits, axis=1))]
+            evaluated = self.sample_sizes.copy()
+
+            deviations = [global_residuals[order[:m_h]] for (order, m_h) in zip(self.orders, self.sample_sizes)]
+            numerator = np.sum([n_h * np.mean(t_h, axis=1) for (t_h, n_h) in zip(residuals, self.stratum_sizes)], axis=0)
+            denominator = np.sum([n_h * np.mean(g_h, axis=0) for (g_h, n_h) in zip(deviations, self.stratum_sizes)], axis=0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratio = numerator / denominator
+                variances = np.zeros((bandwidth_values.size, depvars.shape[1]))
+                for (t_h, g_h, n_h, m_h) in zip(residuals, deviations, self.stratum_sizes, self.sample_sizes):
+                    if m_h < n_h:
+                        variances += n_h**2 * (1. - m_h / n_h) * np.var(t_h - ratio[:, None, :] * g_h[None, :, :], axis=1, ddof=1) / m_h
+                standard_errors = np.sqrt(variances) / denominator
+
+            if target_standard_error is None or np.all(self.sample_sizes == self.stratum_sizes):
+                return ratio * global_var, standard_errors * global_var
+            largest_error = np.max(np.nan_to_num(standard_errors, nan=0.))
+            if largest_error <= target_standard_error:
+                return ratio * global_var, standard_errors * global_var
+            # the standard error decreases about as the inverse square root of the sample size
+            growth = (largest_error / target_standard_error)**2
+            self.sample_sizes = np.minimum(self.stratum_sizes, np.maximum(np.ceil(self.sample_sizes * growth).astype(int), self.sample_sizes + 1))
+
+def _saturated_residual_sums(residual_sums, bandwidth_values, global_var, tolerance, chunk_size, saturation):
+    """
+    Sums of squared residuals and their standard errors (or None) for the increasing ``bandwidth_values``, computed with ``residual_sums``
+    in chunks of ``chunk_size`` bandwidths until those of all variables are within ``tolerance`` of the ``global_var``, that is until the
+    normalized variance saturates. The sweep then stops, the bandwidth it stopped at and its sums are recorded in ``saturation``, and
+    the sums at larger bandwidths are extrapolated. When the bandwidth is large compared to the spread of the observations, the kernel
+    weights are :math:`1 - |x_i - x_j|^2/\\sigma^2` to leading order, so the predictions differ from the average by a term in :math:`1/\\sigma^2`
+    and :math:`1 - \\mathcal{N}(\\sigma)` decays as :math:`1/\\sigma^2`, which continues the sums at the bandwidth the sweep stopped at.
+    A given ``saturation`` of an earlier sweep is extrapolated the same way.
+
+    :return:
+        - **lvar** - ``numpy.ndarray`` of the sums of squared residuals of size ``(n_bandwidths,n_dependent_variables)``.
+        - **lvar_standard_error** - ``numpy.ndarray`` of their standard errors of the same size, or None.
+        - **saturation** - ``tuple`` of the bandwidth the sweep stopped at, and the sums and standard errors there, or None if it did not stop.
+    """
+    lvar = np.zeros((bandwidth_values.size, global_var.size))
+    lvar_standard_error = None
+    start = 0
+    while start < bandwidth_values.size and (saturation is None or bandwidth_values[start] <= saturation[0]):
+        if saturation is None:
+            stop = min(start + chunk_size, bandwidth_values.size)
+        else:
+            stop = int(np.searchsorted(bandwidth_values, saturation[0], side='right'))
+        (lvar[start:stop], chunk_standard_error) = residual_sums(bandwidth_values[start:stop])
+        if chunk_standard_error is not None:
+            if lvar_standard_error is None:
+                lvar_standard_error = np.zeros_like(lvar)
+            lvar_standard_error[start:stop] = chunk_standard_error
+        if saturation is None:
+            saturated = np.flatnonzero(np.all(np.abs(global_var - lvar[start:stop]) <= tolerance * global_var, axis=1))
+            if saturated.size > 0:
+                k = start + saturated[0]
+                saturation = (bandwidth_values[k], lvar[k].copy(), None if lvar_standard_error is None else lvar_standard_error[k].copy())
+                stop = k + 1
+        start = stop
+
+    if start < bandwidth_values.size:
+        (saturation_bandwidth, saturation_lvar, saturation_standard_error) = saturation
+        decay = (saturation_bandwidth / bandwidth_values[start:, None])**2
+        lvar[start:] = global_var - (global_var - saturation_lvar) * decay
+        if saturation_standard_error is not None:
+            if lvar_standard_error is None:
+                lvar_standard_error = np.zeros_like(lvar)
+            lvar_standard_error[start:] = saturation_standard_error * decay
+    return lvar, lvar_standard_error, saturation
+
+def _variance_data(bandwidth_values, lvar, global_var, normvar_limit, depvar_names, lvar_standard_error=None, saturation_index=None):
+    """
+    Assemble the ``VarianceData`` of the sums of squared residuals ``lvar`` of shape ``(n_bandwidths,n_dependent_variables)``.
+    """
+    local_var = dict({key: lvar[:, idx] for idx, key in enumerate(depvar_names)})
+    # saving the values of the bandwidth where the normalized variance increases by 10%...
+    bandwidth_10pct_rise = dict()
+    for key in depvar_names:
+        bandwidth_idx = np.argwhere(local_var[key] / global_var[key] >= 0.1)
+        if len(bandwidth_idx) == 0.:
+            bandwidth_10pct_rise[key] = None
+        else:
+            bandwidth_10pct_rise[key] = bandwidth_values[bandwidth_idx[0]][0]
+    norm_local_var = dict({key: local_var[key] / global_var[key] for key in depvar_names})
+    if lvar_standard_error is None:
+        norm_var_standard_error = None
+    else:
+        norm_var_standard_error = dict({key: lvar_standard_error[:, idx] / global_var[key] for idx, key in enumerate(depvar_names)})
+    return VarianceData(bandwidth_values, norm_local_var, global_var, bandwidth_10pct_rise, depvar_names, normvar_limit, norm_var_standard_error, saturation_index)
+
+def _refined_bandwidths(variance_data, tolerance, max_new):
+    """
+    Bandwidths to insert, at the geometric midpoints of the intervals of ``variance_data.bandwidth_values`` that do not resolve
+    :math:`\\hat{\\mathcal{D}}(\\sigma)` yet. These are the intervals across which :math:`\\hat{\\mathcal{D}}(\\sigma)` of any variable
+    changes by more than ``tolerance``, the intervals around each local maximum of :math:`\\hat{\\mathcal{D}}(\\sigma)` until they
+    are evenly spaced and at most ``tolerance`` wide in :math:`\\log_{10}(\\sigma)`, and the intervals more than twice as wide in
+    :math:`\\log_{10}(\\sigma)` as a neighbor. The change is measured between the neighboring interior bandwidths and the two outer intervals take that of their neighbor.
+    The last criterion keeps the grid graded, so that the peaks found by ``find_local_maxima`` do not depend on abrupt changes of the spacing.
+    At most ``max_new`` bandwidths are returned, those of the intervals furthest from being resolved first.
+    """
+    bandwidth_values = variance_data.bandwidth_values
+    log_bandwidths = np.log10(bandwidth_values)
+    spacing = np.diff(log_bandwidths)
+    n_intervals = spacing.size
+    if n_intervals < 3:
+        excess = np.full(n_intervals, np.inf)
+    else:
+        derivative, _, _ = normalized_variance_derivative(variance_data)
+        derivative = np.nan_to_num(np.column_stack([derivative[key] for key in variance_data.variable_names]), nan=0.)
+        change = np.zeros(n_intervals)
+        change[1:-1] = np.max(np.abs(np.diff(derivative, axis=0)), axis=1)
+        change[0] = change[1]
+        change[-1] = change[-2]
+
+        # the interior bandwidth i + 1 holds derivative[i], and a local maximum there is bracketed by the intervals i and i + 1
+        rising = np.vstack((np.full((1, derivative.shape[1]), True), derivative[1:] > derivative[:-1]))
+        falling = np.vstack((derivative[1:] <= derivative[:-1], np.full((1, derivative.shape[1]), True)))
+        peak_excess = np.zeros(n_intervals)
+        for i in np.flatnonzero(np.any(rising & falling, axis=1)):
+            # the central differences and the spline of find_local_maxima around the maximum span these intervals
+            stencil = np.arange(max(i - 2, 0), min(i + 3, n_intervals))
+            peak_excess[stencil] = np.maximum(peak_excess[stencil], spacing[stencil] / min(tolerance, 1.01 * np.min(spacing[stencil])))
+
+        neighbor_spacing = np.minimum(np.concatenate(([np.inf], spacing[:-1])), np.concatenate((spacing[1:], [np.inf])))
+        excess = np.maximum.reduce([change / tolerance, peak_excess, spacing / (2. * neighbor_spacing)])
+    excess[spacing < _MIN_LOG_BANDWIDTH_SPACING] = 0.
+    intervals = np.flatnonzero(excess > 1.)
+    intervals = intervals[np.argsort(-excess[intervals], kind='stable')][:max(max_new, 0)]
+    return 10.**(0.5 * (log_bandwidths[intervals] + log_bandwidths[intervals + 1]))
+
 def compute_normalized_variance(indepvars, depvars, depvar_names, npts_bandwidth=25, min_bandwidth=None,
-                                max_bandwidth=None, bandwidth_values=None, scale_unit_box=True, n_threads=None):
+                                max_bandwidth=None, bandwidth_values=None, scale_unit_box=True, n_threads=None, weights=None, pool=None,
+                                refinement_tolerance=None, max_npts_bandwidth=200, n_queries=None, idx=None, target_standard_error=None, random_seed=None,
+                                saturation_tolerance=None):
     """
     Compute a normalized variance (and related quantities) for analyzing manifold dimensionality.
     The normalized variance is computed as
@@ -113,6 +571,25 @@ def compute_normalized_variance(indepvars, depvars, depvar_names, npts_bandwidth
     logspace from ``min_bandwidth`` to ``max_bandwidth`` with ``npts_bandwidth`` number of values. If left unspecified,
     ``min_bandwidth`` and ``max_bandwidth`` will be calculated as the minimum and maximum nonzero distance between points, respectively.
 
+    If ``refinement_tolerance`` is given, these bandwidth values only form a coarse initial grid which is refined adaptively: bandwidths are
+    inserted at the geometric midpoints of the intervals across which the scaled derivative :math:`\\hat{\\mathcal{D}}(\\sigma)`
+    (see ``normalized_variance_derivative``) of any dependent variable changes by more than ``refinement_tolerance``, of the intervals
+    around its local maxima until they are evenly spaced and at most ``refinement_tolerance`` wide in :math:`\\log_{10}(\\sigma)`, and of
+    the intervals more than twice as wide in :math:`\\log_{10}(\\sigma)` as a neighboring one, until none is left
+    or the grid reaches ``max_npts_bandwidth`` values. The bandwidths are then concentrated where the peaks and the curvature of
+    :math:`\\hat{\\mathcal{D}}(\\sigma)` have to be resolved, and the returned ``VarianceData`` holds the resulting sorted, non-uniform grid.
+
+    If ``n_queries`` is given, :math:`\\mathcal{N}(\\sigma)` is estimated by restricting both sums to a sample of about ``n_queries`` query points
+    :math:`\\hat{x}_i`, while the kernel regression still uses all observations. The sample is drawn at random, and in proportion to the size of
+    each cluster if ``idx`` is given. The standard error of the estimate is returned in ``VarianceData.normalized_variance_standard_error``.
+    If ``target_standard_error`` is also given, the sample grows until the standard errors of all bandwidths and variables are at most that.
+    This is much cheaper for large data sets, and the estimates are usually accurate enough to rank manifolds through ``cost_function_normalized_variance_derivative``.
+
+    If ``saturation_tolerance`` is given, the bandwidths are processed in increasing order and the sweep stops at the first bandwidth
+    at which :math:`|1 - \\mathcal{N}(\\sigma)|` is at most ``saturation_tolerance`` for every dependent variable. Beyond it, the kernel regression
+    approaches the average :math:`\\bar{y}` and :math:`1 - \\mathcal{N}(\\sigma)` decays as :math:`1/\\sigma^2`, which fills in the normalized variance
+    at the remaining bandwidths without evaluating them. ``VarianceData.saturation_index`` records the bandwidth at which the sweep stopped.
+
     More information can be found in :cite:`Armstrong2021`.
 
     **Example:**
@@ -158,7 +635,30 @@ def compute_normalized_variance(indepvars, depvars, depvar_names, npts_bandwidth
     :param scale_unit_box:
         (optional, default True) center/scale the independent variables between [0,1] for computing a normalized variance so the bandwidth values have the same meaning in each dimension
     :param n_threads:
-        (optional, default None) number of threads to run this computation. If None, default behavior of multiprocessing.Pool is used, which is to use all available cores on the current system.
+        (optional, default None) number of worker processes to run this computation if no ``pool`` is given. If None, all available cores on the current system are used.
+    :param weights:
+        (optional, default None) ``numpy.ndarray`` of non-negative observation weights :math:`w_i` of size ``(n_observations,)`` or ``(n_observations,1)``,
+        for instance ``preprocess.KernelDensity.weights``. They are passed to the kernel regression model (see ``KReg``) and the sums over observations
+        in the numerator and denominator of :math:`\\mathcal{N}(\\sigma)` are weighted by :math:`w_i`, with :math:`\\bar{y}` the weighted average.
+    :param pool:
+        (optional, default None) ``NormalizedVariancePool`` whose worker processes run this computation. If None, a pool of ``n_threads`` processes
+        is started for this call only.
+    :param refinement_tolerance:
+        (optional, default None) largest change of :math:`\\hat{\\mathcal{D}}(\\sigma)` allowed between neighboring bandwidths when refining the bandwidth grid adaptively.
+        If None, the bandwidth values are used as given.
+    :param max_npts_bandwidth:
+        (optional, default 200) maximum number of bandwidth values of the adaptively refined grid. It is only used if ``refinement_tolerance`` is given.
+    :param n_queries:
+        (optional, default None) number of query points sampled to estimate the normalized variance. If None, all observations are query points.
+    :param idx:
+        (optional, default None) ``numpy.ndarray`` of cluster classifications of size ``(n_observations,)`` by which the query points are stratified. It is only used if ``n_queries`` is given.
+    :param target_standard_error:
+        (optional, default None) largest standard error of the estimated normalized variance to grow the sample of query points to. It is only used if ``n_queries`` is given.
+    :param random_seed:
+        (optional, default None) ``int`` specifying the random seed of the sample of query points.
+    :param saturation_tolerance:
+        (optional, default None) largest distance of the normalized variance of every dependent variable from one at which the sweep over bandwidths stops.
+        If None, the normalized variance is computed at every bandwidth.
 
     :return:
         - **variance_data** - an object of the ``VarianceData`` class.
@@ -188,42 +688,84 @@ def compute_normalized_variance(indepvars, depvars, depvar_names, npts_bandwidth
         if not isinstance(bandwidth_values, np.ndarray):
             raise ValueError("bandwidth_values must be an array.")
 
-    lvar = np.zeros((bandwidth_values.size, yi.shape[1]))
-    kregmod = KReg(xi, yi)  # class for kernel regression evaluations
+    if refinement_tolerance is not None:
+        assert refinement_tolerance > 0., "refinement_tolerance must be positive."
+    if saturation_tolerance is not None:
+        assert saturation_tolerance > 0., "saturation_tolerance must be positive."
+    if refinement_tolerance is not None or saturation_tolerance is not None:
+        bandwidth_values = np.unique(bandwidth_values)
 
-    # define a list of argments for kregmod_predict
-    fcnArgs = [(xi, bandwidth_values[si]) for si in range(bandwidth_values.size) ]
-
-    pool = multiproc.Pool(processes=n_threads)
-    kregmodResults = pool.starmap( kregmod.predict, fcnArgs)
-
-    pool.close()
-    pool.join()
+    if n_queries is not None:
+        assert n_queries >= 1, "n_queries must be positive."
+        if idx is not None:
+            assert np.size(idx) == yi.shape[0], "idx must have one value per observation."
+        if target_standard_error is not None:
+            assert target_standard_error > 0., "target_standard_error must be positive."
+        query_sample = _QuerySample(yi.shape[0], n_queries, idx=idx, random_seed=random_seed)
 
-    for si in range(bandwidth_values.size):
-        lvar[si, :] = np.linalg.norm(yi - kregmodResults[si], axis=0) ** 2
+    if weights is None:
+        observation_weights = np.ones(yi.shape[0])
+    else:
+        observation_weights = np.asarray(weights, dtype=float).ravel()
+        assert observation_weights.size == yi.shape[0], "weights must have one value per observation."
+        assert np.all(observation_weights >= 0.) and np.any(observation_weights > 0.), "weights must be non-negative and not all zero."
+    sqrt_weights = np.sqrt(observation_weights)[:, None]
 
-    # saving the local variance for each yi...
-    local_var = dict({key: lvar[:, idx] for idx, key in enumerate(depvar_names)})
     # saving the global variance for each yi...
     global_var = dict(
-        {key: np.linalg.norm(yi[:, idx] - np.mean(yi[:, idx])) ** 2 for idx, key in enumerate(depvar_names)})
-    # saving the values of the bandwidth where the normalized variance increases by 10%...
-    bandwidth_10pct_rise = dict()
-    for key in depvar_names:
-        bandwidth_idx = np.argwhere(local_var[key] / global_var[key] >= 0.1)
-        if len(bandwidth_idx) == 0.:
-            bandwidth_10pct_rise[key] = None
-        else:
-            bandwidth_10pct_rise[key] = bandwidth_values[bandwidth_idx[0]][0]
-    norm_local_var = dict({key: local_var[key] / global_var[key] for key in depvar_names})
+        {key: np.linalg.norm(sqrt_weights[:, 0] * (yi[:, idx] - np.average(yi[:, idx], weights=observation_weights))) ** 2 for idx, key in enumerate(depvar_names)})
+
+    if n_queries is not None:
+        # the squared deviations at the query points estimate the global variance alongside the local one
+        global_residuals = observation_weights[:, None] * (yi - np.average(yi, axis=0, weights=observation_weights))**2
 
     # computing normalized variance as bandwidth approaches zero to check for non-uniqueness
-    lvar_limit = kregmod.predict(xi, 1.e-16)
-    nlvar_limit = np.linalg.norm(yi - lvar_limit, axis=0) ** 2
+    nlvar_limit = _duplicate_residual_sums(xi, yi, observation_weights)
     normvar_limit = dict({key: nlvar_limit[idx] for idx, key in enumerate(depvar_names)})
 
-    solution_data = VarianceData(bandwidth_values, norm_local_var, global_var, bandwidth_10pct_rise, depvar_names, normvar_limit)
+    # the query points are the training points, split into blocks over the worker processes
+    own_pool = pool is None
+    if own_pool:
+        pool = NormalizedVariancePool(n_processes=n_threads)
+    def residual_sums(values):
+        if n_queries is None:
+            return pool.residual_sums(xi, yi, values, weights=observation_weights if weights is not None else None), None
+        return query_sample.residual_sums(pool, xi, yi, values, observation_weights if weights is not None else None,
+                                          global_residuals, target_standard_error)
+
+    # the bandwidth at which the sweep stopped and the sums there, once the normalized variance saturated
+    saturation = None
+
+    def sweep(values, first_sweep):
+        if saturation_tolerance is None or (saturation is None and not first_sweep):
+            # refined bandwidths only stop at the saturation found by the sweep over the initial ones
+            return residual_sums(values) + (saturation,)
+        # the workers evaluate one bandwidth each before the saturation is checked
+        return _saturated_residual_sums(residual_sums, values, np.array([global_var[key] for key in depvar_names]), saturation_tolerance,
+                                        pool.n_processes, saturation)
+
+    def saturation_index(values):
+        return None if saturation is None else int(np.searchsorted(values, saturation[0]))
+
+    try:
+        (lvar, lvar_standard_error, saturation) = sweep(bandwidth_values, True)
+        solution_data = _variance_data(bandwidth_values, lvar, global_var, normvar_limit, depvar_names, lvar_standard_error, saturation_index(bandwidth_values))
+        while refinement_tolerance is not None:
+            new_bandwidth_values = _refined_bandwidths(solution_data, refinement_tolerance, max_npts_bandwidth - bandwidth_values.size)
+            if new_bandwidth_values.size == 0:
+                break
+            new_bandwidth_values = np.sort(new_bandwidth_values)
+            (new_lvar, new_lvar_standard_error, saturation) = sweep(new_bandwidth_values, False)
+            order = np.argsort(np.concatenate((bandwidth_values, new_bandwidth_values)), kind='stable')
+            bandwidth_values = np.concatenate((bandwidth_values, new_bandwidth_values))[order]
+            lvar = np.concatenate((lvar, new_lvar))[order]
+            if lvar_standard_error is not None:
+                lvar_standard_error = np.concatenate((lvar_standard_error, new_lvar_standard_error))[order]
+            solution_data = _variance_data(bandwidth_values, lvar, global_var, normvar_limit, depvar_names, lvar_standard_error, saturation_index(bandwidth_values))
+    finally:
+        if own_pool:
+            pool.close()
+
     return solution_data
 
 # ------------------------------------------------------------------------------
@@ -244,8 +786,8 @@ def normalized_variance_derivative(variance_data):
 
     This value relays how fast the variance is changing as the bandwidth changes and captures non-uniqueness from
     nonzero values of :math:`\lim_{\\sigma \\to 0} \\mathcal{N}(\\sigma)`. The derivative is approximated
-    with central finite differencing and the limit is approximated by :math:`\\mathcal{N}(\\sigma=10^{-16})` using the
-    ``normalized_variance_limit`` attribute of the ``VarianceData`` object.
+    with central finite differencing and the limit is taken from the ``normalized_variance_limit`` attribute of the ``VarianceData`` object,
+    where each observation is predicted by the average over its exact duplicates.
 
     More information can be found in :cite:`Armstrong2021`.
 
@@ -341,7 +883,8 @@ def find_local_maxima(dependent_values, independent_values, logscaling=True, thr
         else:
             indices = [idx - 2, idx - 1, idx, idx + 1]
         Dspl = CubicSpline(independent_values[indices], dependent_values[indices])
-        sigma_max = minimize(lambda s: -Dspl(s), independent_values[idx])
+        # the cubic is only fitted between these observations and grows without bound outside of them
+        sigma_max = minimize(lambda s: -Dspl(s[0]), independent_values[idx], bounds=[(independent_values[indices[0]], independent_values[indices[-1]])])
         zero_locations.append(sigma_max.x[0])
         zero_Dvalues.append(Dspl(sigma_max.x[0]))
     if show_plot:
@@ -364,7 +907,7 @@ def find_local_maxima(dependent_values, independent_values, logscaling=True, thr
 
 def random_sampling_normalized_variance(sampling_percentages, indepvars, depvars, depvar_names,
                                         n_sample_iterations=1, verbose=True, npts_bandwidth=25, min_bandwidth=None,
-                                        max_bandwidth=None, bandwidth_values=None, scale_unit_box=True, n_threads=None):
+                                        max_bandwidth=None, bandwidth_values=None, scale_unit_box=True, n_threads=None, pool=None):
     """
     Compute the normalized variance derivatives :math:`\\hat{\\mathcal{D}}(\\sigma)` for random samples of the provided
     data specified using ``sampling_percentages``. These will be averaged over ``n_sample_iterations`` iterations. Analyzing
@@ -397,7 +940,10 @@ def random_sampling_normalized_variance(sampling_percentages, indepvars, depvars
     :param scale_unit_box:
         (optional, default True) center/scale the independent variables between [0,1] for computing a normalized variance so the bandwidth values have the same meaning in each dimension
     :param n_threads:
-        (optional, default None) number of threads to run this computation. If None, default behavior of multiprocessing.Pool is used, which is to use all available cores on the current system.
+        (optional, default None) number of worker processes to run this computation if no ``pool`` is given. If None, all available cores on the current system are used.
+    :param pool:
+        (optional, default None) ``NormalizedVariancePool`` whose worker processes run this computation. If None, a pool of ``n_threads`` processes
+        is started for this call and reused for all samples.
 
     :return:
         - a dictionary of the normalized variance derivative (:math:`\\hat{\\mathcal{D}}(\\sigma)`) for each sampling percentage in ``sampling_percentages`` averaged over ``n_sample_iterations`` iterations
@@ -419,6 +965,12 @@ def random_sampling_normalized_variance(sampling_percentages, indepvars, depvars
     else:
         raise ValueError("sampling_percentages must be given as a list or 1D array.")
 
+    if pool is None:
+        with NormalizedVariancePool(n_processes=n_threads) as pool:
+            return random_sampling_normalized_variance(sampling_percentages, indepvars, depvars, depvar_names, n_sample_iterations=n_sample_iterations, verbose=verbose,
+                                                       npts_bandwidth=npts_bandwidth, min_bandwidth=min_bandwidth, max_bandwidth=max_bandwidth,
+                                                       bandwidth_values=bandwidth_values, scale_unit_box=scale_unit_box, pool=pool)
+
     normvar_data = {}
     avg_der_data = {}
 
@@ -436,7 +988,7 @@ def random_sampling_normalized_variance(sampling_percentages, indepvars, depvars
             nv_data[it] = compute_normalized_variance(indepvars[idxsample, :], depvars[idxsample, :], depvar_names,
                                                       npts_bandwidth=npts_bandwidth, min_bandwidth=min_bandwidth,
                                                       max_bandwidth=max_bandwidth, bandwidth_values=bandwidth_values,
-                                                      scale_unit_box=scale_unit_box, n_threads=n_threads)
+                                                      scale_unit_box=scale_unit_box, pool=pool)
 
             der, xder, _ = normalized_variance_derivative(nv_data[it])
             for key in der.keys():
@@ -790,7 +1342,7 @@ def cost_function_normalized_variance_derivative(variance_data, penalty_function
 
 # ------------------------------------------------------------------------------
 
-def manifold_informed_feature_selection(X, X_source, variable_names, scaling, bandwidth_values, target_variables=None, add_transformed_source=True, target_manifold_dimensionality=3, bootstrap_variables=None, penalty_function=None, norm='max', integrate_to_peak=False, verbose=False):
+def manifold_informed_feature_selection(X, X_source, variable_names, scaling, bandwidth_values, target_variables=None, add_transformed_source=True, target_manifold_dimensionality=3, bootstrap_variables=None, penalty_function=None, norm='max', integrate_to_peak=False, verbose=False, pool=None):
     """
     Manifold-informed feature selection algorithm based on forward feature addition. The goal of the algorithm is to
     select a meaningful subset of the original variables such that
@@ -888,6 +1440,9 @@ def manifold_informed_feature_selection(X, X_source, variable_names, scaling, ba
         ``bool`` specifying whether an individual area for the :math:`i^{th}` dependent variable should be computed only up the the rightmost peak location.
     :param verbose: (optional)
         ``bool`` for printing verbose details.
+    :param pool: (optional)
+        ``NormalizedVariancePool`` whose worker processes compute the normalized variance of every candidate manifold.
+        If ``None``, a pool is started for this call and reused for all candidates.
 
     :return:
         - **ordered_variables** - ``list`` specifying the indices of the ordered variables.
@@ -979,6 +1534,12 @@ def manifold_informed_feature_selection(X, X_source, variable_names, scaling, ba
     if not isinstance(verbose, bool):
         raise ValueError("Parameter `verbose` has to be of type `bool`.")
 
+    if pool is None:
+        with NormalizedVariancePool() as pool:
+            return manifold_informed_feature_selection(X, X_source, variable_names, scaling, bandwidth_values, target_variables=target_variables, add_transformed_source=add_transformed_source,
+                                                       target_manifold_dimensionality=target_manifold_dimensionality, bootstrap_variables=bootstrap_variables, penalty_function=penalty_function,
+                                                       norm=norm, integrate_to_peak=integrate_to_peak, verbose=verbose, pool=pool)
+
     variables_indices = [i for i in range(0,n_variables)]
 
     costs = []
@@ -1010,7 +1571,7 @@ def manifold_informed_feature_selection(X, X_source, variable_names, scaling, ba
                     depvars = target_variables
                     depvar_names = target_variables_names
 
-            bootstrap_variance_data = compute_normalized_variance(PCs, depvars, depvar_names=depvar_names, bandwidth_values=bandwidth_values)
+            bootstrap_variance_data = compute_normalized_variance(PCs, depvars, depvar_names=depvar_names, bandwidth_values=bandwidth_values, pool=pool)
 
             bootstrap_area = cost_function_normalized_variance_derivative(bootstrap_variance_data, penalty_function=penalty_function, norm=norm, integrate_to_peak=integrate_to_peak)
             if verbose: print('\tCost:\t%.4f' % bootstrap_area)
@@ -1061,7 +1622,7 @@ def manifold_informed_feature_selection(X, X_source, variable_names, scaling, ba
                 depvars = target_variables
                 depvar_names = target_variables_names
 
-        bootstrap_variance_data = compute_normalized_variance(PCs, depvars, depvar_names=depvar_names, bandwidth_values=bandwidth_values)
+        bootstrap_variance_data = compute_normalized_variance(PCs, depvars, depvar_names=depvar_names, bandwidth_values=bandwidth_values, pool=pool)
 
         bootstrap_area = cost_function_normalized_variance_derivative(bootstrap_variance_data, penalty_function=penalty_function, norm=norm, integrate_to_peak=integrate_to_peak)
         bootstrap_cost_function.append(bootstrap_area)
@@ -1123,7 +1684,7 @@ def manifold_informed_feature_selection(X, X_source, variable_names, scaling, ba
                     depvars = target_variables
                     depvar_names = target_variables_names
 
-            current_variance_data = compute_normalized_variance(PCs, depvars, depvar_names=depvar_names, bandwidth_values=bandwidth_values)
+            current_variance_data = compute_normalized_variance(PCs, depvars, depvar_names=depvar_names, bandwidth_values=bandwidth_values, pool=pool)
             current_derivative, current_sigma, _ = normalized_variance_derivative(current_variance_data)
 
             current_area = cost_function_normalized_variance_derivative(current_variance_data, penalty_function=penalty_function, norm=norm, integrate_to_peak=integrate_to_peak)
@@ -1183,7 +1744,7 @@ def manifold_informed_feature_selection(X, X_source, variable_names, scaling, ba
 
 # ------------------------------------------------------------------------------
 
-def manifold_informed_backward_elimination(X, X_source, variable_names, scaling, bandwidth_values, target_variables=None, add_transformed_source=True, source_space=None, target_manifold_dimensionality=3, penalty_function=None, norm='max', integrate_to_peak=False, verbose=False):
+def manifold_informed_backward_elimination(X, X_source, variable_names, scaling, bandwidth_values, target_variables=None, add_transformed_source=True, source_space=None, target_manifold_dimensionality=3, penalty_function=None, norm='max', integrate_to_peak=False, verbose=False, pool=None):
     """
     Manifold-informed feature selection algorithm based on backward elimination. The goal of the algorithm is to
     select a meaningful subset of the original variables such that
@@ -1275,6 +1836,9 @@ def manifold_informed_backward_elimination(X, X_source, variable_names, scaling,
         ``bool`` specifying whether an individual area for the :math:`i^{th}` dependent variable should be computed only up the the rightmost peak location.
     :param verbose: (optional)
         ``bool`` for printing verbose details.
+    :param pool: (optional)
+        ``NormalizedVariancePool`` whose worker processes compute the normalized variance of every candidate manifold.
+        If ``None``, a pool is started for this call and reused for all candidates.
 
     :return:
         - **ordered_variables** - ``list`` specifying the indices of the ordered variables.
@@ -1368,6 +1932,12 @@ def manifold_informed_backward_elimination(X, X_source, variable_names, scaling,
     if not isinstance(verbose, bool):
         raise ValueError("Parameter `verbose` has to be of type `bool`.")
 
+    if pool is None:
+        with NormalizedVariancePool() as pool:
+            return manifold_informed_backward_elimination(X, X_source, variable_names, scaling, bandwidth_values, target_variables=target_variables, add_transformed_source=add_transformed_source,
+                                                          source_space=source_space, target_manifold_dimensionality=target_manifold_dimensionality, penalty_function=penalty_function,
+                                                          norm=norm, integrate_to_peak=integrate_to_peak, verbose=verbose, pool=pool)
+
     costs = []
 
     if verbose: print('Optimizing...\n')
@@ -1449,7 +2019,7 @@ def manifold_informed_backward_elimination(X, X_source, variable_names, scaling,
                     depvars = cp.deepcopy(target_variables)
                     depvar_names = cp.deepcopy(target_variables_names)
 
-            current_variance_data = compute_normalized_variance(PCs, depvars, depvar_names=depvar_names, scale_unit_box = False, bandwidth_values=bandwidth_values)
+            current_variance_data = compute_normalized_variance(PCs, depvars, depvar_names=depvar_names, scale_unit_box = False, bandwidth_values=bandwidth_values, pool=pool)
             current_area = cost_function_normalized_variance_derivative(current_variance_data, penalty_function=penalty_function, norm=norm, integrate_to_peak=integrate_to_peak)
             if verbose: print('\tCost:\t%.4f' % current_area)
             current_cost_function.append(current_area)
@@ -0,0 +1,1575 @@
+import numpy as np
+import os
+import itertools
+from scipy.spatial import cKDTree
+from scipy.spatial.distance import pdist, cdist
+from scipy.linalg import solve_triangular
+from scipy.signal import fftconvolve
+from scipy.optimize import minimize, minimize_scalar
+from scipy.special import comb, factorial, gammaln
+from PCAfold import kernel_regression_numpy
+
+# The kernel sums are evaluated by the compiled extension if it was built, and by the NumPy fallback otherwise.
+try:
+    from PCAfold import kernel_regression_cython
+except ImportError:
+    kernel_regression_cython = None
+
+_KERNEL_BACKENDS = {'cython': kernel_regression_cython, 'numpy': kernel_regression_numpy}
+
+# From this number of independent variables on, the kernel sums over all training points are evaluated on tiles of query points
+# with the matrix products of kernel_regression_numpy, whose BLAS distance computation outpaces the per-pair loops of the compiled kernels.
+_MATRIX_PRODUCT_MIN_DIMENSIONS = 12
+# the blocked symmetric kernel of predict_on_training evaluates each pair once, which keeps it ahead up to about four times as many variables
+_SYMMETRIC_MATRIX_PRODUCT_MIN_DIMENSIONS = 4 * _MATRIX_PRODUCT_MIN_DIMENSIONS
+
+def _select_backend(backend):
+    """
+    Resolve the ``backend`` argument of ``KReg`` to ``'cython'`` or ``'numpy'``
+    """
+    if backend is None:
+        return 'numpy' if kernel_regression_cython is None else 'cython'
+    if backend not in _KERNEL_BACKENDS:
+        raise ValueError("Unsupported backend.")
+    if _KERNEL_BACKENDS[backend] is None:
+        raise ImportError("The compiled kernel_regression_cython extension is not available, build it with setup.py or use backend='numpy'.")
+    return backend
+
+def _graded_multi_indices(n_dims, order):
+    """
+    Build the multi-indices of all monomials in ``n_dims`` variables of total degree below ``order`` in graded lexicographic order.
+    Monomial :math:`t > 0` is the product of variable ``factor_variable[t]`` and the earlier monomial ``factor_monomial[t]``,
+    so all monomials of a set of points can be built with one multiplication each.
+
+    :return:
+        - **factor_variable** - index of the variable multiplying the earlier monomial.
+        - **factor_monomial** - index of the earlier monomial.
+        - **constants** - the Taylor series constants :math:`2^{|\\alpha|}/\\alpha!` of the improved fast Gauss transform.
+    """
+    alphas = [np.zeros(n_dims, dtype=int)]
+    factor_variable = [-1]
+    factor_monomial = [-1]
+    heads = [0] * n_dims
+    tail = 1
+    for degree in range(1, order):
+        for i in range(n_dims):
+            head = heads[i]
+            heads[i] = len(alphas)
+            for j in range(head, tail):
+                alpha = alphas[j].copy()
+                alpha[i] += 1
+                alphas.append(alpha)
+                factor_variable.append(i)
+                factor_monomial.append(j)
+        tail = len(alphas)
+    alphas = np.array(alphas)
+    constants = 2.**np.sum(alphas, axis=1) / np.prod(factorial(alphas), axis=1)
+    return np.array(factor_variable), np.array(factor_monomial), constants
+
+def _monomials(dx, factor_variable, factor_monomial):
+    """
+    Evaluate all monomials built by ``_graded_multi_indices`` for the rows of ``dx``, returned as (n_terms x n_points)
+    so that each monomial is a contiguous row.
+    """
+    dx = np.ascontiguousarray(dx.T)
+    monomials = np.empty((factor_variable.size, dx.shape[1]))
+    monomials[0, :] = 1.
+    for t in range(1, factor_variable.size):
+        np.multiply(dx[factor_variable[t]], monomials[factor_monomial[t]], out=monomials[t])
+    return monomials
+
+def ifgt_evaluate(x, x_train, q_train, tol, max_terms=2000):
+    """
+    Approximate the discrete Gauss transforms :math:`G_c(x_j) = \\sum_i q_{ic} \\exp(-|| x_j - x_{train,i} ||_2^2)`
+    with the improved fast Gauss transform of Yang et al. (2005) with the error bounds of Raykar et al. (2005).
+    The training (source) points are grouped with farthest-point clustering and the Gaussian is expanded in a
+    truncated Taylor series about each cluster center. Only clusters within a cutoff radius of a query (target) point contribute.
+    The number of clusters is chosen to minimize the estimated cost and the truncation order and cutoff radius are chosen such that
+    :math:`|\\tilde{G}_c - G_c| \\leq \\text{tol} \\sum_i |q_{ic}|`.
+
+    :param x:
+        query points, already scaled by the bandwidth (n_points x n_dims)
+    :param x_train:
+        training points, already scaled by the bandwidth (n_observations x n_dims)
+    :param q_train:
+        weights of the training points (n_observations x n_weights)
+    :param tol:
+        error bound per unit total absolute weight
+    :param max_terms:
+        (optional, default 2000) largest number of Taylor series terms to consider
+
+    :return:
+        the approximate Gauss transforms (n_points x n_weights), or None if the error bound cannot be met with at most ``max_terms`` terms
+        or the expansion is not expected to be cheaper than the exact sums
+    """
+    n, n_dims = x_train.shape
+    cutoff = np.sqrt(np.log(2. / tol))  # exp(-cutoff^2) = tol/2
+
+    def truncation_order(radius):
+        # smallest order with (2^p/p!) (r_x r_y)^p <= tol/2, or None
+        log_a = np.log(2. * radius * (radius + cutoff)) if radius > 0. else -np.inf
+        order = 1
+        while comb(order - 1 + n_dims, n_dims, exact=True) <= max_terms:
+            if order * log_a - gammaln(order + 1) <= np.log(tol / 2.):
+                return order
+            order += 1
+        return None
+
+    # largest cluster radius meeting the error bound with at most max_terms terms
+    max_order = 1
+    while comb(max_order + n_dims, n_dims, exact=True) <= max_terms:
+        max_order += 1
+    max_radius = 0.5 * (np.sqrt(cutoff**2 + 2. * np.exp((np.log(tol / 2.) + gammaln(max_order + 1)) / max_order)) - cutoff)
+
+    # The costs are counted in series terms; an exact kernel evaluation costs a few terms, so the expansion is only used
+    # when its estimated cost is below half the number of exact kernel evaluations.
+    exact_cost = 0.5 * x.shape[0] * n
+    rng = np.random.RandomState(0)
+    sample_points = x[rng.choice(x.shape[0], min(x.shape[0], 256), replace=False)]
+
+    def farthest_point_clustering(points, max_clusters):
+        # farthest-point clustering of points, keeping the snapshot with the lowest estimated cost at K = 1, 2, 4, ...
+        # With very many clusters the cutoff neighborhoods hold few points and pruning the exact sums is the better choice.
+        # The clustering stops early once the estimated cost rises above that of the exact sums, or when the radius, falling
+        # at the rate measured since the previous snapshot, would only meet the error bound with more than max_clusters clusters.
+        centered = points - np.mean(points, axis=0)
+        sq_norms = np.sum(centered**2, axis=1)
+        centers = [0]
+        sq_dist = np.sum((points - points[0])**2, axis=1)
+        labels = np.zeros(points.shape[0], dtype=np.int64)
+        best = None
+        best_cost = np.inf
+        n_increases = 0
+        checkpoint = 1
+        previous_checkpoint, previous_radius = 1, np.inf
+        while True:
+            if len(centers) == checkpoint:
+                center_points = points[centers]
+                sq_dist = np.sum((points - center_points[labels])**2, axis=1)
+                radius = np.sqrt(np.max(sq_dist))
+                order = truncation_order(radius)
+                if order is not None:
+                    n_terms = comb(order - 1 + n_dims, n_dims, exact=True)
+                    n_near = np.mean(np.sum(np.sum((sample_points[:, None, :] - center_points[None, :, :])**2, axis=2) <= (radius + cutoff)**2, axis=1))
+                    cost = n * n_terms + x.shape[0] * n_near * n_terms + n * len(centers)
+                    if cost < best_cost:
+                        best = (center_points, labels.copy(), radius, order)
+                        best_cost = cost
+                        n_increases = 0
+                    else:
+                        n_increases += 1
+                elif checkpoint >= 32 and radius < previous_radius:
+                    rate = min(n_dims, np.log(checkpoint / previous_checkpoint) / np.log(previous_radius / radius))
+                    if checkpoint * (radius / max_radius)**rate > max_clusters:
+                        break
+                if n_increases >= 2 or (n_increases and best_cost > exact_cost) or checkpoint >= max_clusters or radius == 0. or 2 * n * checkpoint > min(best_cost, exact_cost):
+                    break
+                previous_checkpoint, previous_radius = checkpoint, radius
+                checkpoint = min(2 * checkpoint, max_clusters)
+            new_center = int(np.argmax(sq_dist))
+            new_sq_dist = sq_norms - 2. * np.dot(centered, centered[new_center]) + sq_norms[new_center]
+            closer = new_sq_dist < sq_dist
+            labels[closer] = len(centers)
+            sq_dist[closer] = new_sq_dist[closer]
+            centers.append(new_center)
+        return best, best_cost
+
+    # check feasibility on a subsample before clustering all points: its cluster radii estimate those of all points,
+    # so when no number of clusters meets the error bound at a lower cost than the exact sums, the expansion is skipped.
+    # Otherwise all points are clustered up to twice the number of clusters found best for the subsample.
+    max_clusters = min(n, int(4 * np.sqrt(n)) + 1)
+    n_subsample = min(n, max(8192, 8 * max_clusters))
+    if n_subsample < n:
+        best, best_cost = farthest_point_clustering(x_train[rng.choice(n, n_subsample, replace=False)], max_clusters)
+        if best is None or best_cost > exact_cost:
+            return None
+        max_clusters = min(max_clusters, 2 * best[0].shape[0])
+
+    best, best_cost = farthest_point_clustering(x_train, max_clusters)
+    if best is None or best_cost > exact_cost:
+        return None
+    center_points, labels, radius, order = best
+    factor_variable, factor_monomial, constants = _graded_multi_indices(n_dims, order)
+
+    transform = np.zeros((x.shape[0], q_train.shape[1]))
+    tree = cKDTree(x)
+    for k in range(center_points.shape[0]):
+        sources = labels == k
+        if not np.any(sources):
+            continue
+        targets = tree.query_ball_point(center_points[k], radius + cutoff)
+        if len(targets) == 0:
+            continue
+        dx = x_train[sources] - center_points[k]
+        source_monomials = _monomials(dx, factor_variable, factor_monomial)
+        coefficients = constants[:, None] * source_monomials.dot(q_train[sources] * np.exp(-np.sum(dx**2, axis=1))[:, None])
+        dy = x[targets] - center_points[k]
+        target_monomials = _monomials(dy, factor_variable, factor_monomial)
+        transform[targets] += np.exp(-np.sum(dy**2, axis=1))[:, None] * target_monomials.T.dot(coefficients)
+    return transform
+
+def nystrom_factor(x_train, tol, max_rank):
+    """
+    Build a low-rank Nystrom approximation :math:`K \\approx L L^T` of the Gaussian kernel matrix
+    :math:`K_{ij} = \\exp(-|| x_{train,i} - x_{train,j} ||_2^2)` with a diagonally pivoted Cholesky factorization.
+    The pivots are the landmark points. The factorization stops once the largest diagonal of the residual
+    :math:`K - L L^T` is at most ``tol``. Because the residual is positive semi-definite, each of its entries is bounded by
+    :math:`\\sqrt{e_i e_j}` where :math:`e` is its diagonal.
+
+    :param x_train:
+        training points, already scaled by the bandwidth (n_observations x n_dims)
+    :param tol:
+        bound on the largest diagonal of the residual
+    :param max_rank:
+        largest number of landmark points to use
+
+    :return:
+        - **pivots** - indices of the landmark points (rank,).
+        - **factor** - the transposed Cholesky factor :math:`L^T` (rank x n_observations).
+        - **residual** - the largest diagonal of the residual.
+
+        or None if the residual bound cannot be met with at most ``max_rank`` landmark points
+    """
+    n = x_train.shape[0]
+    residual_diagonal = np.ones(n)
+    factor = np.empty((min(n, max_rank, 64), n))
+    pivots = []
+    for k in range(min(n, max_rank) + 1):
+        pivot = int(np.argmax(residual_diagonal))
+        residual = residual_diagonal[pivot]
+        if residual <= tol:
+            return np.array(pivots, dtype=np.int64), factor[:k], max(residual, 0.)
+        if k == min(n, max_rank):
+            return None
+        if k == factor.shape[0]:
+            factor = np.vstack((factor, np.empty((min(k, max_rank - k), n))))
+        column = np.exp(-np.sum((x_train - x_train[pivot])**2, axis=1))
+        column -= factor[:k, pivot].dot(factor[:k])
+        column /= np.sqrt(residual)
+        column[pivots] = 0.
+        factor[k] = column
+        residual_diagonal -= column**2
+        residual_diagonal[pivot] = 0.
+        pivots.append(pivot)
+
+def _grid_corners(points, lower, spacing, n_bins):
+    """
+    Locate ``points`` on a regular grid with ``n_bins`` nodes per dimension starting at ``lower``.
+    For each of the :math:`2^d` corners of the enclosing grid cell, yield the flat node index of every point and its multilinear weight.
+    """
+    position = (points - lower) / spacing
+    cell = np.clip(np.floor(position).astype(np.int64), 0, np.asarray(n_bins) - 2)
+    fraction = np.clip(position - cell, 0., 1.)
+    for offset in itertools.product((0, 1), repeat=points.shape[1]):
+        offset = np.array(offset)
+        weight = np.prod(np.where(offset, fraction, 1. - fraction), axis=1)
+        yield np.ravel_multi_index((cell + offset).T, n_bins), weight
+
+def binned_grid(x, x_train, q_train, n_bins):
+    """
+    Spread the weights ``q_train`` of the training points onto a regular grid with linear binning.
+    The grid spans the bounding box of the query and training points.
+
+    :param x:
+        query points (n_points x n_dims)
+    :param x_train:
+        training points (n_observations x n_dims)
+    :param q_train:
+        weights of the training points (n_observations x n_weights)
+    :param n_bins:
+        number of grid nodes per dimension, at least 2
+
+    :return:
+        - **lower** - coordinates of the first grid node.
+        - **spacing** - grid spacing per dimension.
+        - **grid** - binned weights of size ``(n_weights,) + n_bins``.
+    """
+    n_bins = tuple(int(n) for n in n_bins)
+    lower = np.minimum(np.min(x, axis=0), np.min(x_train, axis=0)).astype(float)
+    upper = np.maximum(np.max(x, axis=0), np.max(x_train, axis=0)).astype(float)
+    spacing = np.where(upper > lower, (upper - lower) / (np.array(n_bins) - 1), 1.)
+    grid = np.zeros((q_train.shape[1], int(np.prod(n_bins))))
+    for flat_index, weight in _grid_corners(x_train, lower, spacing, n_bins):
+        for c in range(q_train.shape[1]):
+            grid[c] += np.bincount(flat_index, weights=weight * q_train[:, c], minlength=grid.shape[1])
+    return lower, spacing, grid.reshape((q_train.shape[1],) + n_bins)
+
+def binned_evaluate(x, lower, spacing, grid, inv_s2, tol):
+    """
+    Convolve a grid from ``binned_grid`` with the Gaussian kernel :math:`\\exp(-\\sum_l \\Delta_l^2 / \\sigma_l^2)` using FFTs,
+    one dimension at a time since the kernel is separable, and interpolate the result multilinearly to the query points.
+    The kernel is truncated where it falls below ``tol``.
+
+    :param x:
+        query points (n_points x n_dims)
+    :param inv_s2:
+        :math:`1/\\sigma^2`, a single value or one value per dimension
+    :param tol:
+        kernel truncation threshold
+
+    :return:
+        the approximate Gauss transforms of the binned weights at the query points (n_points x n_weights)
+    """
+    n_bins = grid.shape[1:]
+    inv_s2 = np.broadcast_to(np.asarray(inv_s2, dtype=float).ravel(), (len(n_bins),))
+    transform = grid
+    for l in range(len(n_bins)):
+        half_width = int(min(n_bins[l] - 1, np.ceil(np.sqrt(np.log(1. / tol) / inv_s2[l]) / spacing[l])))
+        kernel_shape = [1] * grid.ndim
+        kernel_shape[l + 1] = 2 * half_width + 1
+        kernel = np.exp(-(np.arange(-half_width, half_width + 1) * spacing[l])**2 * inv_s2[l]).reshape(kernel_shape)
+        transform = fftconvolve(transform, kernel, mode='same', axes=l + 1)
+    transform = transform.reshape((grid.shape[0], -1))
+    result = np.zeros((x.shape[0], grid.shape[0]))
+    for flat_index, weight in _grid_corners(x, lower, spacing, n_bins):
+        result += weight[:, None] * transform[:, flat_index].T
+    return result
+
+# identifies files written by KReg.save, padded so that the arrays that follow start at aligned offsets
+_KREG_FILE_HEADER = b'PCAfold KReg model file, format 1'.ljust(64, b'\x00')
+
+class _BlockTree:
+    """
+    Spatial index over the rows of a growing array, kept as k-d trees over consecutive blocks of rows.
+    New rows get a tree of their own and the last blocks are merged while a block is at most twice the size of the block after it,
+    so the block sizes decrease geometrically, there are :math:`O(\\log n)` blocks and each row is re-indexed :math:`O(\\log n)` times
+    over any sequence of appends. Queries are answered by every block and merged, returning indices into the whole array.
+    """
+    def __init__(self):
+        self._blocks = []   # (start, stop, cKDTree) for consecutive row ranges
+
+    @property
+    def size(self):
+        return self._blocks[-1][1] if self._blocks else 0
+
+    def update(self, points):
+        """
+        Index the rows of ``points`` that follow the indexed ones
+        """
+        n = points.shape[0]
+        start = self.size
+        if n <= start:
+            return
+        while self._blocks and self._blocks[-1][1] - self._blocks[-1][0] <= 2 * (n - start):
+            start = self._blocks.pop()[0]
+        self._blocks.append((start, n, cKDTree(points[start:n])))
+
+    def truncate(self, n):
+        """
+        Drop the blocks that index any row from ``n`` onwards, for instance after these rows were changed
+        """
+        while self._blocks and self._blocks[-1][1] > n:
+            self._blocks.pop()
+
+    def query(self, points, k, workers=1):
+        """
+        Return the distances and indices of the ``k`` nearest rows to each of ``points``, both of size (n_points x k),
+        padded with infinite distances and the index ``size`` if fewer than ``k`` rows are indexed
+        """
+        distances, indices = [], []
+        for start, stop, tree in self._blocks:
+            block_k = min(k, stop - start)
+            block_distances, block_indices = tree.query(points, k=block_k, workers=workers)
+            distances.append(block_distances.reshape(points.shape[0], block_k))
+            indices.append(block_indices.reshape(points.shape[0], block_k) + start)
+        if len(self._blocks) == 1 and distances[0].shape[1] == k:
+            return distances[0], indices[0]
+        distances = np.hstack(distances + [np.full((points.shape[0], k), np.inf)])
+        indices = np.hstack(indices + [np.full((points.shape[0], k), self.size, dtype=np.int64)])
+        order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+    def count_ball_point(self, points, radius, workers=1):
+        """
+        Return the number of rows within ``radius`` of each of ``points``
+        """
+        counts = np.zeros(points.shape[0], dtype=np.int64)
+        for start, stop, tree in self._blocks:
+            counts += tree.query_ball_point(points, radius, workers=workers, return_length=True)
+        return counts
+
+    def query_ball_point(self, points, radius, workers=1):
+        """
+        Return the rows within ``radius`` of each of ``points`` in compressed sparse row format, ``(indptr, indices)``,
+        with the indices of each point in increasing order
+        """
+        rows, indices = [], []
+        for start, stop, tree in self._blocks:
+            neighbors = tree.query_ball_point(points, radius, workers=workers, return_sorted=True)
+            counts = np.array([len(point_neighbors) for point_neighbors in neighbors], dtype=np.int64)
+            if np.sum(counts) > 0:
+                rows.append(np.repeat(np.arange(points.shape[0]), counts))
+                indices.append(np.concatenate([np.asarray(point_neighbors, dtype=np.int64) for point_neighbors in neighbors]) + start)
+        indptr = np.zeros(points.shape[0] + 1, dtype=np.int64)
+        if len(indices) == 0:
+            return indptr, np.zeros(0, dtype=np.int64)
+        rows = np.concatenate(rows)
+        indices = np.concatenate(indices)
+        if len(self._blocks) > 1:
+            # the blocks are in increasing index order, so a stable sort by row keeps each row sorted
+            order = np.argsort(rows, kind='stable')
+            rows, indices = rows[order], indices[order]
+        np.cumsum(np.bincount(rows, minlength=points.shape[0]), out=indptr[1:])
+        return indptr, indices
+
+class KReg:
+    """
+    A class for building and evaluating Nadaraya-Watson kernel regression models using a Gaussian kernel.
+    The regression estimator :math:`\\mathcal{K}(u; \\sigma)` evaluated at independent variables :math:`u` can be
+    expressed using a set of :math:`n` observations of independent variables (:math:`x`) and dependent variables
+    (:math:`y`) as follows
+
+    .. math::
+
+            \\mathcal{K}(u; \\sigma) = \\frac{\\sum_{i=1}^{n} \\mathcal{W}_i(u; \\sigma) y_i}{\\sum_{i=1}^{n} \\mathcal{W}_i(u; \\sigma)}
+
+    where a Gaussian kernel of bandwidth :math:`\\sigma` is used as
+
+    .. math::
+        \\mathcal{W}_i(u; \\sigma) = \\exp \\left( \\frac{-|| x_i - u ||_2^2}{\\sigma^2} \\right)
+
+    Both constant and variable bandwidths are supported. Kernels with anisotropic bandwidths are calculated as
+
+    .. math::
+        \\mathcal{W}_i(u; \\sigma) = \\exp \\left( -|| \\text{diag}(\\sigma)^{-1} (x_i - u) ||_2^2 \\right)
+
+    where :math:`\\sigma` is a vector of bandwidths per independent variable.
+
+    **Example:**
+
+    .. code::
+
+      from PCAfold import KReg
+      import numpy as np
+
+      indepvars = np.expand_dims(np.linspace(0,np.pi,11),axis=1)
+      depvars = np.cos(indepvars)
+      query = np.expand_dims(np.linspace(0,np.pi,21),axis=1)
+
+      model = KReg(indepvars, depvars)
+      predicted = model.predict(query, 'nearest_neighbors_isotropic', n_neighbors=1)
+
+    :param indepvars:
+        ``numpy.ndarray`` specifying the independent variable training data, :math:`x` in equations above. It should be of size ``(n_observations,n_independent_variables)``.
+    :param depvars:
+        ``numpy.ndarray`` specifying the dependent variable training data, :math:`y` in equations above. It should be of size ``(n_observations,n_dependent_variables)``.
+    :param internal_dtype:
+        (optional, default float) data type to enforce in training and evaluating. Supported types are ``float``/``numpy.float64``
+        and ``numpy.float32``. With ``numpy.float32`` the kernel sums are computed in single precision, which halves the memory traffic
+        at the cost of accuracy.
+    :param supress_warning:
+        (optional, default False) if True, turns off printed warnings
+    :param weights:
+        (optional, default None) ``numpy.ndarray`` of non-negative observation weights :math:`w_i` of size ``(n_observations,)`` or ``(n_observations,1)``.
+        Each kernel :math:`\\mathcal{W}_i` is multiplied by :math:`w_i` in every evaluation, which has the same effect as repeating observations
+        in proportion to their weights without the extra memory and kernel evaluations. For instance, ``preprocess.KernelDensity.weights``
+        counter a biased sampling density.
+    :param backend:
+        (optional, default None) ``'cython'`` to evaluate the kernel sums with the compiled extension or ``'numpy'`` to evaluate them
+        with vectorized NumPy operations on tiles of query points, see ``PCAfold.kernel_regression_numpy``. If None, the compiled
+        extension is used if it was built and NumPy otherwise, except that with 12 or more independent variables, sums over all training points are
+        evaluated with the NumPy tiles, since their squared distances are computed as :math:`||x||^2 + ||x_i||^2 - 2 x \\cdot x_i`
+        by matrix products, which is faster than the per-pair loops of the compiled kernels in many dimensions. These sums then ignore ``n_threads``
+        (the matrix products use the threads of the BLAS library), are accumulated in double precision even with ``internal_dtype=numpy.float32``
+        (the predictions keep ``internal_dtype``). ``predict_on_training``, which evaluates each pair once, keeps the compiled extension
+        up to 47 independent variables. Sums over the neighbor lists of ``kernel_tolerance`` always use the selected backend.
+        An explicit ``'cython'`` or ``'numpy'`` is used for all sums regardless of the number of independent variables.
+    """
+    def __init__(self, indepvars, depvars, internal_dtype=float, supress_warning=False, weights=None, backend=None):
+        assert indepvars.ndim == 2, "independent variable array must be 2D: n_observations x n_variables."
+        assert depvars.ndim == 2, "dependent variable array must be 2D: n_observations x n_variables."
+        assert indepvars.shape[0] == depvars.shape[0], "number of observations for independent and dependent variables must match."
+        assert np.dtype(internal_dtype) in (np.float32, np.float64), "internal_dtype must be float, numpy.float64 or numpy.float32."
+        if weights is not None:
+            weights = np.asarray(weights).ravel()
+            assert weights.size == indepvars.shape[0], "weights must have one value per observation."
+            assert np.all(weights >= 0.) and np.any(weights > 0.), "weights must be non-negative and not all zero."
+        _select_backend(backend)
+
+        if not isinstance(indepvars[0][0], internal_dtype) or not isinstance(depvars[0][0], internal_dtype):
+            if not supress_warning:
+                print("WARNING: casting training data as",internal_dtype)
+
+        self._set_training_data(indepvars.astype(internal_dtype), depvars.astype(internal_dtype),
+                                None if weights is None else weights.astype(internal_dtype), internal_dtype, backend)
+
+    def _set_training_data(self, indepvars, depvars, weights, internal_dtype, backend):
+        """
+        Take ownership of training data that is already of ``internal_dtype``, without copying it.
+        ``backend`` is the argument of ``KReg``; only if it is None are the dense sums routed by the number of independent variables.
+        """
+        self._indepvars = indepvars
+        self._depvars = depvars
+        # add_observations grows these buffers geometrically, _indepvars and _depvars are views of their first rows
+        self._indepvars_storage = self._indepvars
+        self._depvars_storage = self._depvars
+        self._weights = weights
+        self._weights_storage = self._weights
+        self._internal_dtype = internal_dtype
+        self._backend = _select_backend(backend)
+        self._route_by_dimensions = backend is None
+        self._nystrom_cache = None
+        self._tree = None
+        self._dimension_trees = [None] * self._indepvars.shape[1]
+
+    def __getstate__(self):
+        # the spatial indexes and the Nystrom factorization are rebuilt lazily, so they are not copied to other processes
+        state = self.__dict__.copy()
+        state['_nystrom_cache'] = None
+        state['_indepvars_storage'] = self._indepvars
+        state['_depvars_storage'] = self._depvars
+        state['_weights_storage'] = self._weights
+        state['_tree'] = None
+        state['_dimension_trees'] = [None] * self._indepvars.shape[1]
+        return state
+
+    @property
+    def indepvars(self):
+        return self._indepvars
+
+    @property
+    def depvars(self):
+        return self._depvars
+
+    @property
+    def weights(self):
+        return self._weights
+
+    @property
+    def internal_dtype(self):
+        return self._internal_dtype
+
+    @property
+    def backend(self):
+        return self._backend
+
+    @property
+    def _kernels(self):
+        return _KERNEL_BACKENDS[self._backend]
+
+    @property
+    def _dense_kernels(self):
+        if self._route_by_dimensions and self._indepvars.shape[1] >= _MATRIX_PRODUCT_MIN_DIMENSIONS:
+            return kernel_regression_numpy
+        return self._kernels
+
+    @property
+    def _symmetric_kernels(self):
+        if self._route_by_dimensions and self._indepvars.shape[1] >= _SYMMETRIC_MATRIX_PRODUCT_MIN_DIMENSIONS:
+            return kernel_regression_numpy
+        return self._kernels
+
+    def _weighted_depvars(self):
+        """
+        Return ``[depvars, 1]`` multiplied by the observation weights in double precision, the sources of the approximate kernel sums
+        """
+        q_train = np.hstack((self._depvars, np.ones((self._depvars.shape[0], 1), dtype=self._internal_dtype))).astype(float)
+        if self._weights is not None:
+            q_train *= self._weights[:, None]
+        return q_train
+
+    def _total_weight(self):
+        """
+        Return the sum of the observation weights, which bounds the kernel sum of any query point
+        """
+        return self._indepvars.shape[0] if self._weights is None else float(np.sum(self._weights))
+
+    def _get_tree(self):
+        """
+        Return the spatial index over ``indepvars``, built on first use and kept for later calls.
+        Observations added since the last call are indexed incrementally.
+        """
+        if self._tree is None:
+            self._tree = _BlockTree()
+        self._tree.update(self._indepvars)
+        return self._tree
+
+    def _get_dimension_tree(self, i):
+        """
+        Return the spatial index over independent variable ``i`` of ``indepvars``, built on first use and kept for later calls.
+        Observations added since the last call are indexed incrementally.
+        """
+        if self._dimension_trees[i] is None:
+            self._dimension_trees[i] = _BlockTree()
+        self._dimension_trees[i].update(self._indepvars[:, i:i+1])
+        return self._dimension_trees[i]
+
+    def _reserve(self, n_observations):
+        """
+        Make the training data buffers writeable with room for at least ``n_observations``, growing their capacity geometrically
+        """
+        capacity = self._indepvars_storage.shape[0]
+        if n_observations <= capacity and self._indepvars_storage.flags.writeable and self._depvars_storage.flags.writeable \
+                and (self._weights is None or self._weights_storage.flags.writeable):
+            return
+        capacity = max(n_observations, 2 * capacity)
+        n = self._indepvars.shape[0]
+        self._indepvars_storage = np.empty((capacity, self._indepvars.shape[1]), dtype=self._internal_dtype)
+        self._depvars_storage = np.empty((capacity, self._depvars.shape[1]), dtype=self._internal_dtype)
+        self._indepvars_storage[:n] = self._indepvars
+        self._depvars_storage[:n] = self._depvars
+        self._indepvars = self._indepvars_storage[:n]
+        self._depvars = self._depvars_storage[:n]
+        if self._weights is not None:
+            self._weights_storage = np.empty(capacity, dtype=self._internal_dtype)
+            self._weights_storage[:n] = self._weights
+            self._weights = self._weights_storage[:n]
+
+    def _update_nystrom_cache(self, indepvars, depvars, weights, sign):
+        """
+        Add (``sign=1``) or subtract (``sign=-1``) the contribution of the given observations to the cached Nystrom factorization.
+        The landmark points are kept, so the cache is dropped if an added observation is not approximated within the tolerance.
+        """
+        if self._nystrom_cache is None:
+            return
+        key, features, max_rank = self._nystrom_cache
+        if features is None:
+            self._nystrom_cache = None
+            return
+        landmarks, landmark_factor, projected_depvars, residual = features
+        tol = key[1]
+        scale = np.sqrt(np.frombuffer(key[0], dtype=self._internal_dtype).astype(float))
+        observation_features = solve_triangular(landmark_factor, np.exp(-cdist(landmarks, indepvars * scale, 'sqeuclidean')), lower=True, check_finite=False)
+        if sign > 0:
+            residual = max(residual, float(np.max(1. - np.sum(observation_features**2, axis=0))))
+            if residual > tol:
+                self._nystrom_cache = None
+                return
+        q_observations = np.hstack((depvars, np.ones((depvars.shape[0], 1)))).astype(float)
+        if weights is not None:
+            q_observations *= weights[:, None]
+        projected_depvars = projected_depvars + sign * observation_features.dot(q_observations)
+        self._nystrom_cache = (key, (landmarks, landmark_factor, projected_depvars, residual), max_rank)
+
+    def add_observations(self, indepvars, depvars, weights=None):
+        """
+        Append observations to the training data without rebuilding the model. The training data buffers grow geometrically,
+        only the new observations are cast to ``internal_dtype``, the cached spatial indexes index the new observations
+        on their next use and a cached Nystrom factorization is updated, so the cost is proportional to the number of new observations.
+
+        **Example:**
+
+        .. code::
+
+          from PCAfold import KReg
+          import numpy as np
+
+          indepvars = np.random.rand(100,2)
+          depvars = np.cos(indepvars)
+
+          model = KReg(indepvars, depvars)
+          new_indepvars = np.random.rand(10,2)
+          model.add_observations(new_indepvars, np.cos(new_indepvars))
+
+        :param indepvars:
+            ``numpy.ndarray`` specifying the independent variables of the new observations. It should be of size ``(n_new_observations,n_independent_variables)``.
+        :param depvars:
+            ``numpy.ndarray`` specifying the dependent variables of the new observations. It should be of size ``(n_new_observations,n_dependent_variables)``.
+        :param weights:
+            (optional, default None) ``numpy.ndarray`` of non-negative observation weights of the new observations. If None, the new observations
+            have unit weight. If the model had no weights so far, its existing observations get unit weight.
+        """
+        assert indepvars.ndim == 2, "independent variable array must be 2D: n_observations x n_variables."
+        assert depvars.ndim == 2, "dependent variable array must be 2D: n_observations x n_variables."
+        assert indepvars.shape[0] == depvars.shape[0], "number of observations for independent and dependent variables must match."
+        assert indepvars.shape[1] == self._indepvars.shape[1], "Number of independent variables inconsistent with model."
+        assert depvars.shape[1] == self._depvars.shape[1], "Number of dependent variables inconsistent with model."
+        if weights is not None:
+            weights = np.asarray(weights).ravel()
+            assert weights.size == indepvars.shape[0], "weights must have one value per observation."
+            assert np.all(weights >= 0.), "weights must be non-negative."
+
+        n = self._indepvars.shape[0]
+        n_new = n + indepvars.shape[0]
+        if weights is not None and self._weights is None:
+            self._weights_storage = np.ones(self._indepvars_storage.shape[0], dtype=self._internal_dtype)
+            self._weights = self._weights_storage[:n]
+        self._reserve(n_new)
+        self._indepvars_storage[n:n_new] = indepvars
+        self._depvars_storage[n:n_new] = depvars
+        self._indepvars = self._indepvars_storage[:n_new]
+        self._depvars = self._depvars_storage[:n_new]
+        if self._weights is not None:
+            self._weights_storage[n:n_new] = 1. if weights is None else weights
+            self._weights = self._weights_storage[:n_new]
+        self._update_nystrom_cache(self._indepvars[n:], self._depvars[n:], None if self._weights is None else self._weights[n:], 1)
+
+    def remove_observations(self, indices):
+        """
+        Remove observations from the training data without rebuilding the model. The remaining observations keep their order,
+        so only the observations after the first removed one are moved. The cached spatial indexes keep the blocks
+        of observations before the first removed one and a cached Nystrom factorization is updated.
+        Arrays previously returned by ``indepvars`` and ``depvars`` may share memory with the moved observations.
+
+        **Example:**
+
+        .. code::
+
+          from PCAfold import KReg
+          import numpy as np
+
+          indepvars = np.random.rand(100,2)
+          depvars = np.cos(indepvars)
+
+          model = KReg(indepvars, depvars)
+          model.remove_observations([0, 5, 7])
+
+        :param indices:
+            ``numpy.ndarray`` or ``list`` of the indices of the observations to remove.
+        """
+        n = self._indepvars.shape[0]
+        indices = np.asarray(indices, dtype=np.int64).ravel()
+        assert np.all((indices >= -n) & (indices < n)), "indices must be within the number of observations."
+        keep = np.ones(n, dtype=bool)
+        keep[indices] = False
+        n_keep = int(np.count_nonzero(keep))
+        assert n_keep > 0, "At least one observation must remain."
+        if n_keep == n:
+            return
+
+        first = int(np.argmin(keep))
+        if self._weights is not None:
+            assert np.any(self._weights[keep] > 0.), "At least one observation with a positive weight must remain."
+        self._update_nystrom_cache(self._indepvars[~keep], self._depvars[~keep], None if self._weights is None else self._weights[~keep], -1)
+        self._reserve(n)
+        self._indepvars_storage[first:n_keep] = self._indepvars[first:][keep[first:]]
+        self._depvars_storage[first:n_keep] = self._depvars[first:][keep[first:]]
+        self._indepvars = self._indepvars_storage[:n_keep]
+        self._depvars = self._depvars_storage[:n_keep]
+        if self._weights is not None:
+            self._weights_storage[first:n_keep] = self._weights[first:][keep[first:]]
+            self._weights = self._weights_storage[:n_keep]
+        for tree in [self._tree] + self._dimension_trees:
+            if tree is not None:
+                tree.truncate(first)
+
+    def save(self, path):
+        """
+        Save the training data of the model to a binary file, which ``KReg.load`` can memory-map.
+        The file holds a short identification header followed by ``indepvars``, ``depvars`` and the observation weights
+        (empty if the model has none) in the NumPy ``.npy`` format. The spatial indexes and other caches are not saved.
+
+        **Example:**
+
+        .. code::
+
+          from PCAfold import KReg
+          import numpy as np
+
+          indepvars = np.random.rand(100,2)
+          depvars = np.cos(indepvars)
+
+          model = KReg(indepvars, depvars)
+          model.save('model.kreg')
+          loaded_model = KReg.load('model.kreg')
+
+        :param path:
+            ``str`` specifying the path of the file to write.
+        """
+        weights = np.zeros(0, dtype=self._internal_dtype) if self._weights is None else self._weights
+        with open(path, 'wb') as f:
+            f.write(_KREG_FILE_HEADER)
+            for array in (self._indepvars, self._depvars, weights):
+                np.lib.format.write_array(f, np.ascontiguousarray(array), allow_pickle=False)
+
+    @classmethod
+    def load(cls, path, mmap=True, backend=None):
+        """
+        Load a model saved with ``KReg.save``. With ``mmap=True``, ``indepvars``, ``depvars`` and the weights are read-only
+        memory maps of the file, so loading does not read the training data and processes that load the same file share
+        a single copy of it in the page cache. ``add_observations`` and ``remove_observations`` copy the training data
+        into memory first.
+
+        **Example:**
+
+        .. code::
+
+          from PCAfold import KReg
+          import numpy as np
+
+          model = KReg.load('model.kreg')
+          predicted = model.predict(np.random.rand(10,2), 0.1)
+
+        :param path:
+            ``str`` specifying the path of a file written by ``KReg.save``.
+        :param mmap:
+            (optional, default True) if True, the training data is memory-mapped read-only. If False, it is read into memory.
+        :param backend:
+            (optional, default None) kernel evaluation backend, as in ``KReg``.
+
+        :return:
+            - **model** - the ``KReg`` model.
+        """
+        arrays = []
+        with open(path, 'rb') as f:
+            if f.read(len(_KREG_FILE_HEADER)) != _KREG_FILE_HEADER:
+                raise ValueError("The file is not a KReg model file.")
+            for i in range(3):
+                if not mmap:
+                    arrays.append(np.lib.format.read_array(f, allow_pickle=False))
+                    continue
+                version = np.lib.format.read_magic(f)
+                if version == (1, 0):
+                    shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+                else:
+                    shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+                offset = f.tell()
+                if int(np.prod(shape)) == 0:
+                    arrays.append(np.zeros(shape, dtype=dtype))
+                else:
+                    arrays.append(np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape, order='F' if fortran_order else 'C'))
+                f.seek(offset + int(np.prod(shape)) * dtype.itemsize)
+        indepvars, depvars, weights = arrays
+        assert indepvars.ndim == 2 and depvars.ndim == 2 and indepvars.shape[0] == depvars.shape[0], "The KReg model file is corrupt."
+        return cls._from_arrays(indepvars, depvars, weights if weights.size > 0 else None, backend)
+
+    @classmethod
+    def _from_arrays(cls, indepvars, depvars, weights=None, backend=None):
+        """
+        Build a model on training arrays of the same floating point type without copying them, for instance memory maps or shared memory
+        """
+        model = cls.__new__(cls)
+        model._set_training_data(indepvars, depvars, weights, float if indepvars.dtype == np.float64 else np.float32, backend)
+        return model
+
+    def compute_constant_bandwidth(self, query_points, bandwidth):
+        """
+        Format a single bandwidth value into a 2D array matching the shape of ``query_points``
+
+        :param query_points:
+            array of independent variable points to query the model (n_points x n_independent_variables)
+        :param bandwidth:
+            single value for the bandwidth used in a Gaussian kernel
+
+        :return:
+            an array of bandwidth values matching the shape of ``query_points``
+        """
+        return bandwidth*np.ones_like(query_points, dtype=self._internal_dtype)
+
+    def compute_bandwidth_isotropic(self, query_points, bandwidth):
+        """
+        Format a 1D array of bandwidth values for each point in ``query_points`` into a 2D array matching the shape of ``query_points``
+
+        :param query_points:
+            array of independent variable points to query the model (n_points x n_independent_variables)
+        :param bandwidth:
+            1D array of bandwidth values length n_points
+
+        :return:
+            an array of bandwidth values matching the shape of ``query_points`` (repeats the bandwidth array for each independent variable)
+        """
+        assert bandwidth.ravel().size == query_points.shape[0], "provided bandwidth array must be of length equal to the number of rows in query_points."
+        return np.tile(bandwidth, query_points.shape[1]).reshape(query_points.T.shape).T.astype(self._internal_dtype)
+
+    def compute_bandwidth_anisotropic(self, query_points, bandwidth):
+        """
+        Format a 1D array of bandwidth values for each independent variable into the 2D array matching the shape of ``query_points``
+
+        :param query_points:
+            array of independent variable points to query the model (n_points x n_independent_variables)
+        :param bandwidth:
+            1D array of bandwidth values length n_independent_variables
+
+        :return:
+            an array of bandwidth values matching the shape of ``query_points`` (repeats the bandwidth array for each point in ``query_points``)
+        """
+        assert bandwidth.ravel().size == query_points.shape[1], "provided bandwidth array must be of length equal to the number of independent variables."
+        return np.tile(bandwidth,query_points.shape[0]).reshape(query_points.shape).astype(self._internal_dtype)
+
+    def compute_nearest_neighbors_bandwidth_isotropic(self, query_points, n_neighbors, n_threads=1):
+        """
+        Compute a variable bandwidth for each point in ``query_points`` based on the Euclidean distance to the ``n_neighbors`` nearest neighbor.
+        The k-d tree over ``indepvars`` is built on the first call and reused afterwards.
+
+        :param query_points:
+            array of independent variable points to query the model (n_points x n_independent_variables)
+        :param n_neighbors:
+            integer value for the number of nearest neighbors to consider in computing a bandwidth (distance)
+        :param n_threads:
+            (optional, default 1) number of threads over which the nearest neighbor queries are split. If None, all available cores are used.
+
+        :return:
+            an array of bandwidth values matching the shape of ``query_points`` (varies for each point, constant across independent variables)
+        """
+        return self.compute_bandwidth_isotropic(query_points, self._compute_nearest_neighbors_distance(query_points, n_neighbors, n_threads))
+
+    def _compute_nearest_neighbors_distance(self, query_points, n_neighbors, n_threads=1):
+        """
+        Compute the Euclidean distance from each point in ``query_points`` to the ``n_neighbors`` nearest neighbor as a 1D array
+        """
+        variable_bandwidth = self._get_tree().query(query_points,k=n_neighbors,workers=-1 if n_threads is None else n_threads)[0][:, n_neighbors - 1]
+
+        threshold = 1.e-16
+        variable_bandwidth[variable_bandwidth<threshold] = threshold # remove zero values
+        return variable_bandwidth
+
+    def compute_nearest_neighbors_bandwidth_anisotropic(self, query_points, n_neighbors, n_threads=1):
+        """
+        Compute a variable bandwidth for each point in ``query_points`` and each independent variable separately based
+        on the distance to the ``n_neighbors`` nearest neighbor in each independent variable dimension.
+        The k-d trees over each independent variable are built on the first call and reused afterwards.
+
+        :param query_points:
+            array of independent variable points to query the model (n_points x n_independent_variables)
+        :param n_neighbors:
+            integer value for the number of nearest neighbors to consider in computing a bandwidth (distance)
+        :param n_threads:
+            (optional, default 1) number of threads over which the nearest neighbor queries are split. If None, all available cores are used.
+
+        :return:
+            an array of bandwidth values matching the shape of ``query_points`` (varies for each point and independent variable)
+        """
+        variable_bandwidth = np.zeros_like(query_points, dtype=self._internal_dtype)
+        for i in range(query_points.shape[1]):
+            query_bandwidth = self._get_dimension_tree(i).query(np.expand_dims(query_points[:,i],axis=1),k=n_neighbors,workers=-1 if n_threads is None else n_threads)[0]
+            variable_bandwidth[:,i] = query_bandwidth[:, n_neighbors - 1]
+
+        threshold = 1.e-16
+        variable_bandwidth[variable_bandwidth<threshold] = threshold # remove zero values
+        return variable_bandwidth
+
+    def _compute_inverse_squared_bandwidth(self, query_points, bandwidth, n_neighbors, n_threads=1):
+        """
+        Format the ``bandwidth`` argument of ``predict`` as :math:`1/\\sigma^2`, with the shape ``(1,1)`` for a single value,
+        ``(n_points,1)`` for isotropic bandwidths that vary per query point, ``(1,n_independent_variables)`` for
+        anisotropic bandwidths shared by all query points and ``(n_points,n_independent_variables)`` otherwise.
+        This avoids building a full bandwidth array when it is not needed and the division in the kernel evaluation.
+        """
+        if isinstance(bandwidth,np.ndarray):
+            if bandwidth.ndim == 2:
+                assert bandwidth.shape[0] in (1, query_points.shape[0]) and bandwidth.shape[1] in (1, query_points.shape[1]), "Shape of two-dimensional bandwidth array must match or broadcast to the shape of query_points."
+                bandwidth_array = bandwidth.astype(self._internal_dtype)
+            else:
+                raise ValueError("An array for bandwidth must be the same shape as query_points.")
+        elif isinstance(bandwidth,int) or isinstance(bandwidth,float):
+            bandwidth_array = np.full((1, 1), bandwidth, dtype=self._internal_dtype)
+        elif bandwidth=="nearest_neighbors_isotropic":
+            assert n_neighbors is not None, "nearest neighbors method requires n_neighbors be specified."
+            bandwidth_array = self._compute_nearest_neighbors_distance(query_points, n_neighbors, n_threads).astype(self._internal_dtype)[:, None]
+        elif bandwidth=="nearest_neighbors_anisotropic":
+            assert n_neighbors is not None, "nearest neighbors method requires n_neighbors be specified."
+            bandwidth_array = self.compute_nearest_neighbors_bandwidth_anisotropic(query_points, n_neighbors, n_threads)
+        else:
+            raise ValueError("Unsupported bandwidth type.")
+        return 1. / (bandwidth_array * bandwidth_array)
+
+    def _compute_kernel_neighbors(self, query_points, inv_s2, kernel_tolerance, n_threads, leave_one_out=False):
+        """
+        Find the training points whose kernel weight for each query point may exceed ``kernel_tolerance``
+        times the largest kernel weight for that query point. With :math:`d` the distance to the nearest
+        training point, the largest weight is at least :math:`\\exp(-d^2/\\min(\\sigma)^2)` and any weight is at most
+        :math:`\\exp(-|| x_i - u ||_2^2/\\max(\\sigma)^2)`, which gives the cutoff radius for each query point.
+        With ``leave_one_out``, the query points are the training points and the nearest other point is used.
+
+        :return:
+            neighbor lists in compressed sparse row format, ``(indptr, indices)``, or None if the neighborhoods
+            cover so much of the training data that the full sum is cheaper
+        """
+        tree = self._get_tree()
+        if leave_one_out:
+            nearest_distance = tree.query(query_points, k=2, workers=n_threads)[0][:, 1]
+        else:
+            nearest_distance = tree.query(query_points, k=1, workers=n_threads)[0][:, 0]
+        max_bandwidth = 1. / np.sqrt(np.min(inv_s2, axis=1))
+        min_bandwidth = 1. / np.sqrt(np.max(inv_s2, axis=1))
+        radius = max_bandwidth * np.sqrt((nearest_distance / min_bandwidth)**2 - np.log(kernel_tolerance))
+        n_kernel_neighbors = tree.count_ball_point(query_points, radius, workers=n_threads)
+        if np.sum(n_kernel_neighbors) > 0.25 * query_points.shape[0] * self._indepvars.shape[0]:
+            return None
+        return tree.query_ball_point(query_points, radius, workers=n_threads)
+
+    def predict_on_training(self, bandwidth, leave_one_out=False):
+        """
+        Calculate dependent variable predictions at the training points, ``indepvars``. This gives the same result as
+        ``predict(indepvars, bandwidth)``, but since the bandwidth is the same for every point the kernel is symmetric
+        and each pair of training points is evaluated only once, roughly halving the number of kernel evaluations.
+        With 48 or more independent variables and ``backend=None`` in ``KReg``, the sums are evaluated with the matrix products of ``PCAfold.kernel_regression_numpy`` instead,
+        which visit every pair but are still faster than the compiled kernels in that many dimensions. They are then computed in double precision
+        even with ``internal_dtype=numpy.float32``.
+
+        **Example:**
+
+        .. code::
+
+          from PCAfold import KReg
+          import numpy as np
+
+          indepvars = np.random.rand(100,2)
+          depvars = np.random.rand(100,3)
+
+          model = KReg(indepvars, depvars)
+          predicted = model.predict_on_training(0.1)
+
+        :param bandwidth:
+            value(s) to use for the bandwidth in the Gaussian kernel. Supported formats include:
+
+            - single value: constant bandwidth applied to each independent variable dimension.
+
+            - 1D array of length n_independent_variables: a constant bandwidth for each independent variable dimension.
+
+        :param leave_one_out:
+            (optional, default False) if True, each training point is left out of its own prediction, giving leave-one-out predictions at no extra cost.
+
+        :return: dependent variable predictions for ``indepvars``
+        """
+        if isinstance(bandwidth,int) or isinstance(bandwidth,float):
+            inv_s2 = np.ones(self._indepvars.shape[1], dtype=self._internal_dtype) / bandwidth**2
+        elif isinstance(bandwidth,np.ndarray) and bandwidth.ndim == 1:
+            assert bandwidth.size == self._indepvars.shape[1], "provided bandwidth array must be of length equal to the number of independent variables."
+            inv_s2 = (1. / bandwidth**2).astype(self._internal_dtype)
+        else:
+            raise ValueError("Unsupported bandwidth type.")
+
+        depvar_points = np.zeros(self._depvars.shape, dtype=self._internal_dtype)
+        self._symmetric_kernels.kreg_evaluate_symmetric(depvar_points, self._indepvars, self._depvars, inv_s2, leave_one_out, self._weights)
+        return depvar_points
+
+    def optimize_bandwidth(self, anisotropic=False, bandwidth_bounds=None):
+        """
+        Find the constant bandwidth that minimizes the leave-one-out error of the model on its training data.
+        The leave-one-out error is computed as the mean squared difference between each dependent variable observation and its
+        prediction from all other observations, with each dependent variable normalized by its variance so that all of them
+        carry the same weight. With observation ``weights``, the squared differences and the variances are weighted averages
+        with the same weights, consistent with repeating observations in proportion to their weights. The squared distances between all pairs of training points are computed once and reused
+        in every iteration of the optimization. Note that they require memory proportional to :math:`n^2` (times the number of
+        independent variables for ``anisotropic=True``), so a sample of the training data should be used for large data sets.
+
+        **Example:**
+
+        .. code::
+
+          from PCAfold import KReg
+          import numpy as np
+
+          indepvars = np.random.rand(200,2)
+          depvars = np.cos(4*indepvars[:,0:1]) + indepvars[:,1:2]**2
+
+          model = KReg(indepvars, depvars)
+          (bandwidth, loo_error) = model.optimize_bandwidth(anisotropic=True)
+          predicted = model.predict(indepvars, bandwidth[None,:])
+
+        :param anisotropic:
+            (optional, default False) if False, a single bandwidth is optimized. If True, a separate bandwidth is optimized for each independent variable,
+            starting from the optimal single bandwidth.
+        :param bandwidth_bounds:
+            (optional, default None) ``tuple`` of the smallest and largest bandwidth to consider. If None, the bounds are the smallest nonzero distance
+            between training points and ten times the diagonal of the box containing the training points.
+
+        :return:
+            - **bandwidth** - the optimal bandwidth, a single value or a 1D array of length n_independent_variables if ``anisotropic=True``.
+            - **loo_error** - the normalized leave-one-out mean squared error at the optimal bandwidth.
+        """
+        n_dims = self._indepvars.shape[1]
+        if bandwidth_bounds is None:
+            neighbor_distances = self._get_tree().query(self._indepvars, k=2)[0][:, 1]
+            nonzero_distances = neighbor_distances[neighbor_distances > 1.e-16]
+            assert nonzero_distances.size > 0, "all training points coincide."
+            bandwidth_bounds = (np.min(nonzero_distances), 10. * np.linalg.norm(np.max(self._indepvars, axis=0) - np.min(self._indepvars, axis=0)))
+        assert 0. < bandwidth_bounds[0] < bandwidth_bounds[1], "bandwidth_bounds must be positive and increasing."
+        log_bounds = np.log10(bandwidth_bounds)
+
+        if anisotropic:
+            sq_dist = np.column_stack([pdist(self._indepvars[:, l:l+1], 'sqeuclidean') for l in range(n_dims)]).astype(self._internal_dtype)
+        else:
+            sq_dist = pdist(self._indepvars, 'sqeuclidean').astype(self._internal_dtype)[:, None]
+
+        depvars_scale = np.average((self._depvars - np.average(self._depvars, axis=0, weights=self._weights))**2, axis=0, weights=self._weights)
+        depvars_scale[depvars_scale == 0.] = 1.
+        loo_predictions = np.zeros(self._depvars.shape, dtype=self._internal_dtype)
+
+        def loo_error(log_bandwidth):
+            inv_s2 = np.broadcast_to(10.**(-2.*np.asarray(log_bandwidth, dtype=self._internal_dtype)), (sq_dist.shape[1],)).copy()
+            self._kernels.kreg_evaluate_condensed(loo_predictions, self._depvars, sq_dist, inv_s2, True, self._weights)
+            error = np.mean(np.average((loo_predictions - self._depvars)**2, axis=0, weights=self._weights) / depvars_scale)
+            return error if np.isfinite(error) else np.inf
+
+        result = minimize_scalar(loo_error, bounds=log_bounds, method='bounded')
+        log_bandwidth, error = result.x, result.fun
+        if anisotropic:
+            result = minimize(loo_error, log_bandwidth*np.ones(n_dims), bounds=[log_bounds]*n_dims, method='L-BFGS-B')
+            if result.fun < error:
+                log_bandwidth, error = result.x, result.fun
+            bandwidth = 10.**np.broadcast_to(log_bandwidth, (n_dims,))
+        else:
+            bandwidth = float(10.**log_bandwidth)
+        return bandwidth, float(error)
+
+    def predict_bandwidths(self, query_points, bandwidth_values, n_threads=1, method='exact', tol=1.e-6, n_bins=None):
+        """
+        Calculate dependent variable predictions at ``query_points`` for several constant bandwidths in a single pass.
+        The squared distance between each query point and each training point is computed once and the kernel sums
+        for all bandwidths are accumulated together, which is considerably cheaper than calling ``predict`` once per bandwidth.
+
+        **Example:**
+
+        .. code::
+
+          from PCAfold import KReg
+          import numpy as np
+
+          indepvars = np.random.rand(100,2)
+          depvars = np.random.rand(100,3)
+
+          model = KReg(indepvars, depvars)
+          predicted = model.predict_bandwidths(indepvars, np.logspace(-2, 0, 10))
+
+          # Predictions for the third bandwidth:
+          predicted[2,:,:]
+
+        :param query_points:
+            ``numpy.ndarray`` specifying the independent variable points to query the model. It should be of size ``(n_points,n_independent_variables)``.
+        :param bandwidth_values:
+            ``numpy.ndarray`` or ``list`` of single bandwidth values, each applied to every query point and independent variable dimension.
+        :param n_threads:
+            (optional, default 1) number of threads over which the query points are split. If None, all available cores on the current system are used.
+        :param method:
+            (optional, default ``'exact'``) ``'exact'`` or ``'binned'``. With ``'binned'``, the training data is binned once per grid
+            and each bandwidth only costs one FFT convolution and an interpolation, see ``predict``. With a fixed ``n_bins``, all bandwidths share one grid.
+        :param tol:
+            (optional, default :math:`10^{-6}`) kernel truncation threshold of the ``'binned'`` method, see ``predict``. It does not bound the error, which is set by ``n_bins``.
+        :param n_bins:
+            (optional, default None) number of grid nodes per independent variable of the ``'binned'`` method, see ``predict``.
+
+        :return: dependent variable predictions for the ``query_points`` of size ``(n_bandwidths,n_points,n_dependent_variables)``
+        """
+        assert query_points.ndim == 2, "query_points array must be 2D: n_observations x n_variables."
+        assert query_points.shape[1] == self._indepvars.shape[1], "Number of query_points independent variables inconsistent with model."
+
+        bandwidth_values = np.asarray(bandwidth_values, dtype=self._internal_dtype).ravel()
+        assert bandwidth_values.size > 0, "At least one bandwidth value must be specified."
+
+        if n_threads is None:
+            n_threads = os.cpu_count()
+        assert n_threads >= 1, "n_threads must be a positive integer or None."
+
+        if method == 'binned':
+            assert 0. < tol < 1., "tol must be between 0 and 1."
+            return self._predict_binned(query_points.astype(self._internal_dtype), (1. / bandwidth_values**2)[:, None], tol, n_bins, n_threads)
+        elif method != 'exact':
+            raise ValueError("Unsupported method.")
+
+        # the training points are passed in k-d tree order, so that the blocks of the compiled kernels are spatially compact
+        # and the blocks whose kernels all vanish at the small bandwidths of a sweep are skipped
+        order = cKDTree(self._indepvars).indices
+        depvar_points = np.zeros((bandwidth_values.size, query_points.shape[0], self._depvars.shape[1]), dtype=self._internal_dtype)
+        self._dense_kernels.kreg_evaluate_bandwidths(query_points.astype(self._internal_dtype), depvar_points, self._indepvars[order], self._depvars[order], 1. / bandwidth_values**2, n_threads,
+                                                     None if self._weights is None else self._weights[order])
+        return depvar_points
+
+    def _predict_binned(self, query_points, inv_s2, tol, n_bins, n_threads):
+        """
+        Evaluate predictions at ``query_points`` for each row of ``inv_s2`` (constant bandwidths, isotropic or anisotropic)
+        by FFT convolution of linearly binned training data, returned as (n_bandwidths x n_points x n_dependent_variables).
+        Bandwidths that use the same grid share a single binning pass.
+        Rows whose approximate kernel sum is not larger than ``tol`` times the number of observations (the total weight of weighted models) are evaluated exactly.
+        """
+        n, d = self._indepvars.shape
+        assert d <= 3, "The binned method supports at most three independent variables."
+        if n_bins is None:
+            # a grid spacing of a sixteenth of the bandwidth, within a total of about 2^20 grid nodes
+            extent = np.maximum(np.max(query_points, axis=0), np.max(self._indepvars, axis=0)) - np.minimum(np.min(query_points, axis=0), np.min(self._indepvars, axis=0))
+            bandwidths = 1. / np.sqrt(np.broadcast_to(inv_s2, (inv_s2.shape[0], d)))
+            grid_sizes = np.clip(np.ceil(16. * extent / bandwidths).astype(np.int64) + 1, 2, int(2**(20. / d)))
+        else:
+            grid_sizes = np.broadcast_to(np.asarray(n_bins, dtype=np.int64).ravel(), (inv_s2.shape[0], d))
+            assert np.all(grid_sizes >= 2), "n_bins must be at least 2."
+
+        q_train = self._weighted_depvars()
+        grids = {}
+        depvar_points = np.zeros((inv_s2.shape[0], query_points.shape[0], self._depvars.shape[1]), dtype=self._internal_dtype)
+        for b in range(inv_s2.shape[0]):
+            grid_size = tuple(grid_sizes[b])
+            if grid_size not in grids:
+                grids[grid_size] = binned_grid(query_points, self._indepvars, q_train, grid_size)
+            transform = binned_evaluate(query_points, *grids[grid_size], inv_s2[b], tol)
+            unresolved = transform[:, -1] <= tol * self._total_weight()
+            resolved = ~unresolved
+            depvar_points[b][resolved] = transform[resolved, :-1] / transform[resolved, -1:]
+            if np.any(unresolved):
+                exact_points = np.zeros((np.count_nonzero(unresolved), self._depvars.shape[1]), dtype=self._internal_dtype)
+                self._dense_kernels.kreg_evaluate(np.ascontiguousarray(query_points[unresolved]), exact_points, self._indepvars, self._depvars, np.ascontiguousarray(inv_s2[b:b+1]), n_threads, False, self._weights)
+                depvar_points[b][unresolved] = exact_points
+        return depvar_points
+
+    def _predict_fgt(self, query_points, inv_s2, tol, n_threads):
+        """
+        Evaluate predictions at ``query_points`` with the improved fast Gauss transform for a constant bandwidth.
+        Rows whose approximate kernel sum is not larger than twice its error bound are evaluated exactly.
+        """
+        scale = np.sqrt(inv_s2.astype(float))
+        q_train = self._weighted_depvars()
+        transform = ifgt_evaluate(query_points * scale, self._indepvars * scale, q_train, tol)
+
+        depvar_points = np.zeros((query_points.shape[0], self._depvars.shape[1]), dtype=self._internal_dtype)
+        if transform is None:
+            unresolved = np.ones(query_points.shape[0], dtype=bool)
+        else:
+            unresolved = transform[:, -1] <= 2. * tol * self._total_weight()
+            resolved = ~unresolved
+            depvar_points[resolved] = transform[resolved, :-1] / transform[resolved, -1:]
+        if np.any(unresolved):
+            exact_points = np.zeros((np.count_nonzero(unresolved), self._depvars.shape[1]), dtype=self._internal_dtype)
+            self._dense_kernels.kreg_evaluate(np.ascontiguousarray(query_points[unresolved]), exact_points, self._indepvars, self._depvars, inv_s2, n_threads, False, self._weights)
+            depvar_points[unresolved] = exact_points
+        return depvar_points
+
+    def _nystrom_features(self, inv_s2, tol, max_rank):
+        """
+        Return the landmark points, the triangular landmark block of the Cholesky factor, the factor applied to
+        ``[depvars, 1]`` and the residual bound of the Nystrom approximation for a constant bandwidth,
+        or None if the approximation needs more than ``max_rank`` landmark points.
+        The result for the most recent bandwidth is cached, so repeated predictions only pay for the query points.
+        """
+        key = (inv_s2.tobytes(), tol)
+        if self._nystrom_cache is not None and self._nystrom_cache[0] == key:
+            # the pivoted factorization is deterministic, so a cached factor, or a failure with a larger max_rank, settles the call
+            features, cached_rank = self._nystrom_cache[1:]
+            if features is not None:
+                return features if features[0].shape[0] <= max_rank else None
+            if cached_rank >= max_rank:
+                return None
+
+        scaled_indepvars = self._indepvars * np.sqrt(inv_s2.astype(float))
+        n = scaled_indepvars.shape[0]
+        if n > 4 * max_rank:
+            # check feasibility on a subsample before factorizing all points: a subsample that already needs more than max_rank
+            # landmark points means the bandwidth is too small compared to the spread of the data, and costs a small fraction of the full factorization
+            subsample = scaled_indepvars[np.random.RandomState(0).choice(n, 4 * max_rank, replace=False)]
+            if nystrom_factor(subsample, tol, max_rank) is None:
+                self._nystrom_cache = (key, None, max_rank)
+                return None
+        factorization = nystrom_factor(scaled_indepvars, tol, max_rank)
+        features = None
+        if factorization is not None:
+            pivots, factor, residual = factorization
+            q_train = self._weighted_depvars()
+            features = (scaled_indepvars[pivots], np.tril(factor[:, pivots].T), factor.dot(q_train), residual)
+        self._nystrom_cache = (key, features, max_rank)
+        return features
+
+    def _nystrom_rank_limit(self, n_points):
+        """
+        Largest rank for which factorizing and projecting costs about as many operations as the exact kernel sums of ``n_points``
+        query points, which are slower per operation since each needs an exponential.
+        """
+        n, d = self._indepvars.shape
+        return int(np.sqrt(n_points * n * (d + 2) / (n + n_points)))
+
+    def _predict_nystrom(self, query_points, inv_s2, tol, n_threads, features, kernel_tolerance=None):
+        """
+        Evaluate predictions at ``query_points`` with the Nystrom approximation ``features`` for a constant bandwidth.
+        Rows whose kernel error bound is not met, or whose approximate kernel sum is not larger than twice its error bound,
+        are evaluated exactly.
+        """
+        landmarks, landmark_factor, projected_depvars, residual = features
+        total_weight = self._total_weight()
+        scale = np.sqrt(inv_s2.astype(float))
+
+        depvar_points = np.zeros((query_points.shape[0], self._depvars.shape[1]), dtype=self._internal_dtype)
+        unresolved = np.ones(query_points.shape[0], dtype=bool)
+        block_size = 4096
+        for start in range(0, query_points.shape[0], block_size):
+            block = slice(start, start + block_size)
+            query_features = solve_triangular(landmark_factor, np.exp(-cdist(landmarks, query_points[block] * scale, 'sqeuclidean')), lower=True, check_finite=False)
+            query_residual = np.maximum(1. - np.sum(query_features**2, axis=0), 0.)
+            transform = query_features.T.dot(projected_depvars)
+            resolved = (np.sqrt(query_residual * residual) <= tol) & (transform[:, -1] > 2. * tol * total_weight)
+            depvar_points[block][resolved] = transform[resolved, :-1] / transform[resolved, -1:]
+            unresolved[block] = ~resolved
+
+        if np.any(unresolved):
+            exact_query_points = np.ascontiguousarray(query_points[unresolved])
+            exact_points = np.zeros((exact_query_points.shape[0], self._depvars.shape[1]), dtype=self._internal_dtype)
+            kernel_neighbors = None
+            if kernel_tolerance is not None:
+                kernel_neighbors = self._compute_kernel_neighbors(exact_query_points, inv_s2, kernel_tolerance, n_threads)
+            if kernel_neighbors is None:
+                self._dense_kernels.kreg_evaluate(exact_query_points, exact_points, self._indepvars, self._depvars, inv_s2, n_threads, False, self._weights)
+            else:
+                indptr, indices = kernel_neighbors
+                self._kernels.kreg_evaluate_pruned(exact_query_points, exact_points, self._indepvars, self._depvars, inv_s2, indptr, indices, n_threads, False, self._weights)
+            depvar_points[unresolved] = exact_points
+        return depvar_points
+
+    def predict(self, query_points, bandwidth, n_neighbors=None, n_threads=1, kernel_tolerance=None, leave_one_out=False, method='exact', tol=1.e-6, max_rank=1000, out=None, chunk_size=None, return_gradient=False, n_bins=None, return_diagnostics=False):
+        """
+        Calculate dependent variable predictions at ``query_points``.
+
+        With ``chunk_size``, the query points are evaluated in consecutive blocks of rows and written into ``out``,
+        so ``query_points`` and ``out`` can be memory-mapped arrays (for instance from ``numpy.load(..., mmap_mode='r')``
+        and ``numpy.lib.format.open_memmap``) that are much larger than the available memory. The working memory is then bounded by ``chunk_size``.
+        See ``predict_iter`` for query points that arrive as a sequence of chunks.
+
+        :param query_points:
+            ``numpy.ndarray`` specifying the independent variable points to query the model. It should be of size ``(n_points,n_independent_variables)``.
+        :param bandwidth:
+            value(s) to use for the bandwidth in the Gaussian kernel. Supported formats include:
+
+            - single value: constant bandwidth applied to each query point and independent variable dimension.
+
+            - 2D array shape (n_points x n_independent_variables): an array of bandwidths for each independent variable dimension of each query point.
+              Arrays of shape (1 x n_independent_variables), with a constant bandwidth for each independent variable dimension, and (n_points x 1),
+              with an isotropic bandwidth for each query point, are broadcast without forming the full array.
+
+            - string "nearest_neighbors_isotropic": This option requires the argument ``n_neighbors`` to be specified for which a bandwidth will be calculated for each query point based on the Euclidean distance to the ``n_neighbors`` nearest ``indepvars`` point.
+
+            - string "nearest_neighbors_anisotropic": This option requires the argument ``n_neighbors`` to be specified for which a bandwidth will be calculated for each query point based on the distance in each (separate) independent variable dimension to the ``n_neighbors`` nearest ``indepvars`` point.
+
+        :param n_neighbors:
+            (optional, default None) integer number of nearest neighbors used by the ``"nearest_neighbors_isotropic"`` and ``"nearest_neighbors_anisotropic"`` bandwidth options
+        :param n_threads:
+            (optional, default 1) number of threads over which the query points are split, in the kernel evaluation as well as in the
+            nearest neighbor queries of the k-d tree, which is built once per model and kept for later calls.
+            The evaluation releases the GIL and gives bit-identical results for any number of threads. If None, all available cores on the current system are used.
+            With 12 or more independent variables and ``backend=None`` in ``KReg``, sums over all training points are evaluated with the matrix products
+            of ``PCAfold.kernel_regression_numpy``; they ignore ``n_threads`` and use the threads of the BLAS library, and they are computed in double precision
+            even with ``internal_dtype=numpy.float32``.
+        :param kernel_tolerance:
+            (optional, default None) if specified, kernel weights smaller than ``kernel_tolerance`` times the largest kernel weight
+            of a query point are neglected and only the training points within the corresponding cutoff radius of each query point
+            (found with a k-d tree over ``indepvars``) are visited. The relative error of the kernel sums is therefore at most
+            ``n_observations*kernel_tolerance``. It should be between 0 and 1. This greatly reduces the cost at small bandwidths.
+            When the cutoff radius covers most of the training data, the full sum is used instead. If None, all training points are used.
+        :param leave_one_out:
+            (optional, default False) if True, ``query_points`` must hold one row per training point, in the same order as ``indepvars``,
+            and the contribution of training point :math:`i` is dropped from the prediction for query point :math:`i`.
+            This gives leave-one-out predictions at the cost of a single evaluation.
+        :param method:
+            (optional, default ``'exact'``) evaluation method. Supported methods include:
+
+            - ``'exact'``: the kernel sums are computed exactly over all training points (or those within the ``kernel_tolerance`` cutoff).
+
+            - ``'fgt'``: the kernel sums are approximated with the improved fast Gauss transform :cite:`Yang2005`, which clusters the training points
+              and expands the Gaussian kernel in a truncated Taylor series about each cluster center. Its cost grows linearly with the number
+              of training and query points, which makes it much faster than the exact sums for large data sets of few independent variables.
+              It requires a constant bandwidth: a single value or a (1 x n_independent_variables) array. Query points whose kernel sum is
+              not resolved by the error bound, and all query points when the bound cannot be met with a reasonable number of series terms,
+              are evaluated exactly. Relative to the range of each independent variable and with ``tol=1e-6``, the expansion is used
+              with one independent variable at any bandwidth, with two at bandwidths above about 0.3 for :math:`2 \cdot 10^4` training points
+              (about 0.05 with ``tol=1e-3``) and down to 0.02 for :math:`10^5` training points, with three only at bandwidths of the order of the
+              range and :math:`10^5` or more training points, and not with four or more. Outside this regime the expansion is rejected from
+              a subsample of the training points at a cost of a few percent of the exact sums.
+
+            - ``'nystrom'``: the kernel matrix is replaced by a low-rank Nystrom approximation built from landmark points of ``indepvars``
+              that are chosen with a pivoted Cholesky factorization until the approximation error of every kernel weight between training points
+              is below ``tol``. The factorization is computed once per bandwidth and cached, after which predictions cost
+              :math:`\\mathcal{O}((n_{points} + n_{observations}) r)` for rank :math:`r`. The rank is small at large bandwidths, where the kernel
+              matrix is smooth. It requires a constant bandwidth. Query points whose kernel weights are not resolved by the error bound are evaluated exactly.
+              At most ``max_rank`` landmark points are used, and no more than where the factorization would cost more than the exact sums
+              over ``max(n_points,n_observations)`` query points, which caps the cost at small bandwidths. If the error bound cannot be met
+              within that rank, all query points are evaluated exactly. This is first checked on a subsample of four times the rank,
+              so a bandwidth that is too small costs little more than the exact sums.
+
+            - ``'auto'``: the ``'nystrom'`` method is used when the bandwidth is constant and the required rank is small enough that the low-rank
+              evaluation is cheaper than the exact sums, which is the case above a data-dependent bandwidth. Otherwise the ``'exact'`` method is used.
+              The error bound ``tol`` holds in both cases.
+
+            - ``'binned'``: the training data is spread onto a regular grid with linear binning, convolved with the Gaussian kernel using FFTs
+              and interpolated back to the query points, which costs :math:`\\mathcal{O}(n_{observations} + n_{points} + G \\log G)` for :math:`G` grid nodes.
+              It requires a constant bandwidth and at most three independent variables. Its accuracy is set by the grid spacing relative to the bandwidth,
+              see ``n_bins``. Query points whose approximate kernel sum is below ``tol`` times the number of observations are evaluated exactly.
+
+        :param tol:
+            (optional, default :math:`10^{-6}`) absolute error bound of the ``'fgt'``, ``'nystrom'`` and ``'auto'`` methods. The error of each kernel sum is at most ``tol`` times
+            the sum of the absolute values of the corresponding training data (the number of observations for the sum of kernel weights).
+            For the ``'binned'`` method, ``tol`` is only the threshold below which the kernel is truncated and below which a kernel sum is evaluated exactly;
+            it does not bound the error, which is set by the grid spacing through ``n_bins``.
+        :param max_rank:
+            (optional, default 1000) largest number of landmark points of the ``'nystrom'`` method.
+        :param out:
+            (optional, default None) array of size ``(n_points,n_dependent_variables)`` to write the predictions into. If None, a new array is returned.
+        :param chunk_size:
+            (optional, default None) number of query points evaluated at a time. Bandwidth arrays with one row per query point are split in the same way.
+            Leave-one-out predictions are not split. If None, all query points are evaluated at once.
+        :param return_gradient:
+            (optional, default False) if True, the Jacobian of the predictions with respect to the query point coordinates is computed
+            in the same pass over the training data, using the closed-form derivative of the Nadaraya-Watson estimator
+
+            .. math::
+
+                \\frac{\\partial \\mathcal{K}(u; \\sigma)}{\\partial u_l} = \\frac{\\sum_{i=1}^{n} \\frac{\\partial \\mathcal{W}_i(u; \\sigma)}{\\partial u_l} (y_i - \\mathcal{K}(u; \\sigma))}{\\sum_{i=1}^{n} \\mathcal{W}_i(u; \\sigma)}, \\quad
+                \\frac{\\partial \\mathcal{W}_i(u; \\sigma)}{\\partial u_l} = -\\frac{2 (u_l - x_{i,l})}{\\sigma_l^2} \\mathcal{W}_i(u; \\sigma)
+
+            The bandwidth is held fixed in the derivative, also for the nearest neighbors bandwidth options. It requires the ``'exact'`` or ``'auto'`` method,
+            and the latter then evaluates the sums exactly.
+        :param n_bins:
+            (optional, default None) number of grid nodes per independent variable of the ``'binned'`` method, a single integer or one per independent variable.
+            The grid spans the query and training points. The binning error decreases quadratically with the ratio of grid spacing to bandwidth.
+            If None, the grid spacing is a sixteenth of the bandwidth, which gives errors of about :math:`10^{-3}` times the range of the dependent variables,
+            limited to about :math:`2^{20}` grid nodes in total. At small bandwidths this limit makes the grid spacing comparable to the bandwidth,
+            in particular with three independent variables (about 100 nodes per dimension), and the errors are then much larger. The accuracy
+            of the ``'binned'`` method is not controlled by ``tol``.
+        :param return_diagnostics:
+            (optional, default False) if True, kernel diagnostics that indicate how well each prediction is supported by the training data
+            are accumulated in the same pass over the training data. It requires the ``'exact'`` or ``'auto'`` method, and the latter then evaluates the sums exactly.
+
+        :return:
+            - **depvar_points** - dependent variable predictions for the ``query_points`` (``out`` if specified).
+            - **gradient** - (only if ``return_gradient=True``) the Jacobian of the predictions, of size ``(n_points,n_dependent_variables,n_independent_variables)``.
+            - **diagnostics** - (only if ``return_diagnostics=True``) ``dict`` with the following entries:
+
+                - ``'kernel_sum'``: the sum of the kernel weights :math:`\\sum_i \\mathcal{W}_i` of each query point, of size ``(n_points,)``.
+                - ``'effective_neighbors'``: the effective number of training points, :math:`(\\sum_i \\mathcal{W}_i)^2 / \\sum_i \\mathcal{W}_i^2`, of size ``(n_points,)``.
+                - ``'variance'``: the kernel-weighted variance of the dependent variables around each prediction, :math:`\\sum_i \\mathcal{W}_i (y_i - \\mathcal{K})^2 / \\sum_i \\mathcal{W}_i`, of size ``(n_points,n_dependent_variables)``.
+        """
+        assert query_points.ndim == 2, "query_points array must be 2D: n_observations x n_variables."
+        assert query_points.shape[1] == self._indepvars.shape[1], "Number of query_points independent variables inconsistent with model."
+
+        if n_threads is None:
+            n_threads = os.cpu_count()
+        assert n_threads >= 1, "n_threads must be a positive integer or None."
+
+        if return_gradient or return_diagnostics:
+            assert method in ('exact', 'auto'), "return_gradient and return_diagnostics require the exact or auto method."
+
+        if out is not None or chunk_size is not None:
+            n_points = query_points.shape[0]
+            if out is None:
+                out = np.empty((n_points, self._depvars.shape[1]), dtype=self._internal_dtype)
+            assert out.shape == (n_points, self._depvars.shape[1]), "out array must be of size n_points x n_dependent_variables."
+            outputs = [out]
+            if return_gradient:
+                outputs.append(np.empty((n_points, self._depvars.shape[1], self._indepvars.shape[1]), dtype=self._internal_dtype))
+            if return_diagnostics:
+                outputs.append({'kernel_sum': np.empty(n_points, dtype=self._internal_dtype),
+                                'effective_neighbors': np.empty(n_points, dtype=self._internal_dtype),
+                                'variance': np.empty((n_points, self._depvars.shape[1]), dtype=self._internal_dtype)})
+            if chunk_size is None or leave_one_out:
+                chunk_size = max(n_points, 1)
+            assert chunk_size >= 1, "chunk_size must be a positive integer or None."
+            for start in range(0, n_points, chunk_size):
+                stop = min(start + chunk_size, n_points)
+                chunk_bandwidth = bandwidth
+                if isinstance(bandwidth, np.ndarray) and bandwidth.ndim == 2 and bandwidth.shape[0] == n_points:
+                    chunk_bandwidth = bandwidth[start:stop]
+                if return_gradient or return_diagnostics:
+                    chunk_outputs = self.predict(query_points[start:stop], chunk_bandwidth, n_neighbors, n_threads, kernel_tolerance, leave_one_out, 'exact',
+                                                 return_gradient=return_gradient, return_diagnostics=return_diagnostics)
+                    for output, chunk_output in zip(outputs, chunk_outputs):
+                        if isinstance(output, dict):
+                            for key in output:
+                                output[key][start:stop] = chunk_output[key]
+                        else:
+                            output[start:stop] = chunk_output
+                else:
+                    out[start:stop] = self.predict(query_points[start:stop], chunk_bandwidth, n_neighbors, n_threads, kernel_tolerance, leave_one_out, method, tol, max_rank, n_bins=n_bins)
+            if len(outputs) > 1:
+                return tuple(outputs)
+            return out
+
+        inv_s2 = self._compute_inverse_squared_bandwidth(query_points, bandwidth, n_neighbors, n_threads)
+        if kernel_tolerance is not None:
+            assert 0. < kernel_tolerance < 1., "kernel_tolerance must be between 0 and 1."
+        if leave_one_out:
+            assert query_points.shape[0] == self._indepvars.shape[0], "leave-one-out predictions require one query point per training point."
+
+        query_points = query_points.astype(self._internal_dtype)
+
+        if return_gradient or return_diagnostics:
+            method = 'exact'
+
+        if method == 'fgt':
+            assert inv_s2.shape[0] == 1, "The fgt method requires a constant bandwidth."
+            assert not leave_one_out, "The fgt method does not support leave-one-out predictions."
+            assert 0. < tol < 1., "tol must be between 0 and 1."
+            return self._predict_fgt(query_points, inv_s2, tol, n_threads)
+        elif method == 'binned':
+            assert inv_s2.shape[0] == 1, "The binned method requires a constant bandwidth."
+            assert not leave_one_out, "The binned method does not support leave-one-out predictions."
+            assert 0. < tol < 1., "tol must be between 0 and 1."
+            return self._predict_binned(query_points, inv_s2, tol, n_bins, n_threads)[0]
+        elif method == 'nystrom':
+            assert inv_s2.shape[0] == 1, "The nystrom method requires a constant bandwidth."
+            assert not leave_one_out, "The nystrom method does not support leave-one-out predictions."
+            assert 0. < tol < 1., "tol must be between 0 and 1."
+            assert max_rank >= 1, "max_rank must be a positive integer."
+            # the cached factorization is reused by later calls, so its cost is weighed against exact sums over at least the training points
+            rank_limit = min(max_rank, self._nystrom_rank_limit(max(query_points.shape[0], self._indepvars.shape[0])))
+            features = self._nystrom_features(inv_s2, tol, rank_limit) if rank_limit >= 1 else None
+            if features is not None:
+                return self._predict_nystrom(query_points, inv_s2, tol, n_threads, features, kernel_tolerance)
+        elif method == 'auto':
+            assert 0. < tol < 1., "tol must be between 0 and 1."
+            if inv_s2.shape[0] == 1 and not leave_one_out:
+                rank_limit = min(max_rank, self._nystrom_rank_limit(query_points.shape[0]))
+                features = self._nystrom_features(inv_s2, tol, rank_limit) if rank_limit >= 1 else None
+                if features is not None:
+                    return self._predict_nystrom(query_points, inv_s2, tol, n_threads, features, kernel_tolerance)
+        elif method != 'exact':
+            raise ValueError("Unsupported method.")
+
+        depvar_points = np.zeros((query_points.shape[0], self._depvars.shape[1]), dtype=self._internal_dtype)
+        kernel_neighbors = None
+        if kernel_tolerance is not None:
+            kernel_neighbors = self._compute_kernel_neighbors(query_points, inv_s2, kernel_tolerance, n_threads, leave_one_out)
+        if return_gradient or return_diagnostics:
+            n_points, n_depvars = depvar_points.shape
+            gradient = np.zeros((n_points, n_depvars, self._indepvars.shape[1]), dtype=self._internal_dtype) if return_gradient else None
+            diagnostics = np.zeros((n_points, 2 + 2 * n_depvars), dtype=self._internal_dtype) if return_diagnostics else None
+            indptr, indices = kernel_neighbors if kernel_neighbors is not None else (None, None)
+            kernels = self._kernels if kernel_neighbors is not None else self._dense_kernels
+            kernels.kreg_evaluate_extended(query_points, depvar_points, gradient, diagnostics, self._indepvars, self._depvars, inv_s2, indptr, indices, n_threads, leave_one_out, self._weights)
+            outputs = [depvar_points]
+            if return_gradient:
+                outputs.append(gradient)
+            if return_diagnostics:
+                outputs.append({'kernel_sum': diagnostics[:, 0],
+                                'effective_neighbors': diagnostics[:, 0]**2 / diagnostics[:, 1],
+                                'variance': diagnostics[:, 2 + n_depvars:]})
+            return tuple(outputs)
+        if kernel_neighbors is None:
+            self._dense_kernels.kreg_evaluate(query_points, depvar_points, self._indepvars, self._depvars, inv_s2, n_threads, leave_one_out, self._weights)
+        else:
+            indptr, indices = kernel_neighbors
+            self._kernels.kreg_evaluate_pruned(query_points, depvar_points, self._indepvars, self._depvars, inv_s2, indptr, indices, n_threads, leave_one_out, self._weights)
+        return depvar_points
+
+    def predict_iter(self, query_chunks, bandwidth, n_neighbors=None, n_threads=1, kernel_tolerance=None, method='exact', tol=1.e-6, max_rank=1000):
+        """
+        Calculate dependent variable predictions for a sequence of query point chunks, yielding the predictions for each chunk in turn.
+        Only one chunk of query points and predictions is held at a time, so data sets that do not fit in memory can be streamed,
+        for instance from files or from a simulation. The spatial indexes and the Nystrom factorization are reused across chunks.
+
+        **Example:**
+
+        .. code::
+
+          from PCAfold import KReg
+          import numpy as np
+
+          indepvars = np.random.rand(1000,2)
+          depvars = np.cos(indepvars)
+
+          model = KReg(indepvars, depvars)
+          query_chunks = (np.random.rand(100,2) for i in range(10))
+          for predicted in model.predict_iter(query_chunks, 0.1):
+              print(predicted.shape)
+
+        :param query_chunks:
+            iterable of ``numpy.ndarray`` query point chunks, each of size ``(n_points,n_independent_variables)``.
+        :param bandwidth:
+            value(s) to use for the bandwidth in the Gaussian kernel, as in ``predict``. Arrays must broadcast to every chunk,
+            so bandwidth arrays must be of size ``(1,n_independent_variables)`` or ``(1,1)``.
+        :param n_neighbors:
+            (optional, default None) as in ``predict``
+        :param n_threads:
+            (optional, default 1) as in ``predict``
+        :param kernel_tolerance:
+            (optional, default None) as in ``predict``
+        :param method:
+            (optional, default ``'exact'``) as in ``predict``
+        :param tol:
+            (optional, default :math:`10^{-6}`) as in ``predict``
+        :param max_rank:
+            (optional, default 1000) as in ``predict``
+
+        :return: a generator of dependent variable predictions, one array per chunk in ``query_chunks``
+        """
+        if isinstance(bandwidth, np.ndarray):
+            assert bandwidth.ndim == 2 and bandwidth.shape[0] == 1, "bandwidth arrays must be of size 1 x n_independent_variables or 1 x 1."
+
+        def chunk_predictions():
+            for query_points in query_chunks:
+                yield self.predict(query_points, bandwidth, n_neighbors, n_threads, kernel_tolerance, False, method, tol, max_rank)
+
+        return chunk_predictions()
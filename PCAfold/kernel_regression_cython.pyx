@@ -3,249 +3,639 @@
 import numpy as np
 cimport numpy as np
 cimport cython
-from libc.math cimport exp, abs
-from scipy.spatial import cKDTree
+from cython.parallel import prange
+from cython cimport floating
+from libc.math cimport exp, expf, abs
+from libc.stdlib cimport malloc, free
+
+# Compiled kernels of PCAfold.kernel_regression.KReg; PCAfold.kernel_regression_numpy provides the same functions in NumPy.
+# The kernels are fused over float and double, so that KReg(..., internal_dtype=np.float32) evaluates the distances and kernels
+# in single precision. The kernel sums of each query point are accumulated in local double precision variables and written
+# to the output once, which keeps the inner loops free of stores to the output and the sums accurate over many training points.
+
+
+# number of training points whose kernels are computed at a time by _block_kernels
+DEF _BLOCK_SIZE = 256
+
+
+cdef inline floating _exp(floating u) noexcept nogil:
+    # kernels below the smallest normal number are flushed to zero, because arithmetic on subnormal numbers is very slow.
+    # The argument is clamped first, so that the vectorized exponential never leaves its fast path.
+    cdef floating lower, zero = 0., clamped
+    if floating is float:
+        lower = -87.
+    else:
+        lower = -708.
+    clamped = u if u > lower else lower
+    if floating is float:
+        clamped = expf(clamped)
+    else:
+        clamped = exp(clamped)
+    return clamped if u > lower else zero
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+cdef inline floating _scaled_squared_distance(floating [:, :] x,
+                                              Py_ssize_t i,
+                                              const floating [:, :] x_train,
+                                              Py_ssize_t j,
+                                              floating [:, :] inv_s2,
+                                              Py_ssize_t si) noexcept nogil:
+    # inv_s2 holds 1/bandwidth^2 and has either one row per query point or a single row shared by all query points (si = 0),
+    # and either one column per independent variable or a single isotropic column
+    cdef Py_ssize_t d = x_train.shape[1]
+    cdef Py_ssize_t l
+    cdef floating u = 0.
+    if inv_s2.shape[1] == 1:
+        for l in range(d):
+            u = u + (x_train[j, l] - x[i, l]) * (x_train[j, l] - x[i, l])
+        return u * inv_s2[si, 0]
+    for l in range(d):
+        u = u + (x_train[j, l] - x[i, l]) * (x_train[j, l] - x[i, l]) * inv_s2[si, l]
+    return u
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+cdef void _block_kernels(Py_ssize_t i,
+                         const floating [:, :] x,
+                         const floating [:, :] x_train,
+                         floating [:, :] inv_s2,
+                         Py_ssize_t si,
+                         const floating [:] w,
+                         bint weighted,
+                         bint leave_one_out,
+                         Py_ssize_t start,
+                         Py_ssize_t size,
+                         floating *u,
+                         double *k) noexcept nogil:
+    # kernels k[j] of query point i with the training points start + j, j < size, as _scaled_squared_distance and _exp,
+    # computed in one loop over the block per independent variable and one for the exponentials, which the compiler vectorizes.
+    # With leave_one_out, the kernel of training point i is zero.
+    cdef Py_ssize_t d = x_train.shape[1]
+    cdef bint isotropic = inv_s2.shape[1] == 1
+    cdef Py_ssize_t j, l
+    cdef floating x_il, s_l, difference
+    for j in range(size):
+        u[j] = 0.
+    for l in range(d):
+        x_il = x[i, l]
+        s_l = 1. if isotropic else inv_s2[si, l]
+        for j in range(size):
+            difference = x_train[start + j, l] - x_il
+            u[j] = u[j] + difference * difference * s_l
+    s_l = inv_s2[si, 0] if isotropic else 1.
+    for j in range(size):
+        k[j] = _exp(-u[j] * s_l)
+    if weighted:
+        for j in range(size):
+            k[j] = k[j] * w[start + j]
+    if leave_one_out and start <= i < start + size:
+        k[i - start] = 0.
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+cdef double _block_sums(const double *k,
+                        const floating [:, :] y_train,
+                        Py_ssize_t start,
+                        Py_ssize_t size,
+                        double sum_k,
+                        double *sum_ky) noexcept nogil:
+    # adds the kernels k of a block to the kernel sum sum_k, which is returned, and k[j] y_train[start + j, q] to sum_ky[q].
+    # It is not inlined, so that every row evaluation sums a block with the same instructions and in the same order.
+    cdef Py_ssize_t p = y_train.shape[1]
+    cdef Py_ssize_t j, q
+    cdef double sum_kq
+    for j in range(size):
+        sum_k = sum_k + k[j]
+    for q in range(p):
+        sum_kq = sum_ky[q]
+        for j in range(size):
+            sum_kq = sum_kq + k[j] * y_train[start + j, q]
+        sum_ky[q] = sum_kq
+    return sum_k
 
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
 @cython.nonecheck(False)
 @cython.cdivision(True)
-def kreg_evaluate(np.ndarray[double, ndim=2] x_np,
-                  np.ndarray[double, ndim=2] y_np,
-                  np.ndarray[double, ndim=2] x_train_np,
-                  np.ndarray[double, ndim=2] y_train_np,
-                  np.ndarray[double, ndim=2] s_np):
-    cdef int n = x_train_np.shape[0]   # number of basis (training) points
-    cdef int d = x_train_np.shape[1]   # number of independent variable dimensions
-    cdef int m = x_np.shape[0]         # number of evaluation (testing) points
-    cdef int p = y_np.shape[1]         # number of quantities to evaluate
-    cdef double [:, :] x_train = x_train_np
-    cdef double [:, :] y_train = y_train_np
-    cdef double [:, :] s = s_np
-    cdef double [:, :] x = x_np
-    cdef double [:, :] y = y_np
-    cdef double [:] sum_ky = np.zeros(p)
+cdef void _kreg_evaluate_row(Py_ssize_t i,
+                             floating [:, :] x,
+                             floating [:, :] y,
+                             const floating [:, :] x_train,
+                             const floating [:, :] y_train,
+                             floating [:, :] inv_s2,
+                             const floating [:] w,
+                             bint weighted,
+                             bint leave_one_out) noexcept nogil:
+    # evaluates a single query point, accumulating the sums in sum_k and sum_ky before writing the output row.
+    # The training points are visited in blocks of _BLOCK_SIZE, see _block_kernels and _block_sums.
+    # With leave_one_out, query point i is training point i and its own contribution is skipped.
+    # If weighted, the kernel of training point j is multiplied by its observation weight w[j].
+    cdef Py_ssize_t n = x_train.shape[0]
+    cdef Py_ssize_t p = y.shape[1]
+    cdef Py_ssize_t si = i if inv_s2.shape[0] > 1 else 0
+    cdef Py_ssize_t start, size, q
+    cdef floating u[_BLOCK_SIZE]
+    cdef double k[_BLOCK_SIZE]
     cdef double sum_k = 0.
-    cdef double u = 0.
-    cdef double kj = 0.
-    for i in range(m):
-        sum_k = 0
-        for j in range(n):
-            u = 0
-            for l in range(d):
-                u += (x_train[j, l] - x[i, l]) * (x_train[j, l] - x[i, l]) / (s[i, l]*s[i, l])
-            kj = exp(-u)
-            sum_k += kj
+    cdef double *sum_ky = <double *> malloc(p * sizeof(double))
+    for q in range(p):
+        sum_ky[q] = 0.
+    for start in range(0, n, _BLOCK_SIZE):
+        size = min(_BLOCK_SIZE, n - start)
+        _block_kernels(i, x, x_train, inv_s2, si, w, weighted, leave_one_out, start, size, u, k)
+        sum_k = _block_sums(k, y_train, start, size, sum_k, sum_ky)
+    for q in range(p):
+        y[i, q] = <floating> (sum_ky[q] / sum_k)
+    free(sum_ky)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def kreg_evaluate(floating [:, :] x,
+                  floating [:, :] y,
+                  const floating [:, :] x_train,
+                  const floating [:, :] y_train,
+                  floating [:, :] inv_s2,
+                  int n_threads=1,
+                  bint leave_one_out=False,
+                  const floating [:] w=None):
+    # query points are independent, so with n_threads > 1 the rows are split across OpenMP threads
+    # without the GIL; each row is summed in the same order as the serial loop so results are bit-identical.
+    # inv_s2 is 1/bandwidth^2 of shape (1, 1), (m, 1), (1, d) or (m, d), see _scaled_squared_distance.
+    # w holds optional observation weights of the training points.
+    cdef Py_ssize_t m = x.shape[0]   # number of evaluation (testing) points
+    cdef Py_ssize_t i
+    cdef bint weighted = w is not None
+    if not weighted:
+        w = np.ones(1, dtype=np.asarray(y_train).dtype)
+    if n_threads > 1:
+        for i in prange(m, nogil=True, num_threads=n_threads, schedule='static'):
+            _kreg_evaluate_row(i, x, y, x_train, y_train, inv_s2, w, weighted, leave_one_out)
+    else:
+        with nogil:
+            for i in range(m):
+                _kreg_evaluate_row(i, x, y, x_train, y_train, inv_s2, w, weighted, leave_one_out)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+@cython.cdivision(True)
+cdef void _kreg_evaluate_pruned_row(Py_ssize_t i,
+                                    floating [:, :] x,
+                                    floating [:, :] y,
+                                    const floating [:, :] x_train,
+                                    const floating [:, :] y_train,
+                                    floating [:, :] inv_s2,
+                                    np.int64_t [:] indptr,
+                                    np.int64_t [:] indices,
+                                    const floating [:] w,
+                                    bint weighted,
+                                    bint leave_one_out) noexcept nogil:
+    # same as _kreg_evaluate_row, but only visits the training points listed in indices[indptr[i]:indptr[i+1]]
+    cdef Py_ssize_t p = y.shape[1]
+    cdef Py_ssize_t si = i if inv_s2.shape[0] > 1 else 0
+    cdef Py_ssize_t jj, j, q
+    cdef double sum_k = 0.
+    cdef double kj
+    cdef double *sum_ky = <double *> malloc(p * sizeof(double))
+    for q in range(p):
+        sum_ky[q] = 0.
+    for jj in range(indptr[i], indptr[i+1]):
+        j = indices[jj]
+        if leave_one_out and j == i:
+            continue
+        kj = _exp(-_scaled_squared_distance(x, i, x_train, j, inv_s2, si))
+        if weighted:
+            kj = kj * w[j]
+        sum_k = sum_k + kj
+        for q in range(p):
+            sum_ky[q] = sum_ky[q] + kj * y_train[j, q]
+    if sum_k > 0.:
+        for q in range(p):
+            y[i, q] = <floating> (sum_ky[q] / sum_k)
+        free(sum_ky)
+    else:
+        free(sum_ky)
+        # no training point within the cutoff radius, fall back on the full sum
+        _kreg_evaluate_row(i, x, y, x_train, y_train, inv_s2, w, weighted, leave_one_out)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def kreg_evaluate_pruned(floating [:, :] x,
+                         floating [:, :] y,
+                         const floating [:, :] x_train,
+                         const floating [:, :] y_train,
+                         floating [:, :] inv_s2,
+                         np.int64_t [:] indptr,
+                         np.int64_t [:] indices,
+                         int n_threads=1,
+                         bint leave_one_out=False,
+                         const floating [:] w=None):
+    # neighbor lists are given in compressed sparse row format: the training points for query i are indices[indptr[i]:indptr[i+1]]
+    cdef Py_ssize_t m = x.shape[0]   # number of evaluation (testing) points
+    cdef Py_ssize_t i
+    cdef bint weighted = w is not None
+    if not weighted:
+        w = np.ones(1, dtype=np.asarray(y_train).dtype)
+    if n_threads > 1:
+        for i in prange(m, nogil=True, num_threads=n_threads, schedule='dynamic'):
+            _kreg_evaluate_pruned_row(i, x, y, x_train, y_train, inv_s2, indptr, indices, w, weighted, leave_one_out)
+    else:
+        with nogil:
+            for i in range(m):
+                _kreg_evaluate_pruned_row(i, x, y, x_train, y_train, inv_s2, indptr, indices, w, weighted, leave_one_out)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+@cython.cdivision(True)
+cdef inline void _extended_update(Py_ssize_t i,
+                                  Py_ssize_t j,
+                                  double kj,
+                                  double running_k,
+                                  floating [:, :] x,
+                                  floating [:, :, :] g,
+                                  floating [:, :] sum_kd,
+                                  floating [:, :] diagnostics,
+                                  const floating [:, :] x_train,
+                                  const floating [:, :] y_train,
+                                  bint gradient,
+                                  bint diagnose) noexcept nogil:
+    # adds the kernel kj of training point j to the gradient and diagnostics sums of query point i described in
+    # _kreg_evaluate_extended_row, where running_k is the kernel sum over the training points visited so far, including j
+    cdef Py_ssize_t d = x_train.shape[1]
+    cdef Py_ssize_t p = y_train.shape[1]
+    cdef Py_ssize_t l, q
+    cdef floating kdx, delta, weight
+    if gradient:
+        for l in range(d):
+            kdx = kj * (x[i, l] - x_train[j, l])
+            sum_kd[i, l] = sum_kd[i, l] + kdx
             for q in range(p):
-                sum_ky[q] += kj * y_train[j, q]
+                g[i, q, l] = g[i, q, l] + kdx * y_train[j, q]
+    if diagnose and kj > 0.:
+        diagnostics[i, 1] = diagnostics[i, 1] + kj * kj
+        weight = kj / running_k
         for q in range(p):
-            y[i, q] = sum_ky[q] / sum_k
-            sum_ky[q] = 0.
+            delta = y_train[j, q] - diagnostics[i, 2 + q]
+            diagnostics[i, 2 + q] = diagnostics[i, 2 + q] + weight * delta
+            diagnostics[i, 2 + p + q] = diagnostics[i, 2 + p + q] + kj * delta * (y_train[j, q] - diagnostics[i, 2 + q])
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+@cython.cdivision(True)
+cdef void _kreg_evaluate_extended_row(Py_ssize_t i,
+                                      floating [:, :] x,
+                                      floating [:, :] y,
+                                      floating [:, :, :] g,
+                                      floating [:, :] sum_kd,
+                                      floating [:, :] diagnostics,
+                                      const floating [:, :] x_train,
+                                      const floating [:, :] y_train,
+                                      floating [:, :] inv_s2,
+                                      np.int64_t [:] indptr,
+                                      np.int64_t [:] indices,
+                                      const floating [:] w,
+                                      bint weighted,
+                                      bint gradient,
+                                      bint diagnose,
+                                      bint pruned,
+                                      bint leave_one_out) noexcept nogil:
+    # evaluates a single query point as _kreg_evaluate_row, with the same summation order and precision for y, together with
+    # - if gradient: the Jacobian d y[i, q] / d x[i, l]. With k_j the kernel weights and dx_jl = x[i, l] - x_train[j, l],
+    #   it is -2 inv_s2[l] (sum_j k_j dx_jl y_train[j, q] - y[i, q] sum_j k_j dx_jl) / sum_j k_j,
+    #   so g[i] accumulates sum_j k_j dx_jl y_train[j, q] and sum_kd[i] accumulates sum_j k_j dx_jl.
+    # - if diagnose: diagnostics[i] = [sum_j k_j, sum_j k_j^2, kernel-weighted mean (p), kernel-weighted variance (p)],
+    #   with the weighted mean and variance updated incrementally (West, 1979) to avoid cancellation.
+    # If pruned, only the training points listed in indices[indptr[i]:indptr[i+1]] are visited, as in _kreg_evaluate_pruned_row,
+    # and otherwise the kernels are computed in blocks, as in _kreg_evaluate_row. If weighted, k_j includes the observation weight w[j].
+    cdef Py_ssize_t n = x_train.shape[0]
+    cdef Py_ssize_t d = x_train.shape[1]
+    cdef Py_ssize_t p = y.shape[1]
+    cdef Py_ssize_t si = i if inv_s2.shape[0] > 1 else 0
+    cdef Py_ssize_t jj, j, l, q, start, size
+    cdef floating u[_BLOCK_SIZE]
+    cdef double k[_BLOCK_SIZE]
+    cdef double sum_k = 0.
+    cdef double running_k = 0.
+    cdef double kj
+    cdef double *sum_ky = <double *> malloc(p * sizeof(double))
+    for q in range(p):
+        sum_ky[q] = 0.
+    if gradient:
+        for l in range(d):
+            sum_kd[i, l] = 0.
+            for q in range(p):
+                g[i, q, l] = 0.
+    if diagnose:
+        for l in range(diagnostics.shape[1]):
+            diagnostics[i, l] = 0.
+    if pruned:
+        for jj in range(indptr[i], indptr[i+1]):
+            j = indices[jj]
+            if leave_one_out and j == i:
+                continue
+            kj = _exp(-_scaled_squared_distance(x, i, x_train, j, inv_s2, si))
+            if weighted:
+                kj = kj * w[j]
+            sum_k = sum_k + kj
+            for q in range(p):
+                sum_ky[q] = sum_ky[q] + kj * y_train[j, q]
+            _extended_update(i, j, kj, sum_k, x, g, sum_kd, diagnostics, x_train, y_train, gradient, diagnose)
+    else:
+        for start in range(0, n, _BLOCK_SIZE):
+            size = min(_BLOCK_SIZE, n - start)
+            _block_kernels(i, x, x_train, inv_s2, si, w, weighted, leave_one_out, start, size, u, k)
+            sum_k = _block_sums(k, y_train, start, size, sum_k, sum_ky)
+            if gradient or diagnose:
+                for j in range(size):
+                    running_k = running_k + k[j]
+                    _extended_update(i, start + j, k[j], running_k, x, g, sum_kd, diagnostics, x_train, y_train, gradient, diagnose)
+    if pruned and sum_k == 0.:
+        # no training point within the cutoff radius, fall back on the full sum
+        free(sum_ky)
+        _kreg_evaluate_extended_row(i, x, y, g, sum_kd, diagnostics, x_train, y_train, inv_s2, indptr, indices, w, weighted, gradient, diagnose, False, leave_one_out)
+        return
+    for q in range(p):
+        y[i, q] = <floating> (sum_ky[q] / sum_k)
+    free(sum_ky)
+    if gradient:
+        for l in range(d):
+            for q in range(p):
+                g[i, q, l] = -2. * inv_s2[si, l if inv_s2.shape[1] > 1 else 0] * (g[i, q, l] - y[i, q] * sum_kd[i, l]) / sum_k
+    if diagnose:
+        diagnostics[i, 0] = sum_k
+        for q in range(p):
+            diagnostics[i, 2 + p + q] = diagnostics[i, 2 + p + q] / sum_k
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def kreg_evaluate_extended(floating [:, :] x,
+                           floating [:, :] y,
+                           floating [:, :, :] g,
+                           floating [:, :] diagnostics,
+                           const floating [:, :] x_train,
+                           const floating [:, :] y_train,
+                           floating [:, :] inv_s2,
+                           np.int64_t [:] indptr=None,
+                           np.int64_t [:] indices=None,
+                           int n_threads=1,
+                           bint leave_one_out=False,
+                           const floating [:] w=None):
+    # evaluates the predictions y (m, p) in one pass together with, unless None, their Jacobians g (m, p, d) with respect to
+    # the query points and the kernel diagnostics (m, 2 + 2 p) described in _kreg_evaluate_extended_row,
+    # over all training points or, if indptr and indices are given, over the neighbor lists of kreg_evaluate_pruned
+    cdef Py_ssize_t m = x.shape[0]   # number of evaluation (testing) points
+    cdef Py_ssize_t i
+    cdef bint gradient = g is not None
+    cdef bint diagnose = diagnostics is not None
+    cdef bint pruned = indptr is not None
+    cdef bint weighted = w is not None
+    dtype = np.asarray(y_train).dtype
+    cdef floating [:, :] sum_kd = np.zeros((m if gradient else 1, x_train.shape[1]), dtype=dtype)
+    if not gradient:
+        g = np.zeros((1, 1, 1), dtype=dtype)
+    if not diagnose:
+        diagnostics = np.zeros((1, 1), dtype=dtype)
+    if not weighted:
+        w = np.ones(1, dtype=dtype)
+    if not pruned:
+        indptr = np.zeros(1, dtype=np.int64)
+        indices = np.zeros(0, dtype=np.int64)
+    if n_threads > 1:
+        for i in prange(m, nogil=True, num_threads=n_threads, schedule='dynamic'):
+            _kreg_evaluate_extended_row(i, x, y, g, sum_kd, diagnostics, x_train, y_train, inv_s2, indptr, indices, w, weighted, gradient, diagnose, pruned, leave_one_out)
+    else:
+        with nogil:
+            for i in range(m):
+                _kreg_evaluate_extended_row(i, x, y, g, sum_kd, diagnostics, x_train, y_train, inv_s2, indptr, indices, w, weighted, gradient, diagnose, pruned, leave_one_out)
 
-class KReg:
-    """
-    A class for building and evaluating Nadaraya-Watson kernel regression models using a Gaussian kernel.
-    The regression estimator :math:`\\mathcal{K}(u; \\sigma)` evaluated at independent variables :math:`u` can be
-    expressed using a set of :math:`n` observations of independent variables (:math:`x`) and dependent variables
-    (:math:`y`) as follows
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+@cython.cdivision(True)
+def kreg_evaluate_symmetric(floating [:, :] y,
+                            const floating [:, :] x_train,
+                            const floating [:, :] y_train,
+                            floating [:] inv_s2,
+                            bint leave_one_out=False,
+                            const floating [:] w=None):
+    # evaluates the training points themselves with a bandwidth that is the same for every point, so the kernel is
+    # symmetric and each pair is computed once and applied to both rows. The pairs are visited in tiles of _BLOCK_SIZE rows i
+    # and _BLOCK_SIZE columns j > i: the kernels of row i with a block of columns are computed with _block_kernels and added
+    # to the sums of row i with _block_sums, and to the sums of the columns with vectorized loops over the block.
+    # rows[i - start_i] holds the kernel sum of row i of the current tile of rows followed by its sum_ky accumulators,
+    # and columns[q, j] the kernel sum (q = 0) and sum_ky accumulators (q > 0) collected by column j from the rows before it.
+    # With leave_one_out, the contribution of each point to its own prediction is skipped.
+    # With observation weights w, the pair kernel is multiplied by w[j] in row i and by w[i] in row j.
+    cdef Py_ssize_t n = x_train.shape[0]   # number of basis (training) points
+    cdef Py_ssize_t p = y_train.shape[1]   # number of quantities to evaluate
+    cdef floating [:, :] s2 = np.asarray(inv_s2).reshape(1, -1)
+    cdef double [:, ::1] columns = np.zeros((p + 1, n))
+    cdef double [:, ::1] rows = np.zeros((_BLOCK_SIZE, p + 1))
+    cdef Py_ssize_t start_i, stop_i, start_j, size, i, j, q, t
+    cdef floating u[_BLOCK_SIZE]
+    cdef double k[_BLOCK_SIZE]
+    cdef double kw[_BLOCK_SIZE]
+    cdef double w_i, c
+    cdef bint weighted = w is not None
+    if not weighted:
+        w = np.ones(1, dtype=np.asarray(y_train).dtype)
+    with nogil:
+        for start_i in range(0, n, _BLOCK_SIZE):
+            stop_i = min(start_i + _BLOCK_SIZE, n)
+            for i in range(start_i, stop_i):
+                w_i = w[i] if weighted else 1.
+                if leave_one_out:
+                    rows[i - start_i, 0] = 0.
+                    for q in range(p):
+                        rows[i - start_i, 1 + q] = 0.
+                else:
+                    # kernel of a point with itself
+                    rows[i - start_i, 0] = w_i
+                    for q in range(p):
+                        rows[i - start_i, 1 + q] = w_i * y_train[i, q]
+            # the diagonal tile starts after row i, the others cover whole blocks of columns
+            for start_j in range(start_i, n, _BLOCK_SIZE):
+                for i in range(start_i, stop_i):
+                    if start_j == start_i:
+                        size = stop_i - i - 1
+                        if size == 0:
+                            continue
+                        j = i + 1
+                    else:
+                        size = min(_BLOCK_SIZE, n - start_j)
+                        j = start_j
+                    _block_kernels(i, x_train, x_train, s2, 0, w, False, False, j, size, u, k)
+                    w_i = w[i] if weighted else 1.
+                    if weighted:
+                        for t in range(size):
+                            kw[t] = k[t] * w[j + t]
+                        rows[i - start_i, 0] = _block_sums(kw, y_train, j, size, rows[i - start_i, 0], &rows[i - start_i, 1])
+                    else:
+                        rows[i - start_i, 0] = _block_sums(k, y_train, j, size, rows[i - start_i, 0], &rows[i - start_i, 1])
+                    for t in range(size):
+                        columns[0, j + t] = columns[0, j + t] + k[t] * w_i
+                    for q in range(p):
+                        c = w_i * y_train[i, q]
+                        for t in range(size):
+                            columns[1 + q, j + t] = columns[1 + q, j + t] + k[t] * c
+            for i in range(start_i, stop_i):
+                for q in range(p + 1):
+                    columns[q, i] = columns[q, i] + rows[i - start_i, q]
+        for i in range(n):
+            for q in range(p):
+                y[i, q] = <floating> (columns[1 + q, i] / columns[0, i])
 
-    .. math::
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+@cython.cdivision(True)
+cdef void _kreg_evaluate_bandwidths_row(Py_ssize_t i,
+                                        floating [:, :] x,
+                                        floating [:, :, :] y,
+                                        const floating [:, :] x_train,
+                                        const floating [:, :] y_train,
+                                        floating [:] inv_s2,
+                                        const floating [:] w,
+                                        bint weighted) noexcept nogil:
+    # the training points are visited in blocks of _BLOCK_SIZE as in _kreg_evaluate_row. The squared distances of a block are
+    # computed once and reused for every bandwidth, whose kernels and sums are then evaluated as in _block_kernels and _block_sums,
+    # so each bandwidth gives the same result as kreg_evaluate. Bandwidths for which the whole block is below the smallest normal
+    # number after _exp are skipped, since their kernels are all zero.
+    # sum_k[b] holds the kernel sum for bandwidth b and sum_ky[b * p + q] its sum of kernels times y_train[:, q].
+    # If weighted, the kernel of training point j is multiplied by its observation weight w[j].
+    cdef Py_ssize_t n = x_train.shape[0]
+    cdef Py_ssize_t d = x_train.shape[1]
+    cdef Py_ssize_t nb = y.shape[0]
+    cdef Py_ssize_t p = y.shape[2]
+    cdef Py_ssize_t start, size, j, l, q, b
+    cdef floating u[_BLOCK_SIZE]
+    cdef double k[_BLOCK_SIZE]
+    cdef floating x_il, difference, u_min, s_b, flushed
+    cdef double *sum_k = <double *> malloc(nb * (p + 1) * sizeof(double))
+    cdef double *sum_ky = sum_k + nb
+    if floating is float:
+        flushed = 87.
+    else:
+        flushed = 708.
+    for b in range(nb * (p + 1)):
+        sum_k[b] = 0.
+    for start in range(0, n, _BLOCK_SIZE):
+        size = min(_BLOCK_SIZE, n - start)
+        for j in range(size):
+            u[j] = 0.
+        for l in range(d):
+            x_il = x[i, l]
+            for j in range(size):
+                difference = x_train[start + j, l] - x_il
+                u[j] = u[j] + difference * difference
+        u_min = u[0]
+        for j in range(1, size):
+            u_min = u[j] if u[j] < u_min else u_min
+        for b in range(nb):
+            s_b = inv_s2[b]
+            if u_min * s_b >= flushed:
+                continue
+            for j in range(size):
+                k[j] = _exp(-u[j] * s_b)
+            if weighted:
+                for j in range(size):
+                    k[j] = k[j] * w[start + j]
+            sum_k[b] = _block_sums(k, y_train, start, size, sum_k[b], sum_ky + b * p)
+    for b in range(nb):
+        for q in range(p):
+            y[b, i, q] = <floating> (sum_ky[b * p + q] / sum_k[b])
+    free(sum_k)
 
-            \\mathcal{K}(u; \\sigma) = \\frac{\\sum_{i=1}^{n} \\mathcal{W}_i(u; \\sigma) y_i}{\\sum_{i=1}^{n} \\mathcal{W}_i(u; \\sigma)}
 
-    where a Gaussian kernel of bandwidth :math:`\\sigma` is used as
-
-    .. math::
-        \\mathcal{W}_i(u; \\sigma) = \\exp \\left( \\frac{-|| x_i - u ||_2^2}{\\sigma^2} \\right)
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def kreg_evaluate_bandwidths(floating [:, :] x,
+                             floating [:, :, :] y,
+                             const floating [:, :] x_train,
+                             const floating [:, :] y_train,
+                             floating [:] inv_s2,
+                             int n_threads=1,
+                             const floating [:] w=None):
+    cdef Py_ssize_t m = x.shape[0]   # number of evaluation (testing) points
+    cdef Py_ssize_t i
+    cdef bint weighted = w is not None
+    if not weighted:
+        w = np.ones(1, dtype=np.asarray(y_train).dtype)
+    if n_threads > 1:
+        for i in prange(m, nogil=True, num_threads=n_threads, schedule='static'):
+            _kreg_evaluate_bandwidths_row(i, x, y, x_train, y_train, inv_s2, w, weighted)
+    else:
+        with nogil:
+            for i in range(m):
+                _kreg_evaluate_bandwidths_row(i, x, y, x_train, y_train, inv_s2, w, weighted)
 
-    Both constant and variable bandwidths are supported. Kernels with anisotropic bandwidths are calculated as
-
-    .. math::
-        \\mathcal{W}_i(u; \\sigma) = \\exp \\left( -|| \\text{diag}(\\sigma)^{-1} (x_i - u) ||_2^2 \\right)
-
-    where :math:`\\sigma` is a vector of bandwidths per independent variable.
-
-    **Example:**
-
-    .. code::
-
-      from PCAfold import KReg
-      import numpy as np
-
-      indepvars = np.expand_dims(np.linspace(0,np.pi,11),axis=1)
-      depvars = np.cos(indepvars)
-      query = np.expand_dims(np.linspace(0,np.pi,21),axis=1)
-
-      model = KReg(indepvars, depvars)
-      predicted = model.predict(query, 'nearest_neighbors_isotropic', n_neighbors=1)
-
-    :param indepvars:
-        ``numpy.ndarray`` specifying the independent variable training data, :math:`x` in equations above. It should be of size ``(n_observations,n_independent_variables)``.
-    :param depvars:
-        ``numpy.ndarray`` specifying the dependent variable training data, :math:`y` in equations above. It should be of size ``(n_observations,n_dependent_variables)``.
-    :param internal_dtype:
-        (optional, default float) data type to enforce in training and evaluating
-    :param supress_warning:
-        (optional, default False) if True, turns off printed warnings
-    """
-    def __init__(self, indepvars, depvars, internal_dtype=float, supress_warning=False):
-        assert indepvars.ndim == 2, "independent variable array must be 2D: n_observations x n_variables."
-        assert depvars.ndim == 2, "dependent variable array must be 2D: n_observations x n_variables."
-        assert indepvars.shape[0] == depvars.shape[0], "number of observations for independent and dependent variables must match."
-
-        if not isinstance(indepvars[0][0], internal_dtype) or not isinstance(depvars[0][0], internal_dtype):
-            if not supress_warning:
-                print("WARNING: casting training data as",internal_dtype)
-
-        self._indepvars = indepvars.astype(internal_dtype)
-        self._depvars = depvars.astype(internal_dtype)
-        self._internal_dtype = internal_dtype
-
-    @property
-    def indepvars(self):
-        return self._indepvars
-
-    @property
-    def depvars(self):
-        return self._depvars
-
-    @property
-    def internal_dtype(self):
-        return self._internal_dtype
-
-    def compute_constant_bandwidth(self, query_points, bandwidth):
-        """
-        Format a single bandwidth value into a 2D array matching the shape of ``query_points``
-
-        :param query_points:
-            array of independent variable points to query the model (n_points x n_independent_variables)
-        :param bandwidth:
-            single value for the bandwidth used in a Gaussian kernel
-
-        :return:
-            an array of bandwidth values matching the shape of ``query_points``
-        """
-        return bandwidth*np.ones_like(query_points, dtype=self._internal_dtype)
-
-    def compute_bandwidth_isotropic(self, query_points, bandwidth):
-        """
-        Format a 1D array of bandwidth values for each point in ``query_points`` into a 2D array matching the shape of ``query_points``
-
-        :param query_points:
-            array of independent variable points to query the model (n_points x n_independent_variables)
-        :param bandwidth:
-            1D array of bandwidth values length n_points
-
-        :return:
-            an array of bandwidth values matching the shape of ``query_points`` (repeats the bandwidth array for each independent variable)
-        """
-        assert bandwidth.ravel().size == query_points.shape[0], "provided bandwidth array must be of length equal to the number of rows in query_points."
-        return np.tile(bandwidth, query_points.shape[1]).reshape(query_points.T.shape).T.astype(self._internal_dtype)
-
-    def compute_bandwidth_anisotropic(self, query_points, bandwidth):
-        """
-        Format a 1D array of bandwidth values for each independent variable into the 2D array matching the shape of ``query_points``
-
-        :param query_points:
-            array of independent variable points to query the model (n_points x n_independent_variables)
-        :param bandwidth:
-            1D array of bandwidth values length n_independent_variables
-
-        :return:
-            an array of bandwidth values matching the shape of ``query_points`` (repeats the bandwidth array for each point in ``query_points``)
-        """
-        assert bandwidth.ravel().size == query_points.shape[1], "provided bandwidth array must be of length equal to the number of independent variables."
-        return np.tile(bandwidth,query_points.shape[0]).reshape(query_points.shape).astype(self._internal_dtype)
-
-    def compute_nearest_neighbors_bandwidth_isotropic(self, query_points, n_neighbors):
-        """
-        Compute a variable bandwidth for each point in ``query_points`` based on the Euclidean distance to the ``n_neighbors`` nearest neighbor
-
-        :param query_points:
-            array of independent variable points to query the model (n_points x n_independent_variables)
-        :param n_neighbors:
-            integer value for the number of nearest neighbors to consider in computing a bandwidth (distance)
-
-        :return:
-            an array of bandwidth values matching the shape of ``query_points`` (varies for each point, constant across independent variables)
-        """
-        tree = cKDTree(self._indepvars)
-        query_bandwidth = tree.query(query_points,k=n_neighbors)[0]
-        if n_neighbors==1:
-            variable_bandwidth = query_bandwidth
-        else:
-            variable_bandwidth = query_bandwidth[:, n_neighbors - 1]
-
-        threshold = 1.e-16
-        variable_bandwidth[variable_bandwidth<threshold] = threshold # remove zero values
-        return self.compute_bandwidth_isotropic(query_points, variable_bandwidth)
-
-    def compute_nearest_neighbors_bandwidth_anisotropic(self, query_points, n_neighbors):
-        """
-        Compute a variable bandwidth for each point in ``query_points`` and each independent variable separately based
-        on the distance to the ``n_neighbors`` nearest neighbor in each independent variable dimension
-
-        :param query_points:
-            array of independent variable points to query the model (n_points x n_independent_variables)
-        :param n_neighbors:
-            integer value for the number of nearest neighbors to consider in computing a bandwidth (distance)
-
-        :return:
-            an array of bandwidth values matching the shape of ``query_points`` (varies for each point and independent variable)
-        """
-        variable_bandwidth = np.zeros_like(query_points, dtype=self._internal_dtype)
-        for i in range(query_points.shape[1]):
-            tree = cKDTree(np.expand_dims(self._indepvars[:, i], axis=1))
-            query_bandwidth = tree.query(np.expand_dims(query_points[:,i],axis=1),k=n_neighbors)[0]
-            if n_neighbors==1:
-                variable_bandwidth[:,i] = query_bandwidth
-            else:
-                variable_bandwidth[:,i] = query_bandwidth[:, n_neighbors - 1]
-
-        threshold = 1.e-16
-        variable_bandwidth[variable_bandwidth<threshold] = threshold # remove zero values
-        return variable_bandwidth
-
-    def predict(self, query_points, bandwidth, n_neighbors=None):
-        """
-        Calculate dependent variable predictions at ``query_points``.
-
-        :param query_points:
-            ``numpy.ndarray`` specifying the independent variable points to query the model. It should be of size ``(n_points,n_independent_variables)``.
-        :param bandwidth:
-            value(s) to use for the bandwidth in the Gaussian kernel. Supported formats include:
-
-            - single value: constant bandwidth applied to each query point and independent variable dimension.
-
-            - 2D array shape (n_points x n_independent_variables): an array of bandwidths for each independent variable dimension of each query point.
-
-            - string "nearest_neighbors_isotropic": This option requires the argument ``n_neighbors`` to be specified for which a bandwidth will be calculated for each query point based on the Euclidean distance to the ``n_neighbors`` nearest ``indepvars`` point.
-
-            - string "nearest_neighbors_anisotropic": This option requires the argument ``n_neighbors`` to be specified for which a bandwidth will be calculated for each query point based on the distance in each (separate) independent variable dimension to the ``n_neighbors`` nearest ``indepvars`` point.
-
-        :return: dependent variable predictions for the ``query_points``
-        """
-        assert query_points.ndim == 2, "query_points array must be 2D: n_observations x n_variables."
-        assert query_points.shape[1] == self._indepvars.shape[1], "Number of query_points independent variables inconsistent with model."
-
-        if isinstance(bandwidth,np.ndarray):
-            if bandwidth.ndim == 2:
-                assert bandwidth.shape == query_points.shape, "Shape of two-dimensional bandwidth array must match the shape of query_points."
-                bandwidth_array = bandwidth.astype(self._internal_dtype)
-            else:
-                raise ValueError("An array for bandwidth must be the same shape as query_points.")
-        elif isinstance(bandwidth,int) or isinstance(bandwidth,float):
-            bandwidth_array = self.compute_constant_bandwidth(query_points, bandwidth)
-        elif bandwidth=="nearest_neighbors_isotropic":
-            assert n_neighbors is not None, "nearest neighbors method requires n_neighbors be specified."
-            bandwidth_array = self.compute_nearest_neighbors_bandwidth_isotropic(query_points, n_neighbors)
-        elif bandwidth=="nearest_neighbors_anisotropic":
-            assert n_neighbors is not None, "nearest neighbors method requires n_neighbors be specified."
-            bandwidth_array = self.compute_nearest_neighbors_bandwidth_anisotropic(query_points, n_neighbors)
-        else:
-            raise ValueError("Unsupported bandwidth type.")
-
-        depvar_points = np.zeros((query_points.shape[0], self._depvars.shape[1]), dtype=self._internal_dtype)
-        kreg_evaluate(query_points.astype(self._internal_dtype), depvar_points, self._indepvars, self._depvars, bandwidth_array)
-        return depvar_points
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+@cython.cdivision(True)
+def kreg_evaluate_condensed(floating [:, :] y,
+                            const floating [:, :] y_train,
+                            floating [:, :] sq_dist,
+                            floating [:] inv_s2,
+                            bint leave_one_out=True,
+                            const floating [:] w=None):
+    # same as kreg_evaluate_symmetric, but with precomputed squared distances of all pairs i < j in the condensed order
+    # of scipy.spatial.distance.pdist, one column per independent variable (or a single column for isotropic bandwidths).
+    # This lets the distances be reused over many bandwidths, for instance when optimizing a bandwidth.
+    cdef Py_ssize_t n = y_train.shape[0]     # number of basis (training) points
+    cdef Py_ssize_t d = sq_dist.shape[1]     # number of squared distance components
+    cdef Py_ssize_t p = y_train.shape[1]     # number of quantities to evaluate
+    cdef double [:, ::1] sums = np.zeros((n, p + 1))
+    cdef Py_ssize_t i, j, l, q
+    cdef Py_ssize_t k = 0
+    cdef floating u
+    cdef double kj
+    cdef bint weighted = w is not None
+    if not weighted:
+        w = np.ones(1, dtype=np.asarray(y_train).dtype)
+    with nogil:
+        for i in range(n):
+            if not leave_one_out:
+                # kernel of a point with itself
+                sums[i, 0] = sums[i, 0] + (w[i] if weighted else 1.)
+                for q in range(p):
+                    sums[i, 1 + q] = sums[i, 1 + q] + (w[i] * y_train[i, q] if weighted else y_train[i, q])
+            for j in range(i+1, n):
+                u = 0.
+                for l in range(d):
+                    u = u + sq_dist[k, l] * inv_s2[l]
+                k = k + 1
+                kj = _exp(-u)
+                if weighted:
+                    sums[i, 0] = sums[i, 0] + kj * w[j]
+                    sums[j, 0] = sums[j, 0] + kj * w[i]
+                    for q in range(p):
+                        sums[i, 1 + q] = sums[i, 1 + q] + kj * w[j] * y_train[j, q]
+                        sums[j, 1 + q] = sums[j, 1 + q] + kj * w[i] * y_train[i, q]
+                else:
+                    sums[i, 0] = sums[i, 0] + kj
+                    sums[j, 0] = sums[j, 0] + kj
+                    for q in range(p):
+                        sums[i, 1 + q] = sums[i, 1 + q] + kj * y_train[j, q]
+                        sums[j, 1 + q] = sums[j, 1 + q] + kj * y_train[i, q]
+        for i in range(n):
+            for q in range(p):
+                y[i, q] = <floating> (sums[i, 1 + q] / sums[i, 0])
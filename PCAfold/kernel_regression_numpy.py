@@ -0,0 +1,197 @@
+"""kernel_regression_numpy.py: NumPy implementation of the kernel sums of ``KReg``."""
+
+# The functions mirror those of the compiled kernel_regression_cython extension and have the same arguments, so KReg can use
+# either module. The query points are processed in tiles of about _TILE_SIZE kernel weights. Within a tile the squared
+# distances are computed as ||x||^2 + ||x_train||^2 - 2 x.x_train^T with matrix products and the kernels are exponentiated
+# and reduced as whole blocks. The sums are accumulated in double precision and the n_threads arguments are ignored;
+# the matrix products use the threads of the BLAS library NumPy is linked against.
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.spatial.distance import squareform
+
+_TILE_SIZE = 2**20
+
+# pairs whose squared distance is below this fraction of their squared norms about the center of the training points lose
+# too many digits to cancellation in the matrix product formulation and are recomputed from their differences
+_CANCELLATION_THRESHOLD = 1.e-4
+
+def _squared_distance_tiles(x, x_train, inv_s2):
+    """
+    Yield the rows and the scaled squared distances to all training points of tiles of query points.
+    ``inv_s2`` is :math:`1/\\sigma^2` of shape ``(1,1)``, ``(m,1)``, ``(1,d)`` or ``(m,d)``, as in ``kreg_evaluate``.
+    """
+    x = np.asarray(x, dtype=float)
+    x_train = np.asarray(x_train, dtype=float)
+    inv_s2 = np.asarray(inv_s2, dtype=float)
+    center = np.mean(x_train, axis=0)
+    x = x - center
+    x_train = x_train - center
+    shared = inv_s2.shape[0] == 1
+    if shared:
+        scale = np.sqrt(inv_s2[0])
+        scaled_train = x_train * scale
+        train_norms = np.sum(scaled_train**2, axis=1)
+    else:
+        squared_train = x_train**2
+
+    tile_rows = max(1, _TILE_SIZE // max(x_train.shape[0], 1))
+    for start in range(0, x.shape[0], tile_rows):
+        rows = slice(start, min(start + tile_rows, x.shape[0]))
+        x_tile = x[rows]
+        if shared:
+            scaled_tile = x_tile * scale
+            norms = np.sum(scaled_tile**2, axis=1)[:, None] + train_norms[None, :]
+            sq_dist = norms - 2. * scaled_tile.dot(scaled_train.T)
+        else:
+            s = np.broadcast_to(inv_s2[rows], x_tile.shape)
+            norms = np.sum(s * x_tile**2, axis=1)[:, None] + s.dot(squared_train.T)
+            sq_dist = norms - 2. * (s * x_tile).dot(x_train.T)
+        i, j = np.nonzero(sq_dist < _CANCELLATION_THRESHOLD * norms)
+        if i.size > 0:
+            s = inv_s2[0] if shared else inv_s2[rows][i]
+            sq_dist[i, j] = np.sum((x_tile[i] - x_train[j])**2 * s, axis=1)
+        yield rows, sq_dist
+
+def _kernel_tiles(x, x_train, inv_s2, self_indices=None, w=None):
+    """
+    Yield the rows and the kernel weights of tiles of query points. If ``self_indices`` is given, query point ``i`` is training
+    point ``self_indices[i]`` and its own weight is zero. The weights are multiplied by the observation weights ``w`` if given.
+    """
+    if w is not None:
+        w = np.asarray(w, dtype=float)
+    for rows, sq_dist in _squared_distance_tiles(x, x_train, inv_s2):
+        kernel = np.exp(-sq_dist, out=sq_dist)
+        if self_indices is not None:
+            kernel[np.arange(kernel.shape[0]), self_indices[rows]] = 0.
+        if w is not None:
+            kernel *= w[None, :]
+        yield rows, kernel
+
+def kreg_evaluate(x, y, x_train, y_train, inv_s2, n_threads=1, leave_one_out=False, w=None):
+    """
+    Evaluate the predictions ``y`` at the query points ``x``, see ``kernel_regression_cython.kreg_evaluate``
+    """
+    _kreg_evaluate_rows(x, y, x_train, y_train, inv_s2, np.arange(x.shape[0]) if leave_one_out else None, w)
+
+def _kreg_evaluate_rows(x, y, x_train, y_train, inv_s2, self_indices, w):
+    y_train = np.asarray(y_train, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for rows, kernel in _kernel_tiles(x, x_train, inv_s2, self_indices, w):
+            y[rows] = kernel.dot(y_train) / np.sum(kernel, axis=1)[:, None]
+
+def kreg_evaluate_pruned(x, y, x_train, y_train, inv_s2, indptr, indices, n_threads=1, leave_one_out=False, w=None):
+    """
+    Evaluate the predictions ``y`` at the query points ``x`` over the neighbor lists ``indices[indptr[i]:indptr[i+1]]``,
+    see ``kernel_regression_cython.kreg_evaluate_pruned``. Query points without any weight in their neighbor list are evaluated over all training points.
+    """
+    x = np.asarray(x, dtype=float)
+    x_train_array = np.asarray(x_train, dtype=float)
+    y_train = np.asarray(y_train, dtype=float)
+    inv_s2 = np.asarray(inv_s2, dtype=float)
+    indptr = np.asarray(indptr)
+    indices = np.asarray(indices)
+    m = x.shape[0]
+    unresolved = np.zeros(m, dtype=bool)
+    start = 0
+    while start < m:
+        # tiles of about _TILE_SIZE neighbor pairs
+        stop = int(np.searchsorted(indptr, indptr[start] + _TILE_SIZE, side='right')) - 1
+        stop = min(max(stop, start + 1), m)
+        pairs = slice(indptr[start], indptr[stop])
+        rows = np.repeat(np.arange(start, stop), np.diff(indptr[start:stop+1]))
+        columns = indices[pairs]
+        s = inv_s2[rows] if inv_s2.shape[0] > 1 else inv_s2[0]
+        kernel = np.exp(-np.sum((x[rows] - x_train_array[columns])**2 * s, axis=1))
+        if leave_one_out:
+            kernel[rows == columns] = 0.
+        if w is not None:
+            kernel *= np.asarray(w, dtype=float)[columns]
+        kernel_matrix = csr_matrix((kernel, columns, indptr[start:stop+1] - indptr[start]), shape=(stop - start, x_train_array.shape[0]))
+        sum_k = np.asarray(kernel_matrix.sum(axis=1)).ravel()
+        resolved = sum_k > 0.
+        y[start:stop][resolved] = kernel_matrix.dot(y_train)[resolved] / sum_k[resolved, None]
+        unresolved[start:stop] = ~resolved
+        start = stop
+
+    if np.any(unresolved):
+        # no training point within the cutoff radius, fall back on the full sum
+        query_indices = np.flatnonzero(unresolved)
+        exact_points = np.zeros((query_indices.size, y.shape[1]))
+        _kreg_evaluate_rows(x[query_indices], exact_points, x_train, y_train, inv_s2[query_indices] if inv_s2.shape[0] > 1 else inv_s2,
+                            query_indices if leave_one_out else None, w)
+        y[query_indices] = exact_points
+
+def kreg_evaluate_extended(x, y, g, diagnostics, x_train, y_train, inv_s2, indptr=None, indices=None, n_threads=1, leave_one_out=False, w=None):
+    """
+    Evaluate the predictions ``y`` together with, unless None, their Jacobians ``g`` and the kernel diagnostics,
+    see ``kernel_regression_cython.kreg_evaluate_extended``. The neighbor lists are not needed here since the sums over
+    all training points are evaluated in tiles, which only adds the contributions below the kernel truncation tolerance.
+    """
+    x_train = np.asarray(x_train, dtype=float)
+    y_train = np.asarray(y_train, dtype=float)
+    inv_s2 = np.asarray(inv_s2, dtype=float)
+    n, d = x_train.shape
+    p = y_train.shape[1]
+    # the Jacobian and the variance are covariances of the training points under the kernel weights,
+    # so both variables are centered to limit the cancellation in the matrix product formulation
+    centered_train = x_train - np.mean(x_train, axis=0)
+    depvars_center = np.mean(y_train, axis=0)
+    centered_depvars = y_train - depvars_center
+    if g is not None:
+        train_depvars = (centered_train[:, :, None] * centered_depvars[:, None, :]).reshape(n, d * p)
+
+    self_indices = np.arange(x.shape[0]) if leave_one_out else None
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for rows, kernel in _kernel_tiles(x, x_train, inv_s2, self_indices, w):
+            sum_k = np.sum(kernel, axis=1)
+            centered_mean = kernel.dot(centered_depvars) / sum_k[:, None]
+            y[rows] = centered_mean + depvars_center
+            if g is not None:
+                # d y[i, q] / d x[i, l] = 2 inv_s2[l] sum_j k_j x_train[j, l] (y_train[j, q] - y[i, q]) / sum_j k_j
+                s = np.broadcast_to(inv_s2[rows] if inv_s2.shape[0] > 1 else inv_s2, (sum_k.size, d))
+                weighted_train = kernel.dot(centered_train)
+                weighted_train_depvars = kernel.dot(train_depvars).reshape(sum_k.size, d, p).transpose(0, 2, 1)
+                g[rows] = 2. * s[:, None, :] * (weighted_train_depvars - centered_mean[:, :, None] * weighted_train[:, None, :]) / sum_k[:, None, None]
+            if diagnostics is not None:
+                diagnostics[rows, 0] = sum_k
+                diagnostics[rows, 1] = np.sum(kernel**2, axis=1)
+                diagnostics[rows, 2:2+p] = y[rows]
+                diagnostics[rows, 2+p:] = np.maximum(kernel.dot(centered_depvars**2) / sum_k[:, None] - centered_mean**2, 0.)
+
+def kreg_evaluate_symmetric(y, x_train, y_train, inv_s2, leave_one_out=False, w=None):
+    """
+    Evaluate the predictions ``y`` at the training points for a bandwidth shared by all of them,
+    see ``kernel_regression_cython.kreg_evaluate_symmetric``
+    """
+    kreg_evaluate(x_train, y, x_train, y_train, np.asarray(inv_s2)[None, :], 1, leave_one_out, w)
+
+def kreg_evaluate_bandwidths(x, y, x_train, y_train, inv_s2, n_threads=1, w=None):
+    """
+    Evaluate the predictions ``y[b]`` at the query points ``x`` for each bandwidth ``b``, reusing the squared distances,
+    see ``kernel_regression_cython.kreg_evaluate_bandwidths``
+    """
+    y_train = np.asarray(y_train, dtype=float)
+    inv_s2 = np.asarray(inv_s2, dtype=float)
+    if w is not None:
+        w = np.asarray(w, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for rows, sq_dist in _squared_distance_tiles(x, x_train, np.ones((1, 1))):
+            for b in range(inv_s2.size):
+                kernel = np.exp(-inv_s2[b] * sq_dist)
+                if w is not None:
+                    kernel *= w[None, :]
+                y[b, rows] = kernel.dot(y_train) / np.sum(kernel, axis=1)[:, None]
+
+def kreg_evaluate_condensed(y, y_train, sq_dist, inv_s2, leave_one_out=True, w=None):
+    """
+    Evaluate the predictions ``y`` at the training points from the squared distances of all pairs in condensed order,
+    see ``kernel_regression_cython.kreg_evaluate_condensed``
+    """
+    kernel = squareform(np.exp(-np.asarray(sq_dist, dtype=float).dot(np.asarray(inv_s2, dtype=float))), checks=False)
+    if not leave_one_out:
+        np.fill_diagonal(kernel, 1.)
+    if w is not None:
+        kernel *= np.asarray(w, dtype=float)[None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y[:] = kernel.dot(np.asarray(y_train, dtype=float)) / np.sum(kernel, axis=1)[:, None]
@@ -0,0 +1,421 @@
+"""serving.py: module for serving fitted models to concurrent local clients."""
+
+__author__ = "Kamila Zdybal, Elizabeth Armstrong, Alessandro Parente and James C. Sutherland"
+__copyright__ = "Copyright (c) 2020, 2021, Kamila Zdybal, Elizabeth Armstrong, Alessandro Parente and James C. Sutherland"
+__credits__ = ["Department of Chemical Engineering, University of Utah, Salt Lake City, Utah, USA", "Universite Libre de Bruxelles, Aero-Thermo-Mechanics Laboratory, Brussels, Belgium"]
+__license__ = "MIT"
+__version__ = "1.0.0"
+__maintainer__ = ["Kamila Zdybal", "Elizabeth Armstrong"]
+__email__ = ["kamilazdybal@gmail.com", "Elizabeth.Armstrong@chemeng.utah.edu", "James.Sutherland@chemeng.utah.edu"]
+__status__ = "Production"
+
+import asyncio
+import socket
+import struct
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+# Every message is a header followed by little-endian float64 values in row-major order. A request header holds the index of
+# the operation in _OPERATIONS and the number of rows and columns of the points. A response header holds the status and the
+# number of rows and columns of the result, or the status and the length of the UTF-8 error message that follows it.
+_OPERATIONS = ('transform', 'predict', 'transform_predict')
+_HEADER = struct.Struct('<BII')
+_STATUS_OK = 0
+_STATUS_ERROR = 1
+
+################################################################################
+#
+# Inference server
+#
+################################################################################
+
+class InferenceServer:
+    """
+    Serves a fitted ``PCA`` and/or ``KReg`` model to concurrent local clients over a Unix socket or a localhost TCP port.
+    The models are loaded once, and the requests that arrive while a batch is being collected or evaluated are coalesced into a single
+    ``PCA.transform`` or ``KReg.predict`` call, so that many clients sending a few query points each do not pay the per-call overhead
+    of these functions one by one. The server runs on an ``asyncio`` event loop, and the batches are evaluated in a worker thread so
+    that the loop keeps receiving requests in the meantime. Requests are answered with ``InferenceClient``.
+
+    The server supports three operations:
+
+    - ``'transform'``: the principal components ``pca.transform(X)``.
+    - ``'predict'``: the kernel regression ``kreg.predict(X, bandwidth)``.
+    - ``'transform_predict'``: the kernel regression on the principal components, ``kreg.predict(pca.transform(X), bandwidth)``.
+
+    **Example:**
+
+    .. code:: python
+
+        from PCAfold import PCA, KReg, InferenceServer
+        import numpy as np
+
+        # Generate dummy data set:
+        X = np.random.rand(1000,10)
+
+        # Fit the models:
+        pca_X = PCA(X, scaling='auto', n_components=2)
+        principal_components = pca_X.transform(X)
+        model = KReg(principal_components, X)
+
+        # Serve the models until the process is interrupted:
+        server = InferenceServer(pca=pca_X, kreg=model, bandwidth=0.1, max_batch_size=4096, max_wait=1.e-3)
+        server.serve_forever(path='/tmp/pcafold.sock')
+
+    :param pca: (optional)
+        ``PCA`` class object used by the ``'transform'`` and ``'transform_predict'`` operations.
+    :param kreg: (optional)
+        ``KReg`` class object used by the ``'predict'`` and ``'transform_predict'`` operations.
+    :param bandwidth: (optional)
+        bandwidth of ``kreg``, required if ``kreg`` is given. Any format supported by ``KReg.predict`` except one bandwidth per query point,
+        since the query points of different clients are evaluated together.
+    :param n_neighbors: (optional)
+        ``int`` number of nearest neighbors of the nearest neighbors bandwidths, see ``KReg.predict``.
+    :param max_batch_size: (optional)
+        ``int`` specifying the largest number of query points evaluated in one call. A batch is evaluated as soon as it reaches this size.
+        A single request with more query points is evaluated on its own.
+    :param max_wait: (optional)
+        ``float`` specifying the longest time in seconds that the first request of a batch waits for more requests to arrive.
+        Longer waits give larger batches and higher throughput at the cost of latency.
+    :param n_threads: (optional)
+        ``int`` number of threads of ``KReg.predict``.
+    :param predict_kwargs:
+        any further keyword arguments of ``KReg.predict``, such as ``kernel_tolerance`` or ``method``.
+    """
+
+    def __init__(self, pca=None, kreg=None, bandwidth=None, n_neighbors=None, max_batch_size=4096, max_wait=1.e-3, n_threads=1, **predict_kwargs):
+
+        if pca is None and kreg is None:
+            raise ValueError("At least one of the parameters `pca` and `kreg` has to be specified.")
+
+        if kreg is not None and bandwidth is None:
+            raise ValueError("Parameter `bandwidth` has to be specified together with `kreg`.")
+
+        if isinstance(bandwidth, np.ndarray) and bandwidth.ndim == 2 and bandwidth.shape[0] != 1:
+            raise ValueError("Parameter `bandwidth` cannot have one value per query point.")
+
+        if not isinstance(max_batch_size, int) or max_batch_size < 1:
+            raise ValueError("Parameter `max_batch_size` has to be a positive integer.")
+
+        if max_wait < 0:
+            raise ValueError("Parameter `max_wait` has to be non-negative.")
+
+        self.__pca = pca
+        self.__kreg = kreg
+        self.__bandwidth = bandwidth
+        self.__n_neighbors = n_neighbors
+        self.__max_batch_size = max_batch_size
+        self.__max_wait = max_wait
+        self.__n_threads = n_threads
+        self.__predict_kwargs = predict_kwargs
+        self.__server = None
+        self.__address = None
+        self.__batchers = []
+        # the models are not safe to call from several threads at once, so all batches are evaluated in one worker thread
+        self.__executor = None
+
+    @property
+    def max_batch_size(self):
+        return self.__max_batch_size
+
+    @property
+    def max_wait(self):
+        return self.__max_wait
+
+    @property
+    def address(self):
+        return self.__address
+
+    def _evaluate(self, operation, points):
+        """
+        Evaluate ``operation`` on a batch of query points in the worker thread.
+        """
+
+        if operation in ('transform', 'transform_predict'):
+            points = self.__pca.transform(points)
+        if operation in ('predict', 'transform_predict'):
+            points = self.__kreg.predict(points, self.__bandwidth, n_neighbors=self.__n_neighbors, n_threads=self.__n_threads, **self.__predict_kwargs)
+        return points
+
+    def _check_request(self, operation, points):
+        """
+        Check a request before it joins a batch, so that a malformed request does not fail the requests of other clients.
+        """
+
+        if operation in ('transform', 'transform_predict'):
+            if self.__pca is None:
+                raise ValueError("The server has no PCA model.")
+            n_variables = self.__pca.n_variables
+        if operation in ('predict', 'transform_predict'):
+            if self.__kreg is None:
+                raise ValueError("The server has no KReg model.")
+        if operation == 'predict':
+            n_variables = self.__kreg.indepvars.shape[1]
+        if points.shape[1] != n_variables:
+            raise ValueError("Number of variables in the query points is inconsistent with the model.")
+
+    async def _submit(self, operation, points):
+        """
+        Add the query points of one request to the pending batch of ``operation`` and wait for their result.
+        """
+
+        self._check_request(operation, points)
+        pending, rows, arrived, full = self.__batchers[_OPERATIONS.index(operation)][1:]
+        future = asyncio.get_running_loop().create_future()
+        pending.append((points, future))
+        rows[0] += points.shape[0]
+        arrived.set()
+        if rows[0] >= self.__max_batch_size:
+            full.set()
+        return await future
+
+    async def _batch(self, operation, pending, rows, arrived, full):
+        """
+        Collect the pending requests of ``operation`` into batches and evaluate them, as long as the server runs.
+        """
+
+        loop = asyncio.get_running_loop()
+        while True:
+            await arrived.wait()
+            if rows[0] < self.__max_batch_size:
+                try:
+                    await asyncio.wait_for(full.wait(), self.__max_wait)
+                except asyncio.TimeoutError:
+                    pass
+
+            # the oldest requests up to max_batch_size query points, and at least one request
+            n_requests = 0
+            n_rows = 0
+            while n_requests < len(pending) and (n_requests == 0 or n_rows + pending[n_requests][0].shape[0] <= self.__max_batch_size):
+                n_rows += pending[n_requests][0].shape[0]
+                n_requests += 1
+            batch = pending[:n_requests]
+            del pending[:n_requests]
+            rows[0] -= n_rows
+            if len(pending) == 0:
+                arrived.clear()
+            if rows[0] < self.__max_batch_size:
+                full.clear()
+
+            try:
+                result = await loop.run_in_executor(self.__executor, self._evaluate, operation, np.vstack([points for (points, future) in batch]))
+            except Exception as error:
+                for (points, future) in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            start = 0
+            for (points, future) in batch:
+                if not future.done():
+                    future.set_result(result[start:start + points.shape[0]])
+                start += points.shape[0]
+
+    async def _handle_connection(self, reader, writer):
+        """
+        Answer the requests of one client in turn until it disconnects.
+        """
+
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(_HEADER.size)
+                except asyncio.IncompleteReadError:
+                    break
+                (operation, n_rows, n_columns) = _HEADER.unpack(header)
+                points = np.frombuffer(await reader.readexactly(8 * n_rows * n_columns), dtype='<f8').reshape(n_rows, n_columns)
+                try:
+                    if operation >= len(_OPERATIONS):
+                        raise ValueError("Unsupported operation.")
+                    result = np.ascontiguousarray(await self._submit(_OPERATIONS[operation], points), dtype='<f8')
+                    writer.write(_HEADER.pack(_STATUS_OK, result.shape[0], result.shape[1]) + result.tobytes())
+                except Exception as error:
+                    message = str(error).encode('utf-8')
+                    writer.write(_HEADER.pack(_STATUS_ERROR, len(message), 0) + message)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, path=None, host='127.0.0.1', port=0):
+        """
+        Starts serving on the running event loop and returns once the server accepts connections.
+
+        :param path: (optional)
+            ``str`` specifying the path of a Unix socket to listen on (POSIX systems only). If ``None``, the server listens on ``host`` and ``port`` instead.
+        :param host: (optional)
+            ``str`` specifying the host name or address to listen on.
+        :param port: (optional)
+            ``int`` specifying the TCP port to listen on. If ``0``, a free port is chosen.
+
+        :return:
+            - **address** - the address to pass to ``InferenceClient``, ``path`` or a ``(host, port)`` tuple. It is also available as ``InferenceServer.address`` until the server stops.
+        """
+
+        if self.__server is not None:
+            raise ValueError("The server is already running.")
+
+        self.__executor = ThreadPoolExecutor(max_workers=1)
+        self.__batchers = []
+        for operation in _OPERATIONS:
+            (pending, rows, arrived, full) = ([], [0], asyncio.Event(), asyncio.Event())
+            task = asyncio.ensure_future(self._batch(operation, pending, rows, arrived, full))
+            self.__batchers.append((task, pending, rows, arrived, full))
+
+        if path is not None:
+            self.__server = await asyncio.start_unix_server(self._handle_connection, path=path)
+            self.__address = path
+        else:
+            self.__server = await asyncio.start_server(self._handle_connection, host=host, port=port)
+            self.__address = self.__server.sockets[0].getsockname()[:2]
+        return self.__address
+
+    async def stop(self):
+        """
+        Stops serving. Requests that have not been answered yet fail.
+        """
+
+        if self.__server is None:
+            return
+        self.__server.close()
+        await self.__server.wait_closed()
+        for (task, pending, rows, arrived, full) in self.__batchers:
+            task.cancel()
+            for (points, future) in pending:
+                future.cancel()
+        self.__executor.shutdown(wait=True)
+        self.__server = None
+        self.__address = None
+        self.__batchers = []
+
+    def serve_forever(self, path=None, host='127.0.0.1', port=0):
+        """
+        Serves on a new event loop until the process is interrupted, see ``InferenceServer.start`` for the parameters.
+        Since this call blocks, the address to connect to, for instance the free port chosen for ``port=0``, is available
+        as ``InferenceServer.address`` from another thread once the server accepts connections.
+        """
+
+        async def serve():
+            await self.start(path=path, host=host, port=port)
+            try:
+                await asyncio.Event().wait()
+            finally:
+                await self.stop()
+
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            pass
+
+################################################################################
+#
+# Inference client
+#
+################################################################################
+
+class InferenceClient:
+    """
+    Sends query points to an ``InferenceServer`` and returns its results. The client keeps one connection open and blocks until each
+    result arrives, so it can be called from ordinary, synchronous code, for instance once per cell in a solver. Several processes
+    or threads should each use their own client.
+
+    **Example:**
+
+    .. code:: python
+
+        from PCAfold import InferenceClient
+        import numpy as np
+
+        with InferenceClient('/tmp/pcafold.sock') as client:
+
+            # Principal components and kernel regression of a single observation:
+            principal_components = client.transform(np.random.rand(1,10))
+            predicted = client.transform_predict(np.random.rand(1,10))
+
+    :param address:
+        the address returned by ``InferenceServer.start``, a Unix socket path or a ``(host, port)`` tuple.
+    """
+
+    def __init__(self, address):
+
+        if isinstance(address, str):
+            self.__socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.__socket.connect(address)
+        else:
+            self.__socket = socket.create_connection(tuple(address))
+            self.__socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _receive(self, n_bytes):
+
+        buffer = bytearray(n_bytes)
+        view = memoryview(buffer)
+        received = 0
+        while received < n_bytes:
+            n_received = self.__socket.recv_into(view[received:])
+            if n_received == 0:
+                raise ConnectionError("The server closed the connection.")
+            received += n_received
+        return buffer
+
+    def _request(self, operation, X):
+
+        X = np.ascontiguousarray(X, dtype='<f8')
+        if X.ndim != 2:
+            raise ValueError("Parameter `X` has to be a 2D array: n_observations x n_variables.")
+        self.__socket.sendall(_HEADER.pack(_OPERATIONS.index(operation), X.shape[0], X.shape[1]) + X.tobytes())
+        (status, n_rows, n_columns) = _HEADER.unpack(self._receive(_HEADER.size))
+        if status == _STATUS_ERROR:
+            raise RuntimeError(self._receive(n_rows).decode('utf-8'))
+        return np.frombuffer(self._receive(8 * n_rows * n_columns), dtype='<f8').reshape(n_rows, n_columns)
+
+    def transform(self, X):
+        """
+        Computes the principal components of ``X`` with the ``PCA`` model of the server, see ``PCA.transform``.
+
+        :param X:
+            ``numpy.ndarray`` specifying the data set to transform. It should be of size ``(n_observations,n_variables)``.
+
+        :return:
+            - **principal_components** - ``numpy.ndarray`` of size ``(n_observations,n_components)``.
+        """
+
+        return self._request('transform', X)
+
+    def predict(self, X):
+        """
+        Computes the kernel regression at the query points ``X`` with the ``KReg`` model of the server, see ``KReg.predict``.
+
+        :param X:
+            ``numpy.ndarray`` specifying the query points. It should be of size ``(n_observations,n_independent_variables)``.
+
+        :return:
+            - **depvar_points** - ``numpy.ndarray`` of size ``(n_observations,n_dependent_variables)``.
+        """
+
+        return self._request('predict', X)
+
+    def transform_predict(self, X):
+        """
+        Computes the kernel regression at the principal components of ``X`` with the ``PCA`` and ``KReg`` models of the server.
+
+        :param X:
+            ``numpy.ndarray`` specifying the data set to transform. It should be of size ``(n_observations,n_variables)``.
+
+        :return:
+            - **depvar_points** - ``numpy.ndarray`` of size ``(n_observations,n_dependent_variables)``.
+        """
+
+        return self._request('transform_predict', X)
+
+    def close(self):
+        """
+        Closes the connection to the server.
+        """
+
+        self.__socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,173 @@
+"""Timing comparisons of the ``KReg`` evaluation paths.
+
+Run from the repository root after building the extension::
+
+    python benchmarks/kreg_benchmarks.py
+"""
+
+import time
+import numpy as np
+from PCAfold import KReg
+
+def _time(function, *args, **kwargs):
+
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+def benchmark_float32(n_points=20000, dimensions=(2,3), bandwidths=(0.02,0.1,1.)):
+    """
+    Compares ``KReg(..., internal_dtype=np.float32)`` with the default double precision on identical inputs,
+    for ``KReg.predict`` and the symmetric ``KReg.predict_on_training``.
+    """
+
+    rng = np.random.default_rng(0)
+    print('%4s %8s %14s %14s %16s %16s %12s' % ('d', 'sigma', 'float64 [s]', 'float32 [s]', 'float64 sym [s]', 'float32 sym [s]', 'max error'))
+
+    for n_dims in dimensions:
+        indepvars = rng.random((n_points,n_dims))
+        depvars = np.column_stack((np.cos(4.*indepvars.sum(axis=1)), indepvars[:,0]**2))
+        double_model = KReg(indepvars, depvars)
+        single_model = KReg(indepvars, depvars, internal_dtype=np.float32)
+        for bandwidth in bandwidths:
+            double_time, expected = _time(double_model.predict, indepvars, bandwidth)
+            single_time, result = _time(single_model.predict, indepvars.astype(np.float32), bandwidth)
+            double_symmetric_time, _ = _time(double_model.predict_on_training, bandwidth)
+            single_symmetric_time, _ = _time(single_model.predict_on_training, bandwidth)
+            print('%4d %8.3g %14.3f %14.3f %16.3f %16.3f %12.2e' % (n_dims, bandwidth, double_time, single_time, double_symmetric_time, single_symmetric_time, np.max(np.abs(expected - result))))
+
+def benchmark_symmetric(n_points=6000, dimensions=(1,2,5,10), bandwidths=(0.02,0.3)):
+    """
+    Compares ``KReg.predict_on_training``, which evaluates each pair of training points once, with ``KReg.predict`` on the training points.
+    """
+
+    rng = np.random.default_rng(0)
+    print('%4s %8s %14s %14s %12s' % ('d', 'sigma', 'predict [s]', 'symmetric [s]', 'max error'))
+
+    for n_dims in dimensions:
+        indepvars = rng.random((n_points,n_dims))
+        depvars = np.column_stack((np.cos(4.*indepvars.sum(axis=1)), indepvars[:,0]**2))
+        model = KReg(indepvars, depvars)
+        for bandwidth in bandwidths:
+            predict_time, expected = _time(model.predict, indepvars, bandwidth)
+            symmetric_time, result = _time(model.predict_on_training, bandwidth)
+            print('%4d %8.3g %14.3f %14.3f %12.2e' % (n_dims, bandwidth, predict_time, symmetric_time, np.max(np.abs(expected - result))))
+
+def benchmark_bandwidths(n_points=6000, dimensions=(1,2,5), bandwidth_values=np.logspace(-3, 1, 25)):
+    """
+    Compares ``KReg.predict_bandwidths`` with calling ``KReg.predict`` once per bandwidth on the training points.
+    """
+
+    rng = np.random.default_rng(0)
+    print('%4s %14s %14s %12s' % ('d', 'predict [s]', 'batched [s]', 'max error'))
+
+    for n_dims in dimensions:
+        indepvars = rng.random((n_points,n_dims))
+        depvars = np.column_stack((np.cos(4.*indepvars.sum(axis=1)), indepvars[:,0]**2))
+        model = KReg(indepvars, depvars)
+        loop_time, expected = _time(lambda: np.array([model.predict(indepvars, float(bandwidth)) for bandwidth in bandwidth_values]))
+        batched_time, result = _time(model.predict_bandwidths, indepvars, bandwidth_values)
+        print('%4d %14.3f %14.3f %12.2e' % (n_dims, loop_time, batched_time, np.nanmax(np.abs(expected - result))))
+
+def benchmark_fgt(n_points=20000, dimensions=(1,2,3), bandwidths=(0.02,0.1,0.5), tolerances=(1.e-6,1.e-3)):
+    """
+    Compares ``KReg.predict(method='fgt')`` with the exact evaluation on the training points.
+    """
+
+    rng = np.random.default_rng(0)
+    print('%4s %8s %8s %10s %10s %12s' % ('d', 'sigma', 'tol', 'exact [s]', 'fgt [s]', 'max error'))
+
+    for n_dims in dimensions:
+        indepvars = rng.random((n_points,n_dims))
+        depvars = np.column_stack((np.cos(4.*indepvars.sum(axis=1)), indepvars[:,0]**2))
+        model = KReg(indepvars, depvars)
+        for bandwidth in bandwidths:
+            exact_time, exact = _time(model.predict, indepvars, bandwidth)
+            for tol in tolerances:
+                fgt_time, approximate = _time(model.predict, indepvars, bandwidth, method='fgt', tol=tol)
+                print('%4d %8.3g %8.0e %10.3f %10.3f %12.2e' % (n_dims, bandwidth, tol, exact_time, fgt_time, np.max(np.abs(exact - approximate))))
+
+def benchmark_nystrom(n_points=20000, dimensions=(1,2,5), bandwidths=(0.05,0.3,1.,5.), tol=1.e-6):
+    """
+    Compares ``KReg.predict(method='nystrom')`` and ``KReg.predict(method='auto')`` with the exact evaluation on the training points.
+    The second Nystrom timing reuses the cached factorization.
+    """
+
+    rng = np.random.default_rng(0)
+    print('%4s %8s %10s %14s %14s %10s %12s' % ('d', 'sigma', 'exact [s]', 'nystrom [s]', 'cached [s]', 'auto [s]', 'max error'))
+
+    for n_dims in dimensions:
+        indepvars = rng.random((n_points,n_dims))
+        depvars = np.column_stack((np.cos(4.*indepvars.sum(axis=1)), indepvars[:,0]**2))
+        for bandwidth in bandwidths:
+            model = KReg(indepvars, depvars)
+            exact_time, exact = _time(model.predict, indepvars, bandwidth)
+            nystrom_time, approximate = _time(model.predict, indepvars, bandwidth, method='nystrom', tol=tol)
+            cached_time, _ = _time(model.predict, indepvars, bandwidth, method='nystrom', tol=tol)
+            auto_time, _ = _time(KReg(indepvars, depvars).predict, indepvars, bandwidth, method='auto', tol=tol)
+            print('%4d %8.3g %10.3f %14.3f %14.3f %10.3f %12.2e' % (n_dims, bandwidth, exact_time, nystrom_time, cached_time, auto_time, np.max(np.abs(exact - approximate))))
+
+def benchmark_binned(n_points=20000, dimensions=(1,2,3), bandwidth_values=np.logspace(-2, 0, 10)):
+    """
+    Compares ``KReg.predict_bandwidths(method='binned')`` with the exact multi-bandwidth evaluation on the training points.
+    """
+
+    rng = np.random.default_rng(0)
+    print('%4s %10s %12s %12s' % ('d', 'exact [s]', 'binned [s]', 'max error'))
+
+    for n_dims in dimensions:
+        indepvars = rng.random((n_points,n_dims))
+        depvars = np.column_stack((np.cos(4.*indepvars.sum(axis=1)), indepvars[:,0]**2))
+        model = KReg(indepvars, depvars)
+        exact_time, exact = _time(model.predict_bandwidths, indepvars, bandwidth_values)
+        binned_time, approximate = _time(model.predict_bandwidths, indepvars, bandwidth_values, method='binned')
+        print('%4d %10.3f %12.3f %12.2e' % (n_dims, exact_time, binned_time, np.max(np.abs(exact - approximate))))
+
+def benchmark_numpy_backend(n_points=(2000,10000,40000), n_dims=3, bandwidth=0.1):
+    """
+    Compares the NumPy fallback ``KReg(..., backend='numpy')`` with the compiled kernels on the training points.
+    """
+
+    rng = np.random.default_rng(0)
+    print('%8s %12s %10s %12s' % ('n', 'cython [s]', 'numpy [s]', 'max error'))
+
+    for n in n_points:
+        indepvars = rng.random((n,n_dims))
+        depvars = np.column_stack((np.cos(4.*indepvars.sum(axis=1)), indepvars[:,0]**2))
+        cython_time, expected = _time(KReg(indepvars, depvars, backend='cython').predict, indepvars, bandwidth)
+        numpy_time, result = _time(KReg(indepvars, depvars, backend='numpy').predict, indepvars, bandwidth)
+        print('%8d %12.3f %10.3f %12.2e' % (n, cython_time, numpy_time, np.max(np.abs(expected - result))))
+
+def benchmark_dimensions(n_points=10000, dimensions=(2,4,8,12,16,24,32,48,64), bandwidth=1.):
+    """
+    Compares the per-pair loops of the compiled ``kreg_evaluate`` and ``kreg_evaluate_symmetric`` with the tiled matrix product
+    evaluation of the NumPy kernels as the number of independent variables grows, which sets ``_MATRIX_PRODUCT_MIN_DIMENSIONS``
+    and ``_SYMMETRIC_MATRIX_PRODUCT_MIN_DIMENSIONS``.
+    """
+
+    from PCAfold import kernel_regression_cython, kernel_regression_numpy
+
+    rng = np.random.default_rng(0)
+    inv_s2 = np.ones((1,1)) / bandwidth**2
+    print('%4s %12s %14s %12s %12s' % ('d', 'loops [s]', 'symmetric [s]', 'tiled [s]', 'max error'))
+
+    for n_dims in dimensions:
+        indepvars = rng.random((n_points,n_dims))
+        depvars = np.column_stack((np.cos(indepvars.sum(axis=1)), indepvars[:,0]**2))
+        expected = np.zeros(depvars.shape)
+        result = np.zeros(depvars.shape)
+        loops_time = _time(kernel_regression_cython.kreg_evaluate, indepvars, expected, indepvars, depvars, inv_s2)[0]
+        symmetric_time = _time(kernel_regression_cython.kreg_evaluate_symmetric, result, indepvars, depvars, inv_s2[0].repeat(n_dims))[0]
+        tiled_time = _time(kernel_regression_numpy.kreg_evaluate, indepvars, result, indepvars, depvars, inv_s2)[0]
+        print('%4d %12.3f %14.3f %12.3f %12.2e' % (n_dims, loops_time, symmetric_time, tiled_time, np.max(np.abs(expected - result))))
+
+if __name__ == '__main__':
+
+    benchmark_float32()
+    benchmark_symmetric()
+    benchmark_bandwidths()
+    benchmark_fgt()
+    benchmark_nystrom()
+    benchmark_binned()
+    benchmark_numpy_backend()
+    benchmark_dimensions()
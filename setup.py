@@ -1,20 +1,33 @@
 from distutils.core import setup
 from distutils.extension import Extension
-from Cython.Build import cythonize
+try:
+    from Cython.Build import cythonize
+except ImportError:
+    cythonize = None
 from numpy import get_include as numpy_include
 import os
 import platform
 
 cython_extra_compile_args = ['-O3', '-g', '-I' + numpy_include(), '-ffast-math']
+cython_extra_link_args = []
 
 is_mac = platform.system() == 'Darwin'
 if is_mac:
     cython_extra_compile_args += ['-stdlib=libc++']
+else:
+    # OpenMP threads for KReg.predict(..., n_threads); without it the evaluation simply runs serially
+    cython_extra_compile_args += ['-fopenmp']
+    cython_extra_link_args += ['-fopenmp']
 
-kreg_cython = cythonize(Extension(name='PCAfold.kernel_regression',
-                                  sources=[os.path.join('PCAfold', 'kernel_regression_cython.pyx')],
-                                  extra_compile_args=cython_extra_compile_args,
-                                  language='c++'))
+# the compiled kernels are optional: if they cannot be built, KReg falls back on PCAfold/kernel_regression_numpy.py
+kreg_cython = []
+if cythonize is not None:
+    kreg_cython = cythonize(Extension(name='PCAfold.kernel_regression_cython',
+                                      sources=[os.path.join('PCAfold', 'kernel_regression_cython.pyx')],
+                                      extra_compile_args=cython_extra_compile_args,
+                                      extra_link_args=cython_extra_link_args,
+                                      language='c++',
+                                      optional=True))
 
 setup(name='PCAfold',
       version='1.0.0',
@@ -0,0 +1,57 @@
+import unittest
+import numpy as np
+from PCAfold import preprocess
+from PCAfold import reduction
+from PCAfold import analysis
+
+class Analysis(unittest.TestCase):
+
+    def test_analysis__KReg_add_observations__allowed_calls(self):
+
+        indepvars = np.random.RandomState(100).rand(300,2)
+        depvars = np.column_stack((np.cos(3.*indepvars[:,0]), indepvars[:,1]**2))
+        query = np.random.RandomState(101).rand(50,2)
+
+        model = analysis.KReg(indepvars[0:100], depvars[0:100])
+        model.predict(query, 'nearest_neighbors_anisotropic', n_neighbors=3)
+        for start in range(100, 300, 25):
+            model.add_observations(indepvars[start:start+25], depvars[start:start+25])
+            reference = analysis.KReg(indepvars[0:start+25], depvars[0:start+25])
+            self.assertTrue(np.array_equal(model.indepvars, reference.indepvars))
+            self.assertTrue(np.array_equal(model.depvars, reference.depvars))
+            for bandwidth, n_neighbors in [(0.1, None), ('nearest_neighbors_isotropic', 5), ('nearest_neighbors_anisotropic', 5)]:
+                self.assertTrue(np.array_equal(model.predict(query, bandwidth, n_neighbors=n_neighbors), reference.predict(query, bandwidth, n_neighbors=n_neighbors)))
+            self.assertTrue(np.array_equal(model.predict(query, 0.1, kernel_tolerance=1.e-8), reference.predict(query, 0.1, kernel_tolerance=1.e-8)))
+
+        # the spatial index keeps a logarithmic number of blocks
+        self.assertTrue(len(model._tree._blocks) <= 4)
+
+        # the cached Nystrom factorization is updated with the new observations
+        model = analysis.KReg(indepvars[0:200], depvars[0:200])
+        model.predict(query, 0.5, method='nystrom', tol=1.e-8)
+        model.add_observations(indepvars[200:], depvars[200:])
+        exact = analysis.KReg(indepvars, depvars).predict(query, 0.5)
+        self.assertTrue(np.allclose(model.predict(query, 0.5, method='nystrom', tol=1.e-8), exact, rtol=0., atol=1.e-5))
+
+        # single precision models cast the new observations only
+        model = analysis.KReg(indepvars[0:100], depvars[0:100], internal_dtype=np.float32, supress_warning=True)
+        model.add_observations(indepvars[100:], depvars[100:])
+        self.assertTrue(model.indepvars.dtype == np.float32)
+        self.assertTrue(np.array_equal(model.indepvars, indepvars.astype(np.float32)))
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_add_observations__not_allowed_calls(self):
+
+        model = analysis.KReg(np.random.rand(10,2), np.random.rand(10,1))
+
+        with self.assertRaises(AssertionError):
+            model.add_observations(np.random.rand(5,3), np.random.rand(5,1))
+
+        with self.assertRaises(AssertionError):
+            model.add_observations(np.random.rand(5,2), np.random.rand(4,1))
+
+        with self.assertRaises(AssertionError):
+            model.add_observations(np.random.rand(5,2), np.random.rand(5,2))
+
+# ------------------------------------------------------------------------------
@@ -16,4 +16,28 @@ class Analysis(unittest.TestCase):
 
         pass
 
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_compute_nearest_neighbors_bandwidth_anisotropic__cached_trees(self):
+
+        import pickle
+
+        indepvars = np.random.RandomState(100).rand(200,3)
+        query = np.random.RandomState(101).rand(50,3)
+        model = analysis.KReg(indepvars, indepvars[:,0:1])
+
+        bandwidth = model.compute_nearest_neighbors_bandwidth_anisotropic(query, 2)
+        trees = list(model._dimension_trees)
+        self.assertTrue(all(tree is not None for tree in trees))
+        self.assertTrue(np.array_equal(model.compute_nearest_neighbors_bandwidth_anisotropic(query, 2, n_threads=None), bandwidth))
+        self.assertTrue(all(tree is cached for tree, cached in zip(trees, model._dimension_trees)))
+
+        distances = np.sort(np.abs(query[:,None,:] - indepvars[None,:,:]), axis=1)
+        self.assertTrue(np.allclose(bandwidth, distances[:,1,:], rtol=1.e-12, atol=0.))
+
+        # the cached indexes are not pickled and are rebuilt on demand
+        copied_model = pickle.loads(pickle.dumps(model))
+        self.assertTrue(all(tree is None for tree in copied_model._dimension_trees))
+        self.assertTrue(np.array_equal(copied_model.predict(query, 'nearest_neighbors_anisotropic', n_neighbors=10), model.predict(query, 'nearest_neighbors_anisotropic', n_neighbors=10)))
+
 # ------------------------------------------------------------------------------
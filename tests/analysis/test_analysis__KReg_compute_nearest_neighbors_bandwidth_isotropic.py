@@ -16,4 +16,21 @@ class Analysis(unittest.TestCase):
 
         pass
 
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_compute_nearest_neighbors_bandwidth_isotropic__cached_tree(self):
+
+        indepvars = np.random.RandomState(100).rand(200,3)
+        query = np.random.RandomState(101).rand(50,3)
+        model = analysis.KReg(indepvars, indepvars[:,0:1])
+
+        bandwidth = model.compute_nearest_neighbors_bandwidth_isotropic(query, 4)
+        tree = model._tree
+        self.assertTrue(tree is not None)
+        self.assertTrue(np.array_equal(model.compute_nearest_neighbors_bandwidth_isotropic(query, 4, n_threads=2), bandwidth))
+        self.assertTrue(model._tree is tree)
+
+        distances = np.sort(np.sqrt(np.sum((query[:,None,:] - indepvars[None,:,:])**2, axis=2)), axis=1)
+        self.assertTrue(np.allclose(bandwidth, np.repeat(distances[:,3:4], 3, axis=1), rtol=1.e-12, atol=0.))
+
 # ------------------------------------------------------------------------------
@@ -0,0 +1,77 @@
+import unittest
+import numpy as np
+from PCAfold import preprocess
+from PCAfold import reduction
+from PCAfold import analysis
+
+class Analysis(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(Analysis, self).__init__(*args, **kwargs)
+        self._indepvars = np.random.RandomState(100).rand(200,2)
+        self._depvars = np.cos(6.*self._indepvars[:,0:1]) + 0.1*self._indepvars[:,1:2]
+        self._model = analysis.KReg(self._indepvars, self._depvars)
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_optimize_bandwidth__allowed_calls(self):
+
+        try:
+            self._model.optimize_bandwidth()
+            self._model.optimize_bandwidth(anisotropic=True)
+            self._model.optimize_bandwidth(bandwidth_bounds=(0.01, 1.))
+        except Exception:
+            self.assertTrue(False)
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_optimize_bandwidth__not_allowed_calls(self):
+
+        with self.assertRaises(AssertionError):
+            self._model.optimize_bandwidth(bandwidth_bounds=(1., 0.01))
+
+        with self.assertRaises(AssertionError):
+            self._model.optimize_bandwidth(bandwidth_bounds=(0., 1.))
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_optimize_bandwidth__isotropic(self):
+
+        (bandwidth, loo_error) = self._model.optimize_bandwidth(bandwidth_bounds=(0.01, 1.))
+        self.assertTrue(0.01 <= bandwidth <= 1.)
+
+        loo_predictions = self._model.predict_on_training(bandwidth, leave_one_out=True)
+        expected_error = np.mean((loo_predictions - self._depvars)**2) / np.var(self._depvars)
+        self.assertTrue(np.abs(loo_error - expected_error) < 1.e-10)
+
+        # the optimum is better than neighboring bandwidths
+        for factor in [0.5, 2.]:
+            loo_predictions = self._model.predict_on_training(bandwidth*factor, leave_one_out=True)
+            self.assertTrue(np.mean((loo_predictions - self._depvars)**2) / np.var(self._depvars) > loo_error)
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_optimize_bandwidth__anisotropic(self):
+
+        (bandwidth_isotropic, loo_error_isotropic) = self._model.optimize_bandwidth()
+        (bandwidth, loo_error) = self._model.optimize_bandwidth(anisotropic=True)
+        self.assertTrue(bandwidth.shape == (2,))
+        self.assertTrue(loo_error <= loo_error_isotropic)
+        # the dependent variable varies much more slowly with the second independent variable
+        self.assertTrue(bandwidth[1] > bandwidth[0])
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_optimize_bandwidth__weights(self):
+
+        weights = np.random.RandomState(101).rand(200) + 0.1
+        model = analysis.KReg(self._indepvars, self._depvars, weights=weights)
+        (bandwidth, loo_error) = model.optimize_bandwidth(bandwidth_bounds=(0.01, 1.))
+
+        # the squared residuals and the variance are averaged with the observation weights
+        loo_predictions = model.predict_on_training(bandwidth, leave_one_out=True)
+        mean = np.average(self._depvars[:,0], weights=weights)
+        expected_error = np.average((loo_predictions - self._depvars)[:,0]**2, weights=weights) / np.average((self._depvars[:,0] - mean)**2, weights=weights)
+        self.assertTrue(np.abs(loo_error - expected_error) < 1.e-10)
+
+# ------------------------------------------------------------------------------
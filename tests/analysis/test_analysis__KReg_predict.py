@@ -3,6 +3,7 @@ import numpy as np
 from PCAfold import preprocess
 from PCAfold import reduction
 from PCAfold import analysis
+from PCAfold import kernel_regression
 
 class Analysis(unittest.TestCase):
 
@@ -16,4 +17,398 @@ class Analysis(unittest.TestCase):
 
         pass
 
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_predict__n_threads_bit_identical(self):
+
+        indepvars = np.random.RandomState(100).rand(200,2)
+        depvars = np.random.RandomState(101).rand(200,3)
+        model = analysis.KReg(indepvars, depvars)
+
+        serial = model.predict(indepvars, 0.1)
+
+        for n_threads in [2, 3, None]:
+            parallel = model.predict(indepvars, 0.1, n_threads=n_threads)
+            self.assertTrue(np.array_equal(serial, parallel))
+
+        serial = model.predict(indepvars, 'nearest_neighbors_isotropic', n_neighbors=5)
+        parallel = model.predict(indepvars, 'nearest_neighbors_isotropic', n_neighbors=5, n_threads=4)
+        self.assertTrue(np.array_equal(serial, parallel))
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_predict__n_threads_not_allowed(self):
+
+        model = analysis.KReg(np.random.rand(10,2), np.random.rand(10,1))
+
+        with self.assertRaises(AssertionError):
+            model.predict(np.random.rand(5,2), 0.1, n_threads=0)
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_predict__kernel_tolerance(self):
+
+        indepvars = np.random.RandomState(100).rand(300,2)
+        depvars = np.random.RandomState(101).rand(300,2)
+        query = np.random.RandomState(102).rand(50,2)
+        model = analysis.KReg(indepvars, depvars)
+
+        for bandwidth in [0.01, 0.05, np.array([0.02, 0.08])]:
+            if isinstance(bandwidth, np.ndarray):
+                bandwidth = model.compute_bandwidth_anisotropic(query, bandwidth)
+            exact = model.predict(query, bandwidth)
+            pruned = model.predict(query, bandwidth, kernel_tolerance=1.e-12)
+            self.assertTrue(np.allclose(exact, pruned, rtol=0., atol=1.e-8))
+
+        exact = model.predict(query, 'nearest_neighbors_isotropic', n_neighbors=3)
+        pruned = model.predict(query, 'nearest_neighbors_isotropic', n_neighbors=3, kernel_tolerance=1.e-12, n_threads=2)
+        self.assertTrue(np.allclose(exact, pruned, rtol=0., atol=1.e-8))
+
+        # the cutoff radius is relative to the nearest training point, so far away query points are still resolved
+        far_query = np.array([[0.5, 1.3]])
+        self.assertTrue(np.allclose(model.predict(far_query, 0.05), model.predict(far_query, 0.05, kernel_tolerance=1.e-12), rtol=1.e-8, atol=0.))
+
+        with self.assertRaises(AssertionError):
+            model.predict(query, 0.1, kernel_tolerance=0.)
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_predict__broadcast_bandwidth_arrays(self):
+
+        indepvars = np.random.RandomState(100).rand(100,3)
+        depvars = np.random.RandomState(101).rand(100,2)
+        query = np.random.RandomState(102).rand(20,3)
+        model = analysis.KReg(indepvars, depvars)
+
+        anisotropic = np.array([[0.1, 0.2, 0.3]])
+        predicted = model.predict(query, model.compute_bandwidth_anisotropic(query, anisotropic.ravel()))
+        self.assertTrue(np.allclose(model.predict(query, anisotropic), predicted, rtol=1.e-12, atol=0.))
+
+        isotropic = np.linspace(0.1, 0.5, 20)
+        predicted = model.predict(query, model.compute_bandwidth_isotropic(query, isotropic))
+        self.assertTrue(np.allclose(model.predict(query, isotropic[:,None]), predicted, rtol=1.e-12, atol=0.))
+
+        with self.assertRaises(AssertionError):
+            model.predict(query, np.ones((2,3)))
+
+        with self.assertRaises(ValueError):
+            model.predict(query, np.ones((3,)))
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_predict__single_precision(self):
+
+        indepvars = np.random.RandomState(100).rand(100,2)
+        depvars = np.random.RandomState(101).rand(100,2)
+        query = np.random.RandomState(102).rand(20,2)
+        model64 = analysis.KReg(indepvars, depvars)
+        model32 = analysis.KReg(indepvars, depvars, internal_dtype=np.float32, supress_warning=True)
+
+        self.assertTrue(model32.indepvars.dtype == np.float32)
+
+        for bandwidth in [0.1, np.array([[0.1, 0.2]]), 'nearest_neighbors_isotropic']:
+            predicted32 = model32.predict(query, bandwidth, n_neighbors=5)
+            predicted64 = model64.predict(query, bandwidth, n_neighbors=5)
+            self.assertTrue(predicted32.dtype == np.float32)
+            self.assertTrue(np.allclose(predicted32, predicted64, rtol=1.e-4, atol=1.e-5))
+
+        self.assertTrue(model32.predict_on_training(0.1).dtype == np.float32)
+        self.assertTrue(model32.predict_bandwidths(query, [0.1, 0.2]).dtype == np.float32)
+
+        with self.assertRaises(AssertionError):
+            analysis.KReg(indepvars, depvars, internal_dtype=int, supress_warning=True)
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_predict__leave_one_out(self):
+
+        indepvars = np.random.RandomState(100).rand(50,2)
+        depvars = np.random.RandomState(101).rand(50,2)
+        model = analysis.KReg(indepvars, depvars)
+
+        bandwidth = 0.2
+        weights = np.exp(-np.sum((indepvars[:,None,:] - indepvars[None,:,:])**2, axis=2) / bandwidth**2)
+        np.fill_diagonal(weights, 0.)
+        expected = weights.dot(depvars) / np.sum(weights, axis=1, keepdims=True)
+
+        self.assertTrue(np.allclose(model.predict(indepvars, bandwidth, leave_one_out=True), expected, rtol=1.e-12, atol=0.))
+        self.assertTrue(np.allclose(model.predict(indepvars, bandwidth, leave_one_out=True, kernel_tolerance=1.e-14), expected, rtol=1.e-10, atol=0.))
+        self.assertTrue(np.allclose(model.predict_on_training(bandwidth, leave_one_out=True), expected, rtol=1.e-12, atol=0.))
+
+        with self.assertRaises(AssertionError):
+            model.predict(indepvars[0:10,:], bandwidth, leave_one_out=True)
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_predict__fgt(self):
+
+        indepvars = np.random.RandomState(100).rand(500,2)
+        depvars = np.column_stack((np.cos(4.*indepvars[:,0]), indepvars[:,1]**2))
+        query = np.random.RandomState(102).rand(100,2)
+        model = analysis.KReg(indepvars, depvars)
+
+        for bandwidth in [0.05, 0.3, np.array([[0.2, 0.5]])]:
+            exact = model.predict(query, bandwidth)
+            approximate = model.predict(query, bandwidth, method='fgt', tol=1.e-8)
+            self.assertTrue(np.allclose(exact, approximate, rtol=0., atol=1.e-5))
+
+        with self.assertRaises(AssertionError):
+            model.predict(query, 'nearest_neighbors_isotropic', n_neighbors=3, method='fgt')
+
+        with self.assertRaises(ValueError):
+            model.predict(query, 0.1, method='fft')
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_predict__ifgt_error_bound(self):
+
+        x_train = np.random.RandomState(100).rand(2000,1) * 5.
+        x = np.random.RandomState(101).rand(2000,1) * 5.
+        q_train = np.column_stack((np.random.RandomState(102).randn(2000), np.ones(2000)))
+        exact = np.exp(-(x - x_train.T)**2).dot(q_train)
+
+        for tol in [1.e-3, 1.e-6, 1.e-9]:
+            transform = kernel_regression.ifgt_evaluate(x, x_train, q_train, tol)
+            self.assertTrue(transform is not None)
+            self.assertTrue(np.all(np.abs(transform - exact) <= tol * np.sum(np.abs(q_train), axis=0)))
+
+        # the error bound cannot be met cheaply in 3 dimensions at a small bandwidth, which the subsample already shows
+        x_train = np.random.RandomState(103).rand(20000,3) * 10.
+        q_train = np.ones((20000,1))
+        self.assertTrue(kernel_regression.ifgt_evaluate(x_train[:1000], x_train, q_train, 1.e-6) is None)
+
+        # nor in 2 dimensions at a bandwidth of a tenth of the range
+        x_train = np.random.RandomState(104).rand(20000,2) * 10.
+        self.assertTrue(kernel_regression.ifgt_evaluate(x_train, x_train, q_train, 1.e-6) is None)
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_predict__nystrom(self):
+
+        indepvars = np.random.RandomState(100).rand(500,2)
+        depvars = np.column_stack((np.cos(4.*indepvars[:,0]), indepvars[:,1]**2))
+        query = np.random.RandomState(102).rand(100,2)
+        model = analysis.KReg(indepvars, depvars)
+
+        for bandwidth in [0.3, 1., np.array([[0.5, 2.]])]:
+            exact = model.predict(query, bandwidth)
+            for method in ['nystrom', 'auto']:
+                approximate = model.predict(query, bandwidth, method=method, tol=1.e-8)
+                self.assertTrue(np.allclose(exact, approximate, rtol=0., atol=1.e-5))
+
+        # too few landmark points resolve the error bound, so the exact sums are used
+        self.assertTrue(np.array_equal(model.predict(query, 0.01, method='nystrom', max_rank=5), model.predict(query, 0.01)))
+        self.assertTrue(np.array_equal(model.predict(query, 0.01, method='auto'), model.predict(query, 0.01)))
+
+        with self.assertRaises(AssertionError):
+            model.predict(query, 'nearest_neighbors_isotropic', n_neighbors=3, method='nystrom')
+
+        with self.assertRaises(AssertionError):
+            model.predict(indepvars, 1., method='nystrom', leave_one_out=True)
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_predict__nystrom_error_bound(self):
+
+        x_train = np.random.RandomState(100).rand(300,2) * 3.
+        tol = 1.e-6
+        pivots, factor, residual = kernel_regression.nystrom_factor(x_train, tol, 300)
+        kernel = np.exp(-np.sum((x_train[:,None,:] - x_train[None,:,:])**2, axis=2))
+
+        self.assertTrue(residual <= tol)
+        self.assertTrue(pivots.size < 300)
+        self.assertTrue(np.max(np.abs(kernel - factor.T.dot(factor))) <= tol)
+        self.assertTrue(kernel_regression.nystrom_factor(x_train, tol, 5) is None)
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_predict__return_gradient(self):
+
+        indepvars = np.random.RandomState(100).rand(200,2)
+        depvars = np.column_stack((np.sin(3.*indepvars[:,0]), indepvars[:,1]**2, indepvars[:,0]*indepvars[:,1]))
+        query = np.random.RandomState(101).rand(20,2)
+        model = analysis.KReg(indepvars, depvars)
+
+        for bandwidth in [0.1, np.array([[0.1, 0.2]]), np.random.RandomState(102).rand(20,1) * 0.1 + 0.05]:
+            predicted, gradient = model.predict(query, bandwidth, return_gradient=True)
+            self.assertTrue(gradient.shape == (20,3,2))
+            self.assertTrue(np.allclose(predicted, model.predict(query, bandwidth), rtol=1.e-12, atol=0.))
+
+            step = 1.e-6
+            for l in range(2):
+                shift = np.zeros((1,2))
+                shift[0,l] = step
+                finite_difference = (model.predict(query + shift, bandwidth) - model.predict(query - shift, bandwidth)) / (2. * step)
+                self.assertTrue(np.allclose(gradient[:,:,l], finite_difference, rtol=1.e-5, atol=1.e-6))
+
+        # pruned, chunked and leave-one-out evaluations
+        predicted, gradient = model.predict(query, 0.05, return_gradient=True)
+        pruned_predicted, pruned_gradient = model.predict(query, 0.05, kernel_tolerance=1.e-12, return_gradient=True)
+        self.assertTrue(np.allclose(pruned_gradient, gradient, rtol=1.e-6, atol=1.e-8))
+        chunked_predicted, chunked_gradient = model.predict(query, 0.05, chunk_size=6, return_gradient=True)
+        self.assertTrue(np.array_equal(chunked_gradient, gradient))
+        loo_predicted, loo_gradient = model.predict(indepvars, 0.1, leave_one_out=True, return_gradient=True)
+        self.assertTrue(np.allclose(loo_predicted, model.predict(indepvars, 0.1, leave_one_out=True), rtol=1.e-12, atol=0.))
+
+        with self.assertRaises(AssertionError):
+            model.predict(query, 0.1, method='fgt', return_gradient=True)
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_predict__binned(self):
+
+        indepvars = np.random.RandomState(100).rand(1000,2)
+        depvars = np.column_stack((np.cos(4.*indepvars[:,0]), indepvars[:,1]**2))
+        query = np.random.RandomState(102).rand(100,2)
+        model = analysis.KReg(indepvars, depvars)
+
+        for bandwidth in [0.05, 0.3, np.array([[0.1, 0.3]])]:
+            exact = model.predict(query, bandwidth)
+            self.assertTrue(np.allclose(model.predict(query, bandwidth, method='binned'), exact, rtol=0., atol=5.e-3))
+            self.assertTrue(np.allclose(model.predict(query, bandwidth, method='binned', n_bins=(400,400)), exact, rtol=0., atol=1.e-3))
+
+        # the binning error decreases quadratically with the grid spacing
+        exact = model.predict(query, 0.1)
+        coarse_error = np.max(np.abs(model.predict(query, 0.1, method='binned', n_bins=21) - exact))
+        fine_error = np.max(np.abs(model.predict(query, 0.1, method='binned', n_bins=81) - exact))
+        self.assertTrue(fine_error < coarse_error / 8.)
+
+        with self.assertRaises(AssertionError):
+            model.predict(query, 'nearest_neighbors_isotropic', n_neighbors=3, method='binned')
+
+        with self.assertRaises(AssertionError):
+            model.predict(query, 0.1, method='binned', n_bins=1)
+
+        with self.assertRaises(AssertionError):
+            analysis.KReg(np.random.rand(10,4), np.random.rand(10,1)).predict(np.random.rand(5,4), 0.1, method='binned')
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_predict__return_diagnostics(self):
+
+        indepvars = np.random.RandomState(100).rand(200,2)
+        depvars = np.column_stack((np.sin(3.*indepvars[:,0]), indepvars[:,1]**2))
+        query = np.random.RandomState(101).rand(20,2)
+        model = analysis.KReg(indepvars, depvars)
+
+        for bandwidth in [0.1, np.array([[0.1, 0.3]]), np.random.RandomState(102).rand(20,1) * 0.1 + 0.05]:
+            predicted, diagnostics = model.predict(query, bandwidth, return_diagnostics=True)
+            self.assertTrue(np.array_equal(predicted, model.predict(query, bandwidth)))
+
+            inv_s2 = np.broadcast_to(1. / np.asarray(bandwidth, dtype=float).reshape(-1, bandwidth.shape[1] if isinstance(bandwidth, np.ndarray) else 1)**2, (20,2))
+            weights = np.exp(-np.sum((query[:,None,:] - indepvars[None,:,:])**2 * inv_s2[:,None,:], axis=2))
+            kernel_sum = np.sum(weights, axis=1)
+            self.assertTrue(np.allclose(diagnostics['kernel_sum'], kernel_sum, rtol=1.e-12, atol=0.))
+            self.assertTrue(np.allclose(diagnostics['effective_neighbors'], kernel_sum**2 / np.sum(weights**2, axis=1), rtol=1.e-10, atol=0.))
+            variance = np.stack([np.sum(weights * (depvars[:,q][None,:] - predicted[:,q:q+1])**2, axis=1) / kernel_sum for q in range(2)], axis=1)
+            self.assertTrue(np.allclose(diagnostics['variance'], variance, rtol=1.e-8, atol=1.e-14))
+
+        # combined with the gradient, chunked and leave-one-out evaluations
+        predicted, gradient, diagnostics = model.predict(query, 0.1, return_gradient=True, return_diagnostics=True)
+        self.assertTrue(np.array_equal(gradient, model.predict(query, 0.1, return_gradient=True)[1]))
+        chunked_predicted, chunked_diagnostics = model.predict(query, 0.1, chunk_size=7, return_diagnostics=True)
+        for key in diagnostics:
+            self.assertTrue(np.array_equal(chunked_diagnostics[key], diagnostics[key]))
+        loo_predicted, loo_diagnostics = model.predict(indepvars, 0.1, leave_one_out=True, return_diagnostics=True)
+        full_predicted, full_diagnostics = model.predict(indepvars, 0.1, return_diagnostics=True)
+        self.assertTrue(np.allclose(loo_diagnostics['kernel_sum'], full_diagnostics['kernel_sum'] - 1., rtol=1.e-10, atol=0.))
+
+        with self.assertRaises(AssertionError):
+            model.predict(query, 0.1, method='nystrom', return_diagnostics=True)
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_predict__weights(self):
+
+        indepvars = np.random.RandomState(100).rand(150,2)
+        depvars = np.column_stack((np.sin(3.*indepvars[:,0]), indepvars[:,1]**2))
+        query = np.random.RandomState(101).rand(20,2)
+        weights = np.random.RandomState(102).randint(0, 4, size=150)
+        weights[0] = 1
+
+        # integer weights are equivalent to repeating the observations
+        model = analysis.KReg(indepvars, depvars, weights=weights[:,None])
+        repeated_model = analysis.KReg(np.repeat(indepvars, weights, axis=0), np.repeat(depvars, weights, axis=0))
+        self.assertTrue(np.array_equal(model.weights, weights.astype(float)))
+        for bandwidth, n_neighbors in [(0.1, None), (np.array([[0.1, 0.3]]), None), (np.random.RandomState(103).rand(20,1) * 0.1 + 0.05, None)]:
+            self.assertTrue(np.allclose(model.predict(query, bandwidth), repeated_model.predict(query, bandwidth), rtol=1.e-10, atol=1.e-12))
+        expected = repeated_model.predict(query, 0.1)
+        self.assertTrue(np.allclose(model.predict(query, 0.1, kernel_tolerance=1.e-10), expected, rtol=1.e-8, atol=1.e-10))
+        self.assertTrue(np.allclose(model.predict(query, 0.1, method='fgt', tol=1.e-8), expected, rtol=0., atol=1.e-5))
+        self.assertTrue(np.allclose(model.predict(query, 0.1, method='binned', n_bins=200), expected, rtol=0., atol=1.e-3))
+        self.assertTrue(np.allclose(model.predict(query, 0.5, method='nystrom', tol=1.e-8), repeated_model.predict(query, 0.5), rtol=0., atol=1.e-5))
+        self.assertTrue(np.allclose(model.predict_bandwidths(query, [0.1, 0.2]), repeated_model.predict_bandwidths(query, [0.1, 0.2]), rtol=1.e-10, atol=1.e-12))
+        self.assertTrue(np.allclose(model.predict(query, 0.1, return_gradient=True)[1], repeated_model.predict(query, 0.1, return_gradient=True)[1], rtol=1.e-8, atol=1.e-10))
+        self.assertTrue(np.allclose(model.predict_on_training(0.1), repeated_model.predict(indepvars, 0.1), rtol=1.e-10, atol=1.e-12))
+
+        with self.assertRaises(AssertionError):
+            analysis.KReg(indepvars, depvars, weights=weights[:100])
+
+        with self.assertRaises(AssertionError):
+            analysis.KReg(indepvars, depvars, weights=-np.ones(150))
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_predict__numpy_backend(self):
+
+        indepvars = np.random.RandomState(100).rand(300,3)
+        depvars = np.column_stack((np.sin(3.*indepvars[:,0]), indepvars[:,1]*indepvars[:,2]))
+        query = np.random.RandomState(101).rand(40,3)
+        weights = np.random.RandomState(102).rand(300)
+
+        for model_weights in [None, weights]:
+            model = analysis.KReg(indepvars, depvars, weights=model_weights)
+            numpy_model = analysis.KReg(indepvars, depvars, weights=model_weights, backend='numpy')
+            self.assertEqual(numpy_model.backend, 'numpy')
+            for bandwidth in [0.1, np.array([[0.1, 0.2, 0.3]]), np.random.RandomState(103).rand(40,1) * 0.1 + 0.05]:
+                self.assertTrue(np.allclose(numpy_model.predict(query, bandwidth), model.predict(query, bandwidth), rtol=1.e-10, atol=1.e-12))
+            self.assertTrue(np.allclose(numpy_model.predict(query, 0.1, kernel_tolerance=1.e-10), model.predict(query, 0.1, kernel_tolerance=1.e-10), rtol=1.e-8, atol=1.e-10))
+            self.assertTrue(np.allclose(numpy_model.predict(query, 'nearest_neighbors_isotropic', n_neighbors=5), model.predict(query, 'nearest_neighbors_isotropic', n_neighbors=5), rtol=1.e-10, atol=1.e-12))
+            self.assertTrue(np.allclose(numpy_model.predict_on_training(0.1), model.predict_on_training(0.1), rtol=1.e-10, atol=1.e-12))
+            self.assertTrue(np.allclose(numpy_model.predict_bandwidths(query, [0.05, 0.1, 0.5]), model.predict_bandwidths(query, [0.05, 0.1, 0.5]), rtol=1.e-10, atol=1.e-12))
+
+            depvar_points, gradient, diagnostics = numpy_model.predict(query, 0.1, return_gradient=True, return_diagnostics=True)
+            expected_points, expected_gradient, expected_diagnostics = model.predict(query, 0.1, return_gradient=True, return_diagnostics=True)
+            self.assertTrue(np.allclose(depvar_points, expected_points, rtol=1.e-10, atol=1.e-12))
+            self.assertTrue(np.allclose(gradient, expected_gradient, rtol=1.e-8, atol=1.e-10))
+            for key in expected_diagnostics:
+                self.assertTrue(np.allclose(diagnostics[key], expected_diagnostics[key], rtol=1.e-8, atol=1.e-10))
+
+        # a vanishing bandwidth reproduces the training points exactly
+        numpy_model = analysis.KReg(indepvars, depvars, backend='numpy')
+        self.assertTrue(np.array_equal(numpy_model.predict(indepvars, 1.e-16), depvars))
+
+        with self.assertRaises(ValueError):
+            analysis.KReg(indepvars, depvars, backend='fortran')
+
+        # in many dimensions only the automatic choice switches to the matrix products, an explicit backend is kept
+        if kernel_regression.kernel_regression_cython is not None:
+            indepvars = np.random.RandomState(104).rand(300,48)
+            model = analysis.KReg(indepvars, depvars, backend='cython')
+            self.assertTrue(model._dense_kernels is kernel_regression.kernel_regression_cython)
+            self.assertTrue(model._symmetric_kernels is kernel_regression.kernel_regression_cython)
+            model = analysis.KReg(indepvars, depvars)
+            self.assertTrue(model._dense_kernels is kernel_regression.kernel_regression_numpy)
+            self.assertTrue(model._symmetric_kernels is kernel_regression.kernel_regression_numpy)
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_predict__many_dimensions(self):
+
+        indepvars = np.random.RandomState(100).rand(250,20)
+        depvars = np.column_stack((np.sin(indepvars.sum(axis=1)), indepvars[:,0]*indepvars[:,1]))
+        query = np.random.RandomState(101).rand(30,20)
+        model = analysis.KReg(indepvars, depvars)
+
+        def expected(query, bandwidth):
+            kernel = np.exp(-np.sum((query[:,None,:] - indepvars[None,:,:])**2 / bandwidth**2, axis=2))
+            return kernel.dot(depvars) / np.sum(kernel, axis=1)[:,None]
+
+        bandwidth = np.linspace(0.5, 1.5, 20)
+        self.assertTrue(np.allclose(model.predict(query, 0.8), expected(query, 0.8), rtol=1.e-10, atol=1.e-12))
+        self.assertTrue(np.allclose(model.predict(query, bandwidth[None,:]), expected(query, bandwidth), rtol=1.e-10, atol=1.e-12))
+        self.assertTrue(np.allclose(model.predict_on_training(0.8), expected(indepvars, 0.8), rtol=1.e-10, atol=1.e-12))
+        self.assertTrue(np.allclose(model.predict_bandwidths(query, [0.5, 0.8])[1], expected(query, 0.8), rtol=1.e-10, atol=1.e-12))
+        self.assertTrue(np.array_equal(model.predict(indepvars, 1.e-16), depvars))
+
 # ------------------------------------------------------------------------------
@@ -0,0 +1,69 @@
+import unittest
+import numpy as np
+from PCAfold import preprocess
+from PCAfold import reduction
+from PCAfold import analysis
+
+class Analysis(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(Analysis, self).__init__(*args, **kwargs)
+        self._indepvars = np.random.RandomState(100).rand(100,2)
+        self._depvars = np.random.RandomState(101).rand(100,3)
+        self._query = np.random.RandomState(102).rand(20,2)
+        self._model = analysis.KReg(self._indepvars, self._depvars)
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_predict_bandwidths__allowed_calls(self):
+
+        try:
+            self._model.predict_bandwidths(self._query, np.array([0.1]))
+            self._model.predict_bandwidths(self._query, [0.1, 1])
+            self._model.predict_bandwidths(self._query, np.logspace(-2, 0, 5), n_threads=2)
+        except Exception:
+            self.assertTrue(False)
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_predict_bandwidths__not_allowed_calls(self):
+
+        with self.assertRaises(AssertionError):
+            self._model.predict_bandwidths(self._query[:,0], np.array([0.1]))
+
+        with self.assertRaises(AssertionError):
+            self._model.predict_bandwidths(self._query, np.array([]))
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_predict_bandwidths__matches_predict(self):
+
+        bandwidth_values = np.logspace(-2, 1, 7)
+        predicted = self._model.predict_bandwidths(self._query, bandwidth_values)
+        self.assertTrue(predicted.shape == (7, 20, 3))
+        for i, bandwidth in enumerate(bandwidth_values):
+            self.assertTrue(np.allclose(predicted[i,:,:], self._model.predict(self._query, bandwidth), rtol=1.e-12, atol=1.e-14))
+
+        self.assertTrue(np.array_equal(predicted, self._model.predict_bandwidths(self._query, bandwidth_values, n_threads=3)))
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_predict_bandwidths__binned(self):
+
+        indepvars = np.random.RandomState(100).rand(1000,1)
+        depvars = np.column_stack((np.cos(4.*indepvars[:,0]), indepvars[:,0]**2))
+        model = analysis.KReg(indepvars, depvars)
+        bandwidth_values = np.logspace(-2, 0, 5)
+
+        binned = model.predict_bandwidths(indepvars, bandwidth_values, method='binned')
+        self.assertTrue(binned.shape == (5,1000,2))
+        self.assertTrue(np.allclose(binned, model.predict_bandwidths(indepvars, bandwidth_values), rtol=0., atol=2.e-3))
+
+        # all bandwidths share one grid
+        binned = model.predict_bandwidths(indepvars, bandwidth_values, method='binned', n_bins=2001)
+        self.assertTrue(np.array_equal(binned[2], model.predict(indepvars, bandwidth_values[2], method='binned', n_bins=2001)))
+
+        with self.assertRaises(ValueError):
+            model.predict_bandwidths(indepvars, bandwidth_values, method='fgt')
+
+# ------------------------------------------------------------------------------
@@ -0,0 +1,70 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+from PCAfold import preprocess
+from PCAfold import reduction
+from PCAfold import analysis
+
+class Analysis(unittest.TestCase):
+
+    def test_analysis__KReg_predict_iter__allowed_calls(self):
+
+        indepvars = np.random.RandomState(100).rand(200,2)
+        depvars = np.column_stack((np.cos(indepvars[:,0]), indepvars[:,1]**2))
+        query = np.random.RandomState(101).rand(95,2)
+        model = analysis.KReg(indepvars, depvars)
+
+        for bandwidth, n_neighbors in [(0.1, None), (np.array([[0.1, 0.2]]), None), ('nearest_neighbors_isotropic', 5), ('nearest_neighbors_anisotropic', 5)]:
+            expected = model.predict(query, bandwidth, n_neighbors=n_neighbors)
+            predicted = list(model.predict_iter((query[i:i+10] for i in range(0, 95, 10)), bandwidth, n_neighbors=n_neighbors))
+            self.assertTrue(len(predicted) == 10)
+            self.assertTrue(np.array_equal(np.vstack(predicted), expected))
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_predict_iter__not_allowed_calls(self):
+
+        indepvars = np.random.RandomState(100).rand(200,2)
+        model = analysis.KReg(indepvars, indepvars)
+
+        with self.assertRaises(AssertionError):
+            model.predict_iter([indepvars[0:10]], np.full((10,2), 0.1))
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_predict_iter__chunked_predict(self):
+
+        indepvars = np.random.RandomState(100).rand(200,2)
+        depvars = np.column_stack((np.cos(indepvars[:,0]), indepvars[:,1]**2))
+        query = np.random.RandomState(101).rand(95,2)
+        bandwidth = np.random.RandomState(102).rand(95,1) * 0.2 + 0.05
+        model = analysis.KReg(indepvars, depvars)
+
+        expected = model.predict(query, bandwidth)
+        self.assertTrue(np.array_equal(model.predict(query, bandwidth, chunk_size=7), expected))
+
+        out = np.zeros((95,2))
+        self.assertTrue(model.predict(query, bandwidth, out=out, chunk_size=10) is out)
+        self.assertTrue(np.array_equal(out, expected))
+
+        # memory-mapped query points and predictions
+        with tempfile.TemporaryDirectory() as directory:
+            np.save(os.path.join(directory, 'query.npy'), query)
+            mapped_query = np.load(os.path.join(directory, 'query.npy'), mmap_mode='r')
+            mapped_out = np.lib.format.open_memmap(os.path.join(directory, 'predicted.npy'), mode='w+', dtype=float, shape=(95,2))
+            model.predict(mapped_query, 0.1, out=mapped_out, chunk_size=20)
+            mapped_out.flush()
+            self.assertTrue(np.array_equal(np.load(os.path.join(directory, 'predicted.npy')), model.predict(query, 0.1)))
+            del mapped_query, mapped_out
+
+        # leave-one-out predictions are evaluated in one piece
+        self.assertTrue(np.array_equal(model.predict(indepvars, 0.1, leave_one_out=True, chunk_size=10), model.predict(indepvars, 0.1, leave_one_out=True)))
+
+        with self.assertRaises(AssertionError):
+            model.predict(query, 0.1, out=np.zeros((94,2)))
+
+        with self.assertRaises(AssertionError):
+            model.predict(query, 0.1, chunk_size=0)
+
+# ------------------------------------------------------------------------------
@@ -0,0 +1,57 @@
+import unittest
+import numpy as np
+from PCAfold import preprocess
+from PCAfold import reduction
+from PCAfold import analysis
+
+class Analysis(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(Analysis, self).__init__(*args, **kwargs)
+        self._indepvars = np.random.RandomState(100).rand(100,3)
+        self._depvars = np.random.RandomState(101).rand(100,2)
+        self._model = analysis.KReg(self._indepvars, self._depvars)
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_predict_on_training__allowed_calls(self):
+
+        try:
+            self._model.predict_on_training(0.1)
+            self._model.predict_on_training(1)
+            self._model.predict_on_training(np.array([0.1, 0.2, 0.3]))
+        except Exception:
+            self.assertTrue(False)
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_predict_on_training__not_allowed_calls(self):
+
+        with self.assertRaises(ValueError):
+            self._model.predict_on_training('nearest_neighbors_isotropic')
+
+        with self.assertRaises(ValueError):
+            self._model.predict_on_training(np.ones_like(self._indepvars))
+
+        with self.assertRaises(AssertionError):
+            self._model.predict_on_training(np.array([0.1, 0.2]))
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_predict_on_training__matches_predict(self):
+
+        for bandwidth in [0.01, 0.1, 10.]:
+            predicted = self._model.predict(self._indepvars, bandwidth)
+            self.assertTrue(np.allclose(self._model.predict_on_training(bandwidth), predicted, rtol=1.e-12, atol=1.e-14))
+
+        bandwidth = np.array([0.1, 0.2, 0.3])
+        predicted = self._model.predict(self._indepvars, self._model.compute_bandwidth_anisotropic(self._indepvars, bandwidth))
+        self.assertTrue(np.allclose(self._model.predict_on_training(bandwidth), predicted, rtol=1.e-12, atol=1.e-14))
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_predict_on_training__return_depvars(self):
+
+        self.assertTrue(np.allclose(self._model.predict_on_training(1.e-16), self._depvars))
+
+# ------------------------------------------------------------------------------
@@ -0,0 +1,52 @@
+import unittest
+import numpy as np
+from PCAfold import preprocess
+from PCAfold import reduction
+from PCAfold import analysis
+
+class Analysis(unittest.TestCase):
+
+    def test_analysis__KReg_remove_observations__allowed_calls(self):
+
+        indepvars = np.random.RandomState(100).rand(300,2)
+        depvars = np.column_stack((np.cos(3.*indepvars[:,0]), indepvars[:,1]**2))
+        query = np.random.RandomState(101).rand(50,2)
+
+        model = analysis.KReg(indepvars[0:200], depvars[0:200])
+        model.add_observations(indepvars[200:], depvars[200:])
+        model.predict(query, 'nearest_neighbors_anisotropic', n_neighbors=3)
+        model.predict(query, 0.5, method='nystrom', tol=1.e-8)
+
+        removed = [250, 3, 120, -1]
+        keep = np.ones(300, dtype=bool)
+        keep[removed] = False
+        model.remove_observations(removed)
+        reference = analysis.KReg(indepvars[keep], depvars[keep])
+        self.assertTrue(np.array_equal(model.indepvars, reference.indepvars))
+        self.assertTrue(np.array_equal(model.depvars, reference.depvars))
+        for bandwidth, n_neighbors in [(0.1, None), ('nearest_neighbors_isotropic', 5), ('nearest_neighbors_anisotropic', 5)]:
+            self.assertTrue(np.array_equal(model.predict(query, bandwidth, n_neighbors=n_neighbors), reference.predict(query, bandwidth, n_neighbors=n_neighbors)))
+        self.assertTrue(np.allclose(model.predict(query, 0.5, method='nystrom', tol=1.e-8), reference.predict(query, 0.5), rtol=0., atol=1.e-5))
+
+        # removing and adding back
+        model.add_observations(indepvars[~keep], depvars[~keep])
+        self.assertTrue(model.indepvars.shape == (300,2))
+        self.assertTrue(np.allclose(model.predict(query, 0.1), analysis.KReg(indepvars, depvars).predict(query, 0.1), rtol=1.e-12, atol=0.))
+
+        # nothing to remove
+        model.remove_observations([])
+        self.assertTrue(model.indepvars.shape == (300,2))
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_remove_observations__not_allowed_calls(self):
+
+        model = analysis.KReg(np.random.rand(10,2), np.random.rand(10,1))
+
+        with self.assertRaises(AssertionError):
+            model.remove_observations([10])
+
+        with self.assertRaises(AssertionError):
+            model.remove_observations(np.arange(10))
+
+# ------------------------------------------------------------------------------
@@ -0,0 +1,57 @@
+import unittest
+import os
+import pickle
+import tempfile
+import numpy as np
+from PCAfold import preprocess
+from PCAfold import reduction
+from PCAfold import analysis
+
+class Analysis(unittest.TestCase):
+
+    def test_analysis__KReg_save__allowed_calls(self):
+
+        indepvars = np.random.RandomState(100).rand(200,2)
+        depvars = np.column_stack((np.cos(indepvars[:,0]), indepvars[:,1]**2))
+        weights = np.random.RandomState(101).rand(200)
+        query = np.random.RandomState(102).rand(30,2)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'model.kreg')
+            for model in [analysis.KReg(indepvars, depvars), analysis.KReg(indepvars, depvars, weights=weights), analysis.KReg(indepvars, depvars, internal_dtype=np.float32, supress_warning=True)]:
+                model.save(path)
+                for mmap in [True, False]:
+                    loaded_model = analysis.KReg.load(path, mmap=mmap)
+                    self.assertTrue(np.array_equal(loaded_model.indepvars, model.indepvars))
+                    self.assertTrue(np.array_equal(loaded_model.depvars, model.depvars))
+                    self.assertTrue(loaded_model.indepvars.dtype == model.indepvars.dtype)
+                    self.assertTrue((loaded_model.weights is None) == (model.weights is None))
+                    self.assertTrue(loaded_model.indepvars.flags.writeable != mmap)
+                    for bandwidth, n_neighbors in [(0.1, None), ('nearest_neighbors_isotropic', 5), ('nearest_neighbors_anisotropic', 5)]:
+                        self.assertTrue(np.array_equal(loaded_model.predict(query, bandwidth, n_neighbors=n_neighbors), model.predict(query, bandwidth, n_neighbors=n_neighbors)))
+                    self.assertTrue(np.array_equal(loaded_model.predict(query, 0.1, kernel_tolerance=1.e-8, return_gradient=True)[1], model.predict(query, 0.1, kernel_tolerance=1.e-8, return_gradient=True)[1]))
+                    self.assertTrue(np.array_equal(loaded_model.predict_on_training(0.1), model.predict_on_training(0.1)))
+                    self.assertTrue(np.array_equal(loaded_model.predict_bandwidths(query, [0.1, 0.2]), model.predict_bandwidths(query, [0.1, 0.2])))
+                    self.assertTrue(np.array_equal(pickle.loads(pickle.dumps(loaded_model)).predict(query, 0.1), model.predict(query, 0.1)))
+
+                    # memory-mapped training data is copied before it is changed
+                    loaded_model.add_observations(query, query)
+                    loaded_model.remove_observations([0])
+                    self.assertTrue(loaded_model.indepvars.flags.writeable)
+                    self.assertTrue(np.array_equal(loaded_model.indepvars, np.vstack((model.indepvars[1:], query.astype(model.indepvars.dtype)))))
+                    del loaded_model
+
+            self.assertTrue(np.array_equal(analysis.KReg.load(path).indepvars, indepvars.astype(np.float32)))
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__KReg_save__not_allowed_calls(self):
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'model.npy')
+            np.save(path, np.random.rand(10,2))
+
+            with self.assertRaises(ValueError):
+                analysis.KReg.load(path)
+
+# ------------------------------------------------------------------------------
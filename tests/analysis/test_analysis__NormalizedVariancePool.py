@@ -0,0 +1,81 @@
+import unittest
+import numpy as np
+from PCAfold import preprocess
+from PCAfold import reduction
+from PCAfold import analysis
+
+class Analysis(unittest.TestCase):
+
+    def test_analysis__NormalizedVariancePool__allowed_calls(self):
+
+        indepvars = np.random.RandomState(100).rand(300,2)
+        depvars = np.column_stack((np.sin(5.*indepvars[:,0]), indepvars[:,1]**2))
+        weights = np.random.RandomState(101).rand(300)
+        bandwidth_values = np.logspace(-2, 0, 5)
+
+        def expected(indepvars, depvars, weights):
+            model = analysis.KReg(indepvars, depvars, weights=weights)
+            w = np.ones(indepvars.shape[0]) if weights is None else weights
+            return np.array([w.dot((depvars - model.predict_on_training(bandwidth))**2) for bandwidth in bandwidth_values])
+
+        for block_size in [None, 37, 1000]:
+            with analysis.NormalizedVariancePool(n_processes=2, block_size=block_size) as pool:
+                # the pool is reused for training data of different sizes and weights
+                for (n, w) in [(300, None), (300, weights), (120, None), (300, None)]:
+                    residual_sums = pool.residual_sums(indepvars[:n], depvars[:n], bandwidth_values, weights=None if w is None else w[:n])
+                    self.assertTrue(np.allclose(residual_sums, expected(indepvars[:n], depvars[:n], None if w is None else w[:n]), rtol=1.e-10, atol=1.e-14))
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__NormalizedVariancePool__compute_normalized_variance(self):
+
+        indepvars = np.random.RandomState(100).rand(200,2)
+        depvars = np.column_stack((np.sin(5.*indepvars[:,0]), indepvars[:,1]**2))
+        bandwidth_values = np.logspace(-3, 1, 10)
+
+        variance_data = analysis.compute_normalized_variance(indepvars, depvars, ['A', 'B'], bandwidth_values=bandwidth_values, n_threads=1)
+        pool = analysis.NormalizedVariancePool(n_processes=3)
+        for i in range(2):
+            pooled_variance_data = analysis.compute_normalized_variance(indepvars, depvars, ['A', 'B'], bandwidth_values=bandwidth_values, pool=pool)
+            for key in ['A', 'B']:
+                self.assertTrue(np.allclose(pooled_variance_data.normalized_variance[key], variance_data.normalized_variance[key], rtol=1.e-10, atol=1.e-14))
+        pool.close()
+
+        with self.assertRaises(ValueError):
+            pool.residual_sums(indepvars, depvars, bandwidth_values)
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__NormalizedVariancePool__not_allowed_calls(self):
+
+        with self.assertRaises(ValueError):
+            analysis.NormalizedVariancePool(n_processes=0)
+
+        with self.assertRaises(ValueError):
+            analysis.NormalizedVariancePool(n_processes=1.5)
+
+        with self.assertRaises(ValueError):
+            analysis.NormalizedVariancePool(block_size=0)
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__NormalizedVariancePool__query_residuals(self):
+
+        indepvars = np.random.RandomState(100).rand(300,2)
+        depvars = np.random.RandomState(101).rand(300,2)
+        weights = np.random.RandomState(102).rand(300)
+        query_indices = np.array([5, 0, 299, 17, 17])
+        bw = np.array([0.05, 0.3])
+
+        with analysis.NormalizedVariancePool(n_processes=2, block_size=2) as pool:
+            for w in [None, weights]:
+                residuals = pool.query_residuals(indepvars, depvars, bw, query_indices, weights=w)
+                self.assertTrue(residuals.shape == (2, 5, 2))
+                model = analysis.KReg(indepvars, depvars, weights=w)
+                for b in range(2):
+                    expected = (depvars[query_indices] - model.predict(indepvars[query_indices], bw[b]))**2
+                    if w is not None:
+                        expected *= w[query_indices, None]
+                    self.assertTrue(np.allclose(residuals[b], expected, rtol=1.e-12, atol=1.e-14))
+
+# ------------------------------------------------------------------------------
@@ -82,4 +82,204 @@ class Analysis(unittest.TestCase):
         self.assertTrue(self._default_variance_data.bandwidth_10pct_rise[self._names[0]] ==
                         self._default_variance_data.bandwidth_values[0])
 
+# ------------------------------------------------------------------------------
+
+    def test_analysis__compute_normalized_variance__weights(self):
+
+        indepvars = np.random.RandomState(100).rand(60,2)
+        depvars = np.column_stack((np.sin(3.*indepvars[:,0]), indepvars[:,1]**2))
+        weights = np.random.RandomState(101).randint(1, 4, size=60)
+        bw = np.logspace(-2, 0, 5)
+
+        # integer weights are equivalent to repeating the observations
+        variance_data = analysis.compute_normalized_variance(indepvars, depvars, ['A', 'B'], bandwidth_values=bw, weights=weights)
+        repeated_variance_data = analysis.compute_normalized_variance(np.repeat(indepvars, weights, axis=0), np.repeat(depvars, weights, axis=0), ['A', 'B'], bandwidth_values=bw)
+        for name in ['A', 'B']:
+            self.assertTrue(np.allclose(variance_data.normalized_variance[name], repeated_variance_data.normalized_variance[name], rtol=1.e-10, atol=1.e-12))
+            self.assertTrue(np.allclose(variance_data.global_variance[name], repeated_variance_data.global_variance[name], rtol=1.e-10, atol=0.))
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__compute_normalized_variance__normalized_variance_limit(self):
+
+        indepvars = np.random.RandomState(100).rand(80,2)
+        indepvars[40:60] = indepvars[0:20]
+        indepvars[60:70] = indepvars[0:10]
+        depvars = np.random.RandomState(101).rand(80,2)
+        weights = np.random.RandomState(102).rand(80)
+        bw = np.array([0.1])
+
+        # the limit matches the kernel regression with a vanishing bandwidth, which averages over exact duplicates
+        for w in [None, weights]:
+            variance_data = analysis.compute_normalized_variance(indepvars, depvars, ['A', 'B'], bandwidth_values=bw, weights=w)
+            xi = (indepvars - np.min(indepvars, axis=0)) / (np.max(indepvars, axis=0) - np.min(indepvars, axis=0))
+            model = analysis.KReg(xi, depvars, weights=w)
+            observation_weights = np.ones(80) if w is None else w
+            expected = observation_weights.dot((depvars - model.predict_on_training(1.e-16))**2)
+            for i, name in enumerate(['A', 'B']):
+                self.assertTrue(np.allclose(variance_data.normalized_variance_limit[name], expected[i], rtol=1.e-12, atol=1.e-14))
+
+        # observations without duplicates do not contribute
+        variance_data = analysis.compute_normalized_variance(indepvars[70:], depvars[70:], ['A', 'B'], bandwidth_values=bw)
+        for name in ['A', 'B']:
+            self.assertTrue(variance_data.normalized_variance_limit[name] == 0.)
+
+        # observations of zero weight do not contribute
+        weights[40:60] = 0.
+        variance_data = analysis.compute_normalized_variance(indepvars, depvars, ['A', 'B'], bandwidth_values=bw, weights=weights)
+        reduced_variance_data = analysis.compute_normalized_variance(np.delete(indepvars, np.s_[40:60], axis=0), np.delete(depvars, np.s_[40:60], axis=0), ['A', 'B'], bandwidth_values=bw, weights=np.delete(weights, np.s_[40:60]))
+        for name in ['A', 'B']:
+            self.assertTrue(np.isclose(variance_data.normalized_variance_limit[name], reduced_variance_data.normalized_variance_limit[name], rtol=1.e-12, atol=0.))
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__compute_normalized_variance__refinement(self):
+
+        indepvars = np.random.RandomState(100).rand(300,1)
+        depvars = np.column_stack([np.sin(40. * indepvars[:,0]), indepvars[:,0]**2])
+        initial_bw = np.logspace(-3, 1, 9)
+
+        variance_data = analysis.compute_normalized_variance(indepvars, depvars, ['A', 'B'], bandwidth_values=initial_bw[::-1], refinement_tolerance=0.1, max_npts_bandwidth=60)
+        bw = variance_data.bandwidth_values
+        self.assertTrue(np.all(np.diff(bw) > 0.))
+        self.assertTrue(np.all(np.isin(initial_bw, bw)))
+        self.assertTrue(initial_bw.size < bw.size <= 60)
+
+        # the values on the refined grid are those computed on it directly
+        direct_variance_data = analysis.compute_normalized_variance(indepvars, depvars, ['A', 'B'], bandwidth_values=bw)
+        for name in ['A', 'B']:
+            self.assertTrue(np.allclose(variance_data.normalized_variance[name], direct_variance_data.normalized_variance[name], rtol=1.e-12, atol=1.e-14))
+            self.assertTrue(variance_data.bandwidth_10pct_rise[name] == direct_variance_data.bandwidth_10pct_rise[name])
+
+        # the derivative changes by at most the tolerance between neighboring interior bandwidths once the refinement converged,
+        # and neighboring intervals differ in width by at most a factor of two
+        variance_data = analysis.compute_normalized_variance(indepvars, depvars, ['A', 'B'], bandwidth_values=initial_bw, refinement_tolerance=0.2, max_npts_bandwidth=1000)
+        (derivative, sigma, _) = analysis.normalized_variance_derivative(variance_data)
+        spacing = np.diff(np.log10(variance_data.bandwidth_values))
+        self.assertTrue(np.all(spacing[1:] <= 2. * (1. + 1.e-9) * spacing[:-1]))
+        self.assertTrue(np.all(spacing[:-1] <= 2. * (1. + 1.e-9) * spacing[1:]))
+        for name in ['A', 'B']:
+            self.assertTrue(np.all(np.abs(np.diff(derivative[name])) <= 0.2))
+
+        # the peaks found on the refined grid are those found on a dense uniform grid
+        indepvars_2d = np.random.RandomState(0).rand(500,2)
+        depvars_2d = np.column_stack([np.sin(5. * indepvars_2d[:,0]), indepvars_2d[:,0] * indepvars_2d[:,1], np.sin(20. * indepvars_2d[:,1])])
+        variance_data = analysis.compute_normalized_variance(indepvars_2d, depvars_2d, ['A', 'B', 'C'], bandwidth_values=np.logspace(-3, 1, 10), refinement_tolerance=0.05)
+        dense_variance_data = analysis.compute_normalized_variance(indepvars_2d, depvars_2d, ['A', 'B', 'C'], bandwidth_values=np.logspace(-3, 1, 400))
+        self.assertTrue(variance_data.bandwidth_values.size < 200)
+        (derivative, sigma, _) = analysis.normalized_variance_derivative(variance_data)
+        (dense_derivative, dense_sigma, _) = analysis.normalized_variance_derivative(dense_variance_data)
+        for name in ['A', 'B', 'C']:
+            (peak_locations, peak_values) = analysis.find_local_maxima(derivative[name], sigma)
+            (dense_peak_locations, dense_peak_values) = analysis.find_local_maxima(dense_derivative[name], dense_sigma)
+            self.assertTrue(peak_locations.size == dense_peak_locations.size)
+            self.assertTrue(np.allclose(peak_locations, dense_peak_locations, rtol=5.e-3, atol=0.))
+            self.assertTrue(np.allclose(peak_values, dense_peak_values, rtol=0., atol=5.e-3))
+
+        # the grid is not refined beyond the initial values if they already resolve the derivative
+        variance_data = analysis.compute_normalized_variance(indepvars, depvars, ['A', 'B'], bandwidth_values=initial_bw, refinement_tolerance=10.)
+        self.assertTrue(np.array_equal(variance_data.bandwidth_values, initial_bw))
+
+        with self.assertRaises(AssertionError):
+            analysis.compute_normalized_variance(indepvars, depvars, ['A', 'B'], bandwidth_values=initial_bw, refinement_tolerance=0.)
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__compute_normalized_variance__query_sample(self):
+
+        indepvars = np.random.RandomState(100).rand(1000,2)
+        depvars = np.column_stack([np.sin(6. * indepvars[:,0]) + indepvars[:,1], indepvars[:,0] * indepvars[:,1]])
+        weights = np.random.RandomState(101).rand(1000)
+        idx = (indepvars[:,0] > 0.7).astype(int)
+        idx[0] = 2
+        bw = np.logspace(-2, 0.5, 8)
+
+        for w in [None, weights]:
+            variance_data = analysis.compute_normalized_variance(indepvars, depvars, ['A', 'B'], bandwidth_values=bw, weights=w)
+            self.assertTrue(variance_data.normalized_variance_standard_error is None)
+
+            # the estimates are within a few standard errors of the normalized variance over all query points
+            for stratification in [None, idx]:
+                sampled_variance_data = analysis.compute_normalized_variance(indepvars, depvars, ['A', 'B'], bandwidth_values=bw, weights=w, n_queries=200, idx=stratification, random_seed=100)
+                standard_error = sampled_variance_data.normalized_variance_standard_error
+                for name in ['A', 'B']:
+                    self.assertTrue(standard_error[name].shape == bw.shape)
+                    self.assertTrue(np.all(standard_error[name] > 0.))
+                    self.assertTrue(np.all(np.abs(sampled_variance_data.normalized_variance[name] - variance_data.normalized_variance[name]) <= 5. * standard_error[name]))
+                    self.assertTrue(sampled_variance_data.global_variance[name] == variance_data.global_variance[name])
+
+            # the sample is reproducible
+            repeated_variance_data = analysis.compute_normalized_variance(indepvars, depvars, ['A', 'B'], bandwidth_values=bw, weights=w, n_queries=200, idx=idx, random_seed=100)
+            for name in ['A', 'B']:
+                self.assertTrue(np.array_equal(repeated_variance_data.normalized_variance[name], sampled_variance_data.normalized_variance[name]))
+
+            # samples of half of the observations or more are exact
+            sampled_variance_data = analysis.compute_normalized_variance(indepvars, depvars, ['A', 'B'], bandwidth_values=bw, weights=w, n_queries=500)
+            for name in ['A', 'B']:
+                self.assertTrue(np.allclose(sampled_variance_data.normalized_variance[name], variance_data.normalized_variance[name], rtol=1.e-12, atol=1.e-14))
+                self.assertTrue(np.all(sampled_variance_data.normalized_variance_standard_error[name] == 0.))
+
+        # the sample grows until the standard errors reach the target
+        sampled_variance_data = analysis.compute_normalized_variance(indepvars, depvars, ['A', 'B'], bandwidth_values=bw, n_queries=20, target_standard_error=0.05, random_seed=100)
+        for name in ['A', 'B']:
+            self.assertTrue(np.all(sampled_variance_data.normalized_variance_standard_error[name] <= 0.05))
+
+        # the ratio estimate approaches one at large bandwidths, where its standard error vanishes
+        sampled_variance_data = analysis.compute_normalized_variance(indepvars, depvars, ['A', 'B'], bandwidth_values=np.array([1.e2, 1.e3]), n_queries=20, random_seed=100)
+        for name in ['A', 'B']:
+            self.assertTrue(np.all(np.abs(1. - sampled_variance_data.normalized_variance[name]) <= 1.e-3))
+            self.assertTrue(np.all(sampled_variance_data.normalized_variance_standard_error[name] <= 1.e-3))
+
+        # the sample is combined with the refinement of the bandwidth grid
+        sampled_variance_data = analysis.compute_normalized_variance(indepvars, depvars, ['A', 'B'], bandwidth_values=bw, n_queries=200, random_seed=100, refinement_tolerance=0.2)
+        for name in ['A', 'B']:
+            self.assertTrue(sampled_variance_data.normalized_variance_standard_error[name].shape == sampled_variance_data.bandwidth_values.shape)
+
+        with self.assertRaises(AssertionError):
+            analysis.compute_normalized_variance(indepvars, depvars, ['A', 'B'], bandwidth_values=bw, n_queries=200, idx=idx[:10])
+
+# ------------------------------------------------------------------------------
+
+    def test_analysis__compute_normalized_variance__saturation(self):
+
+        indepvars = np.random.RandomState(100).rand(400,2)
+        depvars = np.column_stack([np.sin(6. * indepvars[:,0]) + indepvars[:,1], indepvars[:,0] * indepvars[:,1]])
+        weights = np.random.RandomState(101).rand(400)
+        bw = np.logspace(-3, 2, 30)
+
+        for w in [None, weights]:
+            variance_data = analysis.compute_normalized_variance(indepvars, depvars, ['A', 'B'], bandwidth_values=bw, weights=w)
+            self.assertTrue(variance_data.saturation_index is None)
+
+            # the sweep stops at the first bandwidth within the tolerance of saturation for all variables
+            saturated_variance_data = analysis.compute_normalized_variance(indepvars, depvars, ['A', 'B'], bandwidth_values=bw[::-1], weights=w, saturation_tolerance=1.e-2, n_threads=2)
+            k = saturated_variance_data.saturation_index
+            self.assertTrue(np.array_equal(saturated_variance_data.bandwidth_values, bw))
+            self.assertTrue(k == np.flatnonzero(np.all([np.abs(1. - variance_data.normalized_variance[name]) <= 1.e-2 for name in ['A', 'B']], axis=0))[0])
+            self.assertTrue(k < bw.size - 1)
+            for name in ['A', 'B']:
+                normalized_variance = saturated_variance_data.normalized_variance[name]
+                self.assertTrue(np.allclose(normalized_variance[:k+1], variance_data.normalized_variance[name][:k+1], rtol=1.e-12, atol=1.e-14))
+                self.assertTrue(np.allclose(normalized_variance[k+1:], 1. - (1. - normalized_variance[k]) * (bw[k] / bw[k+1:])**2, rtol=1.e-12, atol=1.e-14))
+                self.assertTrue(np.all(np.abs(normalized_variance[k+1:] - variance_data.normalized_variance[name][k+1:]) <= 1.e-3))
+
+        # the sweep does not stop if the normalized variance does not saturate within the tolerance
+        saturated_variance_data = analysis.compute_normalized_variance(indepvars, depvars, ['A', 'B'], bandwidth_values=bw, weights=weights, saturation_tolerance=1.e-12)
+        self.assertTrue(saturated_variance_data.saturation_index is None)
+        for name in ['A', 'B']:
+            self.assertTrue(np.allclose(saturated_variance_data.normalized_variance[name], variance_data.normalized_variance[name], rtol=1.e-12, atol=1.e-14))
+
+        # refined bandwidths beyond the saturation are extrapolated as well
+        saturated_variance_data = analysis.compute_normalized_variance(indepvars, depvars, ['A', 'B'], bandwidth_values=bw[::3], saturation_tolerance=1.e-2, refinement_tolerance=0.2, n_queries=100, random_seed=100)
+        k = saturated_variance_data.saturation_index
+        refined_bw = saturated_variance_data.bandwidth_values
+        for name in ['A', 'B']:
+            normalized_variance = saturated_variance_data.normalized_variance[name]
+            self.assertTrue(np.allclose(normalized_variance[k+1:], 1. - (1. - normalized_variance[k]) * (refined_bw[k] / refined_bw[k+1:])**2, rtol=1.e-12, atol=1.e-14))
+            standard_error = saturated_variance_data.normalized_variance_standard_error[name]
+            self.assertTrue(np.allclose(standard_error[k+1:], standard_error[k] * (refined_bw[k] / refined_bw[k+1:])**2, rtol=1.e-12, atol=1.e-14))
+
+        with self.assertRaises(AssertionError):
+            analysis.compute_normalized_variance(indepvars, depvars, ['A', 'B'], bandwidth_values=bw, saturation_tolerance=0.)
+
 # ------------------------------------------------------------------------------
@@ -0,0 +1,99 @@
+import unittest
+import os
+import asyncio
+import tempfile
+import threading
+import numpy as np
+from PCAfold import reduction
+from PCAfold import analysis
+from PCAfold import serving
+
+class Serving(unittest.TestCase):
+
+    def setUp(self):
+
+        self.X = np.random.RandomState(100).rand(300,5)
+        self.pca_X = reduction.PCA(self.X, scaling='auto', n_components=2)
+        self.model = analysis.KReg(self.pca_X.transform(self.X), self.X)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def _run(self, coroutine):
+
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+# ------------------------------------------------------------------------------
+
+    def test_serving__InferenceServer__allowed_calls(self):
+
+        for path in [None, 'pcafold.sock']:
+            server = serving.InferenceServer(pca=self.pca_X, kreg=self.model, bandwidth=0.1, max_batch_size=64, max_wait=1.e-2)
+            with tempfile.TemporaryDirectory() as directory:
+                self.assertTrue(server.address is None)
+                address = self._run(server.start(path=None if path is None else os.path.join(directory, path)))
+                self.assertTrue(server.address == address)
+
+                # concurrent clients each sending single observations are answered with their own results
+                query = np.random.RandomState(101).rand(80,5)
+                results = [None] * query.shape[0]
+                def client_requests(rows):
+                    with serving.InferenceClient(address) as client:
+                        for i in rows:
+                            results[i] = (client.transform(query[i:i+1]), client.predict(self.pca_X.transform(query[i:i+1])), client.transform_predict(query[i:i+1]))
+                threads = [threading.Thread(target=client_requests, args=(range(start, query.shape[0], 8),)) for start in range(8)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+                expected = self.model.predict(self.pca_X.transform(query), 0.1)
+                for i in range(query.shape[0]):
+                    self.assertTrue(np.allclose(results[i][0], self.pca_X.transform(query[i:i+1]), rtol=1.e-12, atol=1.e-12))
+                    self.assertTrue(np.allclose(results[i][1], expected[i:i+1], rtol=1.e-12, atol=1.e-12))
+                    self.assertTrue(np.allclose(results[i][2], expected[i:i+1], rtol=1.e-12, atol=1.e-12))
+
+                # a request larger than max_batch_size is evaluated on its own
+                with serving.InferenceClient(address) as client:
+                    self.assertTrue(np.allclose(client.transform_predict(query), expected, rtol=1.e-12, atol=1.e-12))
+
+                self._run(server.stop())
+                self.assertTrue(server.address is None)
+
+# ------------------------------------------------------------------------------
+
+    def test_serving__InferenceServer__not_allowed_calls(self):
+
+        with self.assertRaises(ValueError):
+            serving.InferenceServer()
+
+        with self.assertRaises(ValueError):
+            serving.InferenceServer(kreg=self.model)
+
+        with self.assertRaises(ValueError):
+            serving.InferenceServer(kreg=self.model, bandwidth=np.ones((10,2)))
+
+        with self.assertRaises(ValueError):
+            serving.InferenceServer(pca=self.pca_X, max_batch_size=0)
+
+        with self.assertRaises(ValueError):
+            serving.InferenceServer(pca=self.pca_X, max_wait=-1.)
+
+        # malformed requests fail on their own and the connection remains usable
+        server = serving.InferenceServer(pca=self.pca_X)
+        address = self._run(server.start())
+        with serving.InferenceClient(address) as client:
+            with self.assertRaises(RuntimeError):
+                client.predict(np.random.rand(3,2))
+            with self.assertRaises(RuntimeError):
+                client.transform(np.random.rand(3,4))
+            self.assertTrue(np.allclose(client.transform(self.X[0:3]), self.pca_X.transform(self.X[0:3]), rtol=1.e-12, atol=1.e-12))
+        self._run(server.stop())
+
+# ------------------------------------------------------------------------------